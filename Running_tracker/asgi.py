@@ -0,0 +1,17 @@
+"""
+ASGI config for running_tracker project.
+
+A live status SSE streamhez (api/live/status/stream/) ASGI szerver kell, pl.:
+    uvicorn running_tracker.asgi:application
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'running_tracker.settings')
+
+application = get_asgi_application()
@@ -44,6 +44,10 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Legkívül: a teljes kérést méri (a session / auth lekérdezéseit is) - lásd results/metrics.py
+    'results.middleware.MetricsMiddleware',
+    # Indításkor elindítja a háttérfeladat workereket (JOB_WORKERS), majd kikerül a láncból
+    'results.middleware.BackgroundWorkersMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,6 +81,15 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'running_tracker.wsgi.application'
 
+# ASGI alatt (pl. uvicorn/daphne) működik a live status SSE stream is
+ASGI_APPLICATION = 'running_tracker.asgi.application'
+
+# Élő futások állapota (results/live_state.py): 'memory' (egy worker),
+# 'sqlite:///eleresi/ut/live_state.db' vagy 'redis://localhost:6379/0' (több worker)
+LIVE_STATE_BACKEND = 'memory'
+# Ennyi másodpercenként írjuk ki a LiveRun sorokat állapotváltás nélkül is
+LIVE_STATE_FLUSH_SECONDS = 10
+
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
@@ -135,4 +148,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static') # A gyűjtő mappa a PythonAnywhe
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # --- MÉDIA (FELTÖLTÖTT KÉPEK) BEÁLLÍTÁSAI ---
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Pálya fotók reszponzív változatai (results/images.py), háttérfeladatként készülnek
+TRACK_IMAGE_SIZES = (200, 400, 1200)
+# Háttérfeladat workerek a webszerver folyamatán belül (0 = csak a 'manage.py run_jobs' dolgozik)
+JOB_WORKERS = 2
+# Prometheus metrikák (api/metrics/): adminnak, vagy 'Authorization: Bearer <token>' fejléccel a scrapernek
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
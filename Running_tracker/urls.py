@@ -30,6 +30,7 @@ urlpatterns = [
     path('api/register/', views.api_register, name='api_register'),
     path('api/logout/', views.api_logout, name='api_logout'),
     path('api/whoami/', views.current_user, name='current_user'),
+    path('api/me/stats/', views.my_stats, name='my-stats'),
 
     # Mentés (Új eredmény)
     path('api/results/save/', views.result_save, name='result-save'),
@@ -37,9 +38,19 @@ urlpatterns = [
     # Eredmény törlése és szerkesztése
     path('api/results/<int:pk>/', views.result_detail, name='result-detail'),
     path('api/results/<int:pk>/update/', views.result_detail, name='result-update'),
+    path('api/results/<int:pk>/rank/', views.result_rank, name='result-rank'),
+    path('api/results/<int:pk>/splits/', views.result_splits, name='result-splits'),
+    path('api/laps/fastest/', views.fastest_lap_records, name='fastest-laps'),
+    path('api/jobs/', views.job_status, name='job-status'),
+    path('api/metrics/', views.metrics, name='metrics'),
+
+    # Tömeges export / import (eredmények, értékelések)
+    path('api/export/<str:kind>/', views.data_export, name='data-export'),
+    path('api/import/<str:kind>/', views.data_import, name='data-import'),
 
     # Eredmények listázása Pálya ID alapján
     path('api/results/<str:track_id>/', views.result_list, name='result-list'),
+    path('api/results/<str:track_id>/stream/', views.result_stream, name='result-stream'),
 
     # Értékelések
     path('api/tracks/<str:track_id>/reviews/', views.track_reviews, name='track-reviews'),
@@ -51,8 +62,11 @@ urlpatterns = [
     path('api/live/active/', views.get_active_runners, name='live-active'),
     path('api/live/pause/', views.pause_live_run, name='live-pause'),
     path('api/live/gps-update/', views.update_gps_position, name='live-gps-update'),
+    path('api/live/gps-batch/', views.update_gps_batch, name='live-gps-batch'),
     path('api/live/set-ready/', views.set_run_ready, name='live-set-ready'),
     path('api/live/status/', views.get_live_status, name='live-status'),
+    path('api/live/status/stream/', views.live_status_stream, name='live-status-stream'),
+    path('api/live/runs/<int:run_id>/samples/', views.run_samples, name='live-run-samples'),
 
     # Router a pályákhoz (api/tracks/) - Ez maradhat a végén
     path('api/', include(router.urls)),
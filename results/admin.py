@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 # Fontos: Itt adtuk hozzá a TrackReview-t a listához!
-from .models import Track, Result, Profile, TrackReview
+from .models import Track, Result, Profile, TrackReview, RunSampleChunk, Job
 
 # --- 1. PROFIL BEÁGYAZÁSA A USER ADMINBA ---
 
@@ -25,7 +25,7 @@ admin.site.register(User, UserAdmin)
 # --- 2. EGYÉB MODELLEK ADMINISZTRÁCIÓJA ---
 
 class TrackAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'distance_km_per_lap', 'surface_type')
+    list_display = ('id', 'name', 'distance_km_per_lap', 'surface_type', 'gpx_status', 'average_rating', 'review_count')
 
 class ResultAdmin(admin.ModelAdmin):
     list_display = ('runner_name', 'track', 'time', 'laps_count', 'recorded_at')
@@ -46,10 +46,27 @@ class TrackReviewAdmin(admin.ModelAdmin):
     # A dátumot csak olvasni engedjük, nehogy véletlenül átírd:
     readonly_fields = ('created_at',)
 
+# Nyers GPS darabok: csak olvasásra (a tartalom bináris, a samples.py kódolja)
+class RunSampleChunkAdmin(admin.ModelAdmin):
+    list_display = ('run_id', 'user', 'track', 'start_time', 'end_time', 'count')
+    list_filter = ('track',)
+    search_fields = ('user__username',)
+    readonly_fields = ('run_id', 'user', 'track', 'start_time', 'end_time', 'count')
+    exclude = ('data',)
+
+# Háttérfeladatok: állapot és hiba követése (a feldolgozás a jobs.py-ban)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'run_after', 'locked_by', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('dedupe_key', 'last_error')
+    readonly_fields = ('locked_by', 'locked_at', 'created_at', 'finished_at')
+
 # Modellek regisztrálása
 admin.site.register(Track, TrackAdmin)
 admin.site.register(Result, ResultAdmin)
 admin.site.register(TrackReview, TrackReviewAdmin) # <--- Itt aktiváltuk az új admin felületet!
+admin.site.register(RunSampleChunk, RunSampleChunkAdmin)
+admin.site.register(Job, JobAdmin)
 
 # Ha a Profilokat külön listában is látni akarod, vedd ki a kommentet:
 # admin.site.register(Profile)
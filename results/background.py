@@ -0,0 +1,86 @@
+"""
+Háttér worker szálak a DB alapú feladatsorhoz (jobs.py).
+
+A WorkerPool szálai egy 'work' függvényt hívnak (egy feladat lefoglalása + futtatása); ha
+nincs munka, ébresztésig vagy a következő lekérdezésig (poll) várnak. Az ébresztést a
+Job.enqueue küldi a tranzakció lezárása után, így a folyamaton belül felvett feladat azonnal
+indul; a poll a más folyamatból (másik webszerver worker, run_jobs parancs) érkezőket veszi fel.
+Ez a modul nem importál modelleket, így a models.py is használhatja.
+"""
+import os
+import socket
+import threading
+
+from django.db import connection
+
+# Ennyi másodpercenként nézik meg a tétlen szálak a sort ébresztés nélkül is
+POLL_INTERVAL = 5.0
+
+_pools = []
+
+
+class WorkerPool:
+    """Szálkészlet, amely a 'work(worker_id)' függvényt hívja, amíg az munkát talál (True)."""
+
+    def __init__(self, name, work, workers=1, poll_interval=POLL_INTERVAL):
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        _pools.append(self)
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self, workers=None):
+        """A szálak indítása (ha még nem futnak). workers=0 -> ebben a folyamatban nincs worker."""
+        with self._lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            count = self.workers if workers is None else workers
+            self._threads = [
+                threading.Thread(target=self._loop, args=(f"{self.name}-{index}",), name=f"{self.name}-{index}", daemon=True)
+                for index in range(count)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        """A szálak leállítása; a futó feladatot még befejezik."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _loop(self, thread_name):
+        # A worker azonosító a zárolásban látszik (admin), és egyedi a gépek / folyamatok között
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{thread_name}"
+        while not self._stopping.is_set():
+            try:
+                busy = self.work(worker_id)
+            except Exception as e:
+                print(f"Háttér worker hiba ({worker_id}): {e}")
+                busy = False
+            finally:
+                # A szál saját DB kapcsolatát lezárjuk, ne maradjon nyitva tétlenül
+                connection.close()
+            if not busy:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+def wake_workers():
+    """Az összes készlet ébresztése; a még nem futó (de workerrel rendelkező) készletet elindítjuk."""
+    for pool in _pools:
+        if pool.workers and not pool.running:
+            pool.start()
+        pool.wake()
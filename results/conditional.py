@@ -0,0 +1,46 @@
+"""
+Feltételes GET (ETag / If-None-Match) az olvasó API végpontokhoz.
+
+Az ETag a ResourceVersion számlálóból jön (egy PK-s lekérdezés), így ha a kliens
+ETag-je egyezik, 304-et adunk vissza anélkül, hogy a szerializálót meghívnánk.
+"""
+from urllib.parse import quote
+
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from .models import ResourceVersion
+
+
+def make_etag(*parts):
+    """Erős ETag a megadott részekből, pl. make_etag('results', 't1', 42) -> '"results-t1-42"'."""
+    # A pálya ID bármit tartalmazhat, ezért escape-eljük (ETag-ben nem lehet pl. idézőjel)
+    return '"' + '-'.join(quote(str(part), safe='') for part in parts) + '"'
+
+
+def conditional_response(request, etag, build_response):
+    """
+    Ha a kliens If-None-Match fejléce egyezik az ETag-gel -> 304 (a build_response nem fut le).
+    Különben felépíti a választ és ráteszi az ETag-et. A 'no-cache' miatt a böngésző
+    minden alkalommal revalidál, de a változatlan adatot nem tölti le újra.
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        if '*' in etags or etag in etags:
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            patch_cache_control(response, no_cache=True)
+            return response
+
+    response = build_response()
+    if response.status_code == 200:
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def resource_etag(key, *extra):
+    """ETag egy ResourceVersion kulcs aktuális verziójából (+ opcionális extra részek)."""
+    return make_etag(key.replace(':', '-'), ResourceVersion.current(key), *extra)
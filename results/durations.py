@@ -0,0 +1,60 @@
+"""
+Idő stringek ("MM:SS", "HH:MM:SS", opcionálisan tizedekkel/századokkal: "MM:SS.cc")
+és ezredmásodpercek közötti átváltás.
+
+A Result.time szövegként marad (így jelenítjük meg), de a rendezéshez és a ranglistához
+a Result.duration_ms egész számot használjuk, mert a szöveges rendezés egy óra felett
+hibás ("1:02:00" < "59:00").
+"""
+
+
+def parse_duration_ms(value):
+    """
+    "SS", "MM:SS", "HH:MM:SS" (mindegyik tizedes másodperccel is) -> ezredmásodperc.
+    Érvénytelen vagy üres értékre None.
+    """
+    if value is None:
+        return None
+    parts = str(value).strip().replace(',', '.').split(':')
+    if not parts or len(parts) > 3 or not all(parts):
+        return None
+    try:
+        seconds = float(parts[-1])
+        minutes = int(parts[-2]) if len(parts) >= 2 else 0
+        hours = int(parts[-3]) if len(parts) == 3 else 0
+    except ValueError:
+        return None
+    if seconds < 0 or minutes < 0 or hours < 0:
+        return None
+    return round((hours * 3600 + minutes * 60 + seconds) * 1000)
+
+
+def format_duration(ms):
+    """Ezredmásodperc -> "MM:SS" vagy "HH:MM:SS" (századokkal, ha vannak)."""
+    if ms is None:
+        return None
+    total_seconds, millis = divmod(int(ms), 1000)
+    hours, rest = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    text = f"{hours:02}:{minutes:02}:{seconds:02}" if hours else f"{minutes:02}:{seconds:02}"
+    if millis:
+        text += f".{millis // 10:02}"
+    return text
+
+
+def format_pace(ms_per_km):
+    """Tempó ezredmásodperc/km -> "M:SS" (mint a live tracker tempója)."""
+    if not ms_per_km:
+        return "-:--"
+    seconds_per_km = ms_per_km / 1000
+    return f"{int(seconds_per_km // 60)}:{int(seconds_per_km % 60):02d}"
+
+
+def parse_lap_times(value):
+    """
+    Köridők szövege ("05:30, 05:12, 05:40") -> [ms, ms, ...] körönként.
+    Az értelmezhetetlen köridő helyén None áll, így a körszámozás nem csúszik el.
+    """
+    if not value:
+        return []
+    return [parse_duration_ms(part) for part in str(value).split(',') if part.strip()]
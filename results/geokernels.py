@@ -0,0 +1,195 @@
+"""
+Vektorizált geometriai kernelek (NumPy) a pálya-geometriához és a map matchinghez,
+tiszta Python tartalékkal.
+
+A NumPy opcionális: ha nincs telepítve, vagy settings.GEOMETRY_USE_NUMPY = False,
+ugyanazok a képletek futnak Python ciklusban. A távolság képlete a gpxpy
+distance_2d-jével egyezik (közeli pontokra equirectangular, 0.2 foknál távolabbiakra
+haversine), a két út eredménye lebegőpontos kerekítésen belül azonos.
+"""
+import math
+from array import array
+
+import gpxpy.geo
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # A NumPy nélkül is működünk, csak lassabban
+    np = None
+
+# Egy fok hossza méterben és a Föld sugara (a gpxpy is ezekkel számol)
+ONE_DEGREE = gpxpy.geo.ONE_DEGREE
+EARTH_RADIUS = gpxpy.geo.EARTH_RADIUS
+
+# Ennél nagyobb (fokban mért) eltérésnél haversine képletet használunk
+HAVERSINE_THRESHOLD = 0.2
+
+
+def numpy_enabled():
+    """Használhatjuk-e a NumPy kerneleket?"""
+    return np is not None and getattr(settings, 'GEOMETRY_USE_NUMPY', True)
+
+
+def as_numpy(values):
+    """array('d') / lista -> float64 NumPy tömb (array('d')-nél másolás nélkül)."""
+    if isinstance(values, array):
+        return np.frombuffer(values, dtype=np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def to_array(values):
+    """NumPy tömb -> array('d') (a TrackGeometry így tárolja)."""
+    result = array('d')
+    result.frombytes(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return result
+
+
+# --- TÁVOLSÁGOK ---
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """Haversine távolság méterben (gpxpy.geo.haversine_distance megfelelője)."""
+    d_lon = math.radians(lon1 - lon2)
+    rlat1 = math.radians(lat1)
+    rlat2 = math.radians(lat2)
+    d_lat = rlat1 - rlat2
+    a = math.sin(d_lat / 2) ** 2 + math.sin(d_lon / 2) ** 2 * math.cos(rlat1) * math.cos(rlat2)
+    return EARTH_RADIUS * 2 * math.asin(math.sqrt(a))
+
+
+def point_distance(lat1, lon1, lat2, lon2):
+    """Két pont távolsága méterben (ugyanaz a képlet, mint a gpxpy distance_2d-jében)."""
+    if abs(lat1 - lat2) > HAVERSINE_THRESHOLD or abs(lon1 - lon2) > HAVERSINE_THRESHOLD:
+        return haversine_distance(lat1, lon1, lat2, lon2)
+    coef = math.cos(math.radians(lat1))
+    x = lat1 - lat2
+    y = (lon1 - lon2) * coef
+    return math.sqrt(x * x + y * y) * ONE_DEGREE
+
+
+def _segment_lengths_np(lats, lons):
+    lat1, lat2 = lats[:-1], lats[1:]
+    lon1, lon2 = lons[:-1], lons[1:]
+    x = lat1 - lat2
+    y = (lon1 - lon2) * np.cos(np.radians(lat1))
+    lengths = np.sqrt(x * x + y * y) * ONE_DEGREE
+
+    far = (np.abs(x) > HAVERSINE_THRESHOLD) | (np.abs(lon1 - lon2) > HAVERSINE_THRESHOLD)
+    if far.any():
+        rlat1, rlat2 = np.radians(lat1[far]), np.radians(lat2[far])
+        d_lon = np.radians(lon1[far] - lon2[far])
+        a = np.sin((rlat1 - rlat2) / 2) ** 2 + np.sin(d_lon / 2) ** 2 * np.cos(rlat1) * np.cos(rlat2)
+        lengths[far] = EARTH_RADIUS * 2 * np.arcsin(np.sqrt(a))
+    return lengths
+
+
+def cumulative_lengths(lats, lons):
+    """Kumulált táv (m) minden ponthoz a starttól, array('d') formában."""
+    count = len(lats)
+    if numpy_enabled() and count > 1:
+        cum = np.zeros(count)
+        np.cumsum(_segment_lengths_np(as_numpy(lats), as_numpy(lons)), out=cum[1:])
+        return to_array(cum)
+
+    cum = array('d')
+    total = 0.0
+    for i in range(count):
+        if i:
+            total += point_distance(lats[i - 1], lons[i - 1], lats[i], lons[i])
+        cum.append(total)
+    return cum
+
+
+# --- HELYI VETÜLET ÉS SZAKASZ PROJEKCIÓ ---
+
+def project_local(lats, lons, ref_lat, ref_lon, kx):
+    """Földrajzi koordináták -> helyi (x, y) méterben, array('d') párként."""
+    if numpy_enabled() and len(lats):
+        xs = (as_numpy(lons) - ref_lon) * kx
+        ys = (as_numpy(lats) - ref_lat) * ONE_DEGREE
+        return to_array(xs), to_array(ys)
+    xs = array('d', ((lon - ref_lon) * kx for lon in lons))
+    ys = array('d', ((lat - ref_lat) * ONE_DEGREE for lat in lats))
+    return xs, ys
+
+
+def project_onto_segments(xs, ys, qx, qy):
+    """
+    Sok pont vetítése az összes szakaszra egyszerre (csak NumPy).
+    Visszaadja: (t, d2) mátrixok [jel x szakasz] - arány a szakaszon és távolságnégyzet.
+    A képlet műveletről műveletre egyezik a SegmentIndex.project_on_segment-tel.
+    """
+    xs, ys = as_numpy(xs), as_numpy(ys)
+    ax, ay = xs[:-1], ys[:-1]
+    dx, dy = xs[1:] - ax, ys[1:] - ay
+    len2 = dx * dx + dy * dy
+    qx = np.asarray(qx, dtype=np.float64)[:, None]
+    qy = np.asarray(qy, dtype=np.float64)[:, None]
+
+    numerator = (qx - ax) * dx + (qy - ay) * dy
+    t = np.zeros(numerator.shape)
+    np.divide(numerator, len2, out=t, where=len2 > 0)
+    np.clip(t, 0.0, 1.0, out=t)
+    px = ax + t * dx - qx
+    py = ay + t * dy - qy
+    return t, px * px + py * py
+
+
+
+# --- EGYSZERŰSÍTÉS (Douglas-Peucker) ---
+
+def _max_deviation_py(xs, ys, first, last):
+    """A (first, last) közötti pontok közül a húrtól legtávolabbi: (index, távolság négyzete)."""
+    ax, ay = xs[first], ys[first]
+    dx, dy = xs[last] - ax, ys[last] - ay
+    len2 = dx * dx + dy * dy
+    best_i, best_d2 = -1, -1.0
+    for i in range(first + 1, last):
+        if len2 > 0:
+            t = ((xs[i] - ax) * dx + (ys[i] - ay) * dy) / len2
+            t = 0.0 if t < 0 else (1.0 if t > 1 else t)
+        else:
+            t = 0.0
+        px, py = ax + t * dx - xs[i], ay + t * dy - ys[i]
+        d2 = px * px + py * py
+        if d2 > best_d2:
+            best_i, best_d2 = i, d2
+    return best_i, best_d2
+
+
+def _max_deviation_np(xs, ys, first, last):
+    t, d2 = project_onto_segments(xs[[first, last]], ys[[first, last]],
+                                  xs[first + 1:last], ys[first + 1:last])
+    d2 = d2[:, 0]
+    i = int(np.argmax(d2))
+    return first + 1 + i, float(d2[i])
+
+
+def simplify_indices(xs, ys, tolerance):
+    """
+    Douglas-Peucker egyszerűsítés helyi (méteres) koordinátákon.
+    Visszaadja a megtartott pontok indexeit növekvő sorrendben (az első és utolsó mindig benne).
+    """
+    count = len(xs)
+    if count <= 2:
+        return list(range(count))
+
+    if numpy_enabled():
+        xs, ys = as_numpy(xs), as_numpy(ys)
+        max_deviation = _max_deviation_np
+    else:
+        max_deviation = _max_deviation_py
+
+    tolerance2 = tolerance * tolerance
+    keep = {0, count - 1}
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        i, d2 = max_deviation(xs, ys, first, last)
+        if d2 > tolerance2:
+            keep.add(i)
+            stack.append((first, i))
+            stack.append((i, last))
+    return sorted(keep)
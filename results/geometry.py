@@ -0,0 +1,607 @@
+"""
+GPX geometria kezelése a pályákhoz.
+
+A GPX fájlt egyszer parse-oljuk, a kiterített pontlistát pedig egy folyamat-szintű
+(process-wide) LRU gyorsítótárban tartjuk, így a GPS jelek és a pályalista
+szerializálása nem olvassa és dolgozza fel újra az XML-t minden hívásnál.
+
+A geometria tartalmaz egy kumulált távolság-indexet is (minden ponthoz a starttól
+mért távolság), így a "hol van a futó X méternél" kérdés bináris kereséssel és
+lineáris interpolációval válaszolható meg. Ez az index a Track rekordban is
+eltárolódik (Track.geometry_index), tömör bináris formában.
+
+A map matchinghez (GPS jel -> starttól mért táv) egy szakasz-alapú rács indexet
+építünk geometriánként egyszer (SegmentIndex): a jelet a legközelebbi szakaszra
+vetítjük, és a vetített pont pályamenti távolságát adjuk vissza. A számításigényes
+részek (kumulált táv, vetület, kötegelt illesztés) a geokernels modul NumPy
+kerneleit használják, ha elérhetők.
+
+A térképes megjelenítéshez több részletességi szintű (LOD), Douglas-Peucker
+algoritmussal egyszerűsített útvonalat is előállítunk, Google "encoded polyline"
+formátumban (ezt a Leaflet oldalon a decodePolyline() bontja ki).
+"""
+import math
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+
+import gpxpy
+from django.conf import settings
+
+from .geokernels import (
+    ONE_DEGREE, point_distance, cumulative_lengths, project_local,
+    project_onto_segments, simplify_indices, numpy_enabled, as_numpy, np,
+)
+from .metrics import GPX_PARSE_SECONDS
+
+# Alapértelmezett memóriakeret (byte), felülírható: settings.GPX_GEOMETRY_CACHE_MAX_BYTES
+DEFAULT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# A tárolt index formátuma: fejléc (magic + pontszám), majd lat, lon és kumulált táv tömbök
+_INDEX_MAGIC = b'GEO1'
+_INDEX_HEADER = struct.Struct('<4sI')
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+# Rácscella méretének korlátai a szakasz-indexhez (méter)
+MIN_CELL_SIZE = 20.0
+MAX_CELL_SIZE = 500.0
+
+# Inkrementális map matching: a legutóbbi illesztés körüli ablak (méter)
+MATCH_WINDOW_BEHIND = 30.0
+MATCH_WINDOW_AHEAD = 250.0
+# Ennél messzebb a pályától az ablakos találat bizonytalan -> globális keresés
+MATCH_CONFIDENCE_OFFSET = 30.0
+# Büntetés (m / m) a legutóbbi pozíciótól mért pályamenti ugrásra: oda-vissza és
+# nyolcas pályán a közeli, de "másik ágon" lévő szakasz így nem nyer
+MATCH_PROGRESS_WEIGHT = 0.1
+# Ha az első és az utolsó pont ennél közelebb van (m), a pálya zárt kör: a cél egyben a rajt
+LOOP_CLOSE_DISTANCE = 25.0
+
+# Részletességi szintek: név -> Douglas-Peucker tűrés (méter). A 'full' az összes pont.
+LOD_TOLERANCES = {
+    'coarse': 20.0,   # Pályalista, dashboard körvonal
+    'medium': 5.0,
+    'fine': 1.0,      # Pálya részletes nézet
+}
+LOD_FULL = 'full'
+
+# Map matching eredménye: szakasz sorszáma, arány a szakaszon belül (0-1),
+# starttól mért pályamenti táv (m) és a jel távolsága a pályától (m)
+MapMatch = namedtuple('MapMatch', ['segment', 'ratio', 'distance', 'deviation'])
+
+
+class TrackGeometry:
+    """
+    Egy pálya feldolgozott geometriája a GPX sorrendjében, az összes track/szegmens
+    kiterítve. Párhuzamos tömbök: lats, lons és cum (kumulált táv méterben).
+    """
+    __slots__ = ('lats', 'lons', 'cum', '_segment_index', '_closed')
+
+    def __init__(self, lats, lons, cum):
+        self.lats = lats
+        self.lons = lons
+        self.cum = cum
+        self._segment_index = None
+        self._closed = None
+
+    @classmethod
+    def from_points(cls, points):
+        """[(lat, lon), ...] listából építi fel a geometriát és a kumulált táv indexet."""
+        lats = array('d', (point[0] for point in points))
+        lons = array('d', (point[1] for point in points))
+        return cls(lats, lons, cumulative_lengths(lats, lons))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """A Track.geometry_index mezőben tárolt bináris formából tölti vissza."""
+        data = bytes(data)
+        magic, count = _INDEX_HEADER.unpack_from(data)
+        if magic != _INDEX_MAGIC:
+            raise ValueError("Ismeretlen geometria index formátum")
+        arrays = []
+        offset = _INDEX_HEADER.size
+        for _ in range(3):
+            arr = array('d')
+            arr.frombytes(data[offset:offset + count * 8])
+            if _BIG_ENDIAN:
+                arr.byteswap()  # A tárolt forma mindig little-endian
+            arrays.append(arr)
+            offset += count * 8
+        return cls(*arrays)
+
+    def to_bytes(self):
+        """Tömör bináris forma (little-endian double tömbök) a DB-be mentéshez."""
+        parts = [_INDEX_HEADER.pack(_INDEX_MAGIC, len(self))]
+        for arr in (self.lats, self.lons, self.cum):
+            if _BIG_ENDIAN:
+                arr = array('d', arr)
+                arr.byteswap()
+            parts.append(arr.tobytes())
+        return b''.join(parts)
+
+    def __len__(self):
+        return len(self.lats)
+
+    @property
+    def length(self):
+        """A teljes útvonal hossza méterben."""
+        return self.cum[-1] if self.cum else 0.0
+
+    @property
+    def points(self):
+        """(lat, lon) párok sorban."""
+        return zip(self.lats, self.lons)
+
+    @property
+    def is_closed(self):
+        """Zárt kör-e (a rajt és a cél ugyanott van)."""
+        if self._closed is None:
+            self._closed = len(self) > 2 and point_distance(
+                self.lats[0], self.lons[0], self.lats[-1], self.lons[-1]) <= LOOP_CLOSE_DISTANCE
+        return self._closed
+
+    def distance_at(self, segment, ratio):
+        """Egy illesztés (szakasz + arány) starttól mért pályamenti távja."""
+        cum = self.cum
+        return cum[segment] + (cum[segment + 1] - cum[segment]) * ratio
+
+    def lap_crossing(self, segment, ratio, match):
+        """
+        Körváltás két egymás utáni illesztés között: +1, ha a futó a célon át a rajt
+        felé fordult (a táv a pálya hosszának felénél többet esett vissza), -1, ha
+        visszafelé lépett át a rajtvonalon, egyébként 0.
+        """
+        if segment is None or match is None or not 0 <= segment < len(self) - 1:
+            return 0
+        jump = match.distance - self.distance_at(segment, ratio)
+        half = self.length / 2
+        if jump < -half:
+            return 1
+        if jump > half:
+            return -1
+        return 0
+
+    def approx_size(self):
+        """Durva becslés a memóriafoglalásra (byte), az LRU kerethez."""
+        # A szakasz-index (vetített x/y + rács) nagyjából még egyszer ennyi
+        return 64 + len(self) * 6 * 8
+
+    @property
+    def segment_index(self):
+        """A map matching rács indexe, első használatkor épül fel (geometriánként egyszer)."""
+        if self._segment_index is None:
+            self._segment_index = SegmentIndex(self)
+        return self._segment_index
+
+    def match(self, lat, lon):
+        """
+        Map Matching: a jelet a legközelebbi szakaszra vetíti.
+        Visszaadja: MapMatch vagy None, ha üres a geometria.
+        """
+        count = len(self)
+        if count == 0:
+            return None
+        if count == 1:
+            return MapMatch(0, 0.0, 0.0, point_distance(self.lats[0], self.lons[0], lat, lon))
+        return self.segment_index.nearest(lat, lon)
+
+    def match_near(self, lat, lon, segment, ratio=0.0,
+                   behind=MATCH_WINDOW_BEHIND, ahead=MATCH_WINDOW_AHEAD):
+        """
+        Inkrementális map matching: csak a legutóbbi illesztés (szakasz + arány)
+        körüli ablakban keres, körpályán a cél után a rajt felé továbbfordulva.
+        A szakaszok közül az nyer, amelyiknél a pályától mért eltérés és a pályamenti
+        ugrás súlyozott összege a legkisebb. Ha a találat bizonytalan (messze van a
+        pályától, vagy az ablak szélére esik), globális keresésre (match) esik vissza.
+        """
+        count = len(self)
+        if segment is None or count < 2 or not 0 <= segment < count - 1:
+            return self.match(lat, lon)
+
+        cum = self.cum
+        length = cum[-1]
+        position = cum[segment] + (cum[segment + 1] - cum[segment]) * ratio
+        index = self.segment_index
+        x, y = index.project(lat, lon)
+
+        # Az ablakba eső szakaszok (körpályán a cél utáni rész a rajttól folytatódik)
+        first = max(0, bisect_right(cum, position - behind) - 1)
+        last = min(count - 2, bisect_left(cum, position + ahead))
+        windows = [(range(first, last + 1), 0.0)]
+        if position + ahead > length:
+            wrapped = min(count - 2, bisect_left(cum, position + ahead - length))
+            windows.append((range(0, wrapped + 1), length))
+
+        best_i, best_t, best_d2 = -1, 0.0, float('inf')
+        best_cost = float('inf')
+        for window, shift in windows:
+            for i in window:
+                t, d2 = index.project_on_segment(i, x, y)
+                along = cum[i] + (cum[i + 1] - cum[i]) * t + shift
+                cost = math.sqrt(d2) + MATCH_PROGRESS_WEIGHT * abs(along - position)
+                if cost < best_cost:
+                    best_i, best_t, best_d2, best_cost = i, t, d2, cost
+
+        at_edge = (best_i == last and best_t >= 1.0 and last < count - 2)
+        if best_i < 0 or at_edge or best_d2 > MATCH_CONFIDENCE_OFFSET ** 2:
+            return self.match(lat, lon)
+        return index._to_match(best_i, best_t, best_d2)
+
+    def match_sequence(self, points, segment, ratio=0.0):
+        """
+        Kötegelt inkrementális map matching: [(lat, lon), ...] sorban illeszti a pontokat,
+        mindegyiket az előző illesztés körül (mint a match_near láncolva).
+        NumPy-jal a köteg pontjait egyszerre vetítjük a helyi síkra, és az ablakon belüli
+        szakaszokat pontonként egy vektorművelettel értékeljük ki. Visszaadja: [MapMatch, ...].
+        """
+        if not numpy_enabled() or len(self) < 2:
+            matches = []
+            for lat, lon in points:
+                match = self.match_near(lat, lon, segment, ratio)
+                matches.append(match)
+                if match:
+                    segment, ratio = match.segment, match.ratio
+            return matches
+
+        index = self.segment_index
+        count = len(self)
+        cum = self.cum
+        cum_np = as_numpy(cum)
+        xs, ys = as_numpy(index.xs), as_numpy(index.ys)
+        length = cum[-1]
+        max_deviation2 = MATCH_CONFIDENCE_OFFSET ** 2
+
+        lats = np.array([point[0] for point in points], dtype=np.float64)
+        lons = np.array([point[1] for point in points], dtype=np.float64)
+        qxs = (lons - index.ref_lon) * index.kx
+        qys = (lats - index.ref_lat) * ONE_DEGREE
+
+        matches = []
+        for k, (lat, lon) in enumerate(points):
+            if segment is None or not 0 <= segment < count - 1:
+                match = self.match(lat, lon)
+                matches.append(match)
+                segment, ratio = match.segment, match.ratio
+                continue
+
+            position = cum[segment] + (cum[segment + 1] - cum[segment]) * ratio
+            first = max(0, bisect_right(cum, position - MATCH_WINDOW_BEHIND) - 1)
+            last = min(count - 2, bisect_left(cum, position + MATCH_WINDOW_AHEAD))
+            windows = [(first, last, 0.0)]
+            if position + MATCH_WINDOW_AHEAD > length:
+                wrapped = min(count - 2, bisect_left(cum, position + MATCH_WINDOW_AHEAD - length))
+                windows.append((0, wrapped, length))
+
+            best_i, best_t, best_d2 = -1, 0.0, float('inf')
+            best_cost = float('inf')
+            for lo, hi, shift in windows:
+                t, d2 = project_onto_segments(xs[lo:hi + 2], ys[lo:hi + 2], qxs[k:k + 1], qys[k:k + 1])
+                t, d2 = t[0], d2[0]
+                along = cum_np[lo:hi + 1] + (cum_np[lo + 1:hi + 2] - cum_np[lo:hi + 1]) * t + shift
+                cost = np.sqrt(d2) + MATCH_PROGRESS_WEIGHT * np.abs(along - position)
+                j = int(np.argmin(cost))
+                # Szigorú "<": a korábbi ablak nyer egyenlőségnél, mint a match_near-ben
+                if cost[j] < best_cost:
+                    best_i, best_t, best_d2, best_cost = lo + j, float(t[j]), float(d2[j]), cost[j]
+
+            at_edge = (best_i == last and best_t >= 1.0 and last < count - 2)
+            if at_edge or best_d2 > max_deviation2:
+                match = self.match(lat, lon)
+            else:
+                match = index._to_match(best_i, best_t, best_d2)
+            matches.append(match)
+            segment, ratio = match.segment, match.ratio
+        return matches
+
+    def simplified_indices(self, tolerance):
+        """A Douglas-Peucker egyszerűsítés után megmaradó pontok indexei."""
+        index = self.segment_index if len(self) > 1 else None
+        if index is None:
+            return list(range(len(self)))
+        return simplify_indices(index.xs, index.ys, tolerance)
+
+    def encoded_polyline(self, level=LOD_FULL):
+        """Az adott részletességi szintű útvonal encoded polyline formában."""
+        if level == LOD_FULL:
+            indices = range(len(self))
+        else:
+            indices = self.simplified_indices(LOD_TOLERANCES[level])
+        return encode_polyline((self.lats[i], self.lons[i]) for i in indices)
+
+    def lod_polylines(self):
+        """Az összes előre tárolt részletességi szint: {'coarse': '...', ...}."""
+        return {level: self.encoded_polyline(level) for level in LOD_TOLERANCES}
+
+    def position_at_distance(self, target_meters):
+        """
+        Bináris kereséssel megkeresi a target_meters-t közrefogó két pontot, és
+        lineárisan interpolál közöttük. Visszaadja: (lat, lon) vagy None, ha üres.
+        """
+        count = len(self)
+        if count == 0:
+            return None
+        if target_meters <= 0 or count == 1:
+            return self.lats[0], self.lons[0]
+        if target_meters >= self.cum[-1]:
+            return self.lats[-1], self.lons[-1]
+
+        i = bisect_left(self.cum, target_meters)  # cum[i-1] < target <= cum[i]
+        seg_len = self.cum[i] - self.cum[i - 1]
+        ratio = (target_meters - self.cum[i - 1]) / seg_len if seg_len > 0 else 0.0
+        lat = self.lats[i - 1] + (self.lats[i] - self.lats[i - 1]) * ratio
+        lon = self.lons[i - 1] + (self.lons[i] - self.lons[i - 1]) * ratio
+        return lat, lon
+
+
+class SegmentIndex:
+    """
+    Egyenletes rács a pálya szakaszai fölött, helyi (equirectangular) vetületben.
+    Minden szakasz azokba a cellákba kerül, amelyeket a befoglaló téglalapja érint,
+    így a keresés a jel cellájából gyűrűnként kifelé haladva hamar megáll.
+    """
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        count = len(geometry)
+        self.ref_lat = sum(geometry.lats) / count
+        self.ref_lon = sum(geometry.lons) / count
+        self.kx = math.cos(math.radians(self.ref_lat)) * ONE_DEGREE
+
+        self.xs, self.ys = project_local(geometry.lats, geometry.lons, self.ref_lat, self.ref_lon, self.kx)
+
+        min_x, max_x = min(self.xs), max(self.xs)
+        min_y, max_y = min(self.ys), max(self.ys)
+        segments = count - 1
+        # Cellaméret: kb. egy szakasz jusson egy cellára, ésszerű határok között
+        area = max(max_x - min_x, 1.0) * max(max_y - min_y, 1.0)
+        self.cell = min(MAX_CELL_SIZE, max(MIN_CELL_SIZE, math.sqrt(area / segments)))
+        self.min_x, self.min_y = min_x, min_y
+
+        cells = {}
+        xs, ys, cell = self.xs, self.ys, self.cell
+        for i in range(segments):
+            cx0 = int((min(xs[i], xs[i + 1]) - min_x) // cell)
+            cx1 = int((max(xs[i], xs[i + 1]) - min_x) // cell)
+            cy0 = int((min(ys[i], ys[i + 1]) - min_y) // cell)
+            cy1 = int((max(ys[i], ys[i + 1]) - min_y) // cell)
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    cells.setdefault((cx, cy), []).append(i)
+        self.cells = cells
+        self.max_cx = int((max_x - min_x) // cell)
+        self.max_cy = int((max_y - min_y) // cell)
+
+    def project(self, lat, lon):
+        """Földrajzi koordináta -> helyi (x, y) méterben."""
+        return (lon - self.ref_lon) * self.kx, (lat - self.ref_lat) * ONE_DEGREE
+
+    def project_on_segment(self, i, x, y):
+        """Az (x, y) pont vetítése az i. szakaszra: (arány 0-1, távolság négyzete)."""
+        ax, ay = self.xs[i], self.ys[i]
+        dx, dy = self.xs[i + 1] - ax, self.ys[i + 1] - ay
+        len2 = dx * dx + dy * dy
+        if len2 > 0:
+            t = ((x - ax) * dx + (y - ay) * dy) / len2
+            t = 0.0 if t < 0 else (1.0 if t > 1 else t)
+        else:
+            t = 0.0
+        px, py = ax + t * dx - x, ay + t * dy - y
+        return t, px * px + py * py
+
+    def _to_match(self, i, t, dist2):
+        geometry = self.geometry
+        # Zárt körön a közös rajt/cél pont a rajt (0 m), nem a pálya hossza: a körváltást
+        # így a rajt utáni szakaszra lépés jelzi, nem egy 'hossz -> 0' visszaugrás
+        if t >= 1.0 and i == len(geometry) - 2 and geometry.is_closed:
+            return MapMatch(0, 0.0, 0.0, math.sqrt(dist2))
+        cum = geometry.cum
+        along = cum[i] + (cum[i + 1] - cum[i]) * t
+        return MapMatch(i, t, along, math.sqrt(dist2))
+
+    def _ring(self, cx, cy, r):
+        """Az (cx, cy) körüli r sugarú gyűrű cellái, a rács határaira vágva."""
+        x0, x1 = max(cx - r, 0), min(cx + r, self.max_cx)
+        y0, y1 = max(cy - r + 1, 0), min(cy + r - 1, self.max_cy)
+        if r == 0:
+            yield cx, cy
+            return
+        for row in (cy - r, cy + r):
+            if 0 <= row <= self.max_cy:
+                for col in range(x0, x1 + 1):
+                    yield col, row
+        for col in (cx - r, cx + r):
+            if 0 <= col <= self.max_cx:
+                for row in range(y0, y1 + 1):
+                    yield col, row
+
+    def nearest(self, lat, lon):
+        """A legközelebbi szakaszra vetített illesztés (MapMatch)."""
+        x, y = self.project(lat, lon)
+        cell = self.cell
+        cx = int((x - self.min_x) // cell)
+        cy = int((y - self.min_y) // cell)
+
+        # Az első gyűrű, ami egyáltalán metszi a rácsot (ha a jel a rácson kívül van)
+        r = max(0, -cx, cx - self.max_cx, -cy, cy - self.max_cy)
+        r_max = max(cx, self.max_cx - cx, cy, self.max_cy - cy, r)
+
+        best_i, best_t, best_d2 = -1, 0.0, float('inf')
+        seen = set()
+        while r <= r_max:
+            for key in self._ring(cx, cy, r):
+                for i in self.cells.get(key, ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    t, d2 = self.project_on_segment(i, x, y)
+                    if d2 < best_d2:
+                        best_i, best_t, best_d2 = i, t, d2
+            # Minden még nem vizsgált cella legalább r * cell távolságra van
+            if best_i >= 0 and best_d2 <= (r * cell) ** 2:
+                break
+            r += 1
+        return self._to_match(best_i, best_t, best_d2)
+
+
+def encode_polyline(points, precision=5):
+    """
+    [(lat, lon), ...] -> Google encoded polyline string (alapból 1e-5 fok pontosság).
+    Tömörebb, mint a JSON koordinátalista: pontonként tipikusan 4-8 karakter.
+    """
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for lat, lon in points:
+        ilat, ilon = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else (delta << 1)
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return ''.join(chunks)
+
+
+def extract_points(gpx):
+    """
+    Kiteríti a GPX pontjait egy [(lat, lon), ...] listába.
+    Ha nincs track a fájlban, a route pontokat használjuk (mint a Track.save kezdőpontjánál).
+    """
+    points = []
+    for track in gpx.tracks:
+        for segment in track.segments:
+            for point in segment.points:
+                points.append((point.latitude, point.longitude))
+    if not points:
+        for route in gpx.routes:
+            for point in route.points:
+                points.append((point.latitude, point.longitude))
+    return points
+
+
+def build_geometry(gpx):
+    """Feldolgozott GPX objektumból TrackGeometry."""
+    return TrackGeometry.from_points(extract_points(gpx))
+
+
+def gpx_start_point(gpx):
+    """A pálya kezdőpontja (lat, lon): az első track pont, ha nincs track, az első route pont; vagy None."""
+    # Először próbáljuk track-ként
+    if gpx.tracks and gpx.tracks[0].segments and gpx.tracks[0].segments[0].points:
+        start_pt = gpx.tracks[0].segments[0].points[0]
+        return start_pt.latitude, start_pt.longitude
+    # Ha nincs track, próbáljuk route-ként
+    if gpx.routes and gpx.routes[0].points:
+        start_pt = gpx.routes[0].points[0]
+        return start_pt.latitude, start_pt.longitude
+    return None
+
+
+def parse_gpx_file(field_file):
+    """Megnyitja és feldolgozza a FileField mögötti GPX fájlt."""
+    with GPX_PARSE_SECONDS.time('cache_load'):
+        field_file.open()
+        try:
+            gpx = gpxpy.parse(field_file)
+        finally:
+            field_file.close()  # Fontos bezárni!
+        return build_geometry(gpx)
+
+
+def gpx_file_identity(field_file):
+    """
+    A fájl "személyazonossága" a cache kulcshoz: név, méret és módosítási idő.
+    Ha a storage nem tud méretet/időt adni, None kerül a helyükre.
+    """
+    name = field_file.name
+    storage = field_file.storage
+    try:
+        size = storage.size(name)
+    except (OSError, NotImplementedError):
+        size = None
+    try:
+        mtime = storage.get_modified_time(name).timestamp()
+    except (OSError, NotImplementedError, AttributeError):
+        mtime = None
+    return name, size, mtime
+
+
+class GeometryCache:
+    """
+    Szálbiztos, memóriakerettel korlátozott LRU gyorsítótár a pálya-geometriákhoz.
+    Kulcs: (track_id, fájlnév, méret, mtime) - ha a fájl kicserélődik, új kulcsot kap.
+    """
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'GPX_GEOMETRY_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+
+    def get(self, key):
+        with self._lock:
+            geometry = self._items.get(key)
+            if geometry is not None:
+                self._items.move_to_end(key)
+            return geometry
+
+    def put(self, key, geometry):
+        size = geometry.approx_size()
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old.approx_size()
+            # Ha egymagában is nagyobb a keretnél, nem tároljuk
+            if size > self.max_bytes:
+                return
+            self._items[key] = geometry
+            self._size += size
+            # LRU kilakoltatás, amíg bele nem férünk a keretbe
+            while self._size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= evicted.approx_size()
+
+    def invalidate(self, track_id):
+        """Az adott pályához tartozó összes bejegyzés törlése (pl. Track.save után)."""
+        with self._lock:
+            for key in [k for k in self._items if k[0] == track_id]:
+                self._size -= self._items.pop(key).approx_size()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def get_or_load(self, track_id, field_file, stored_index=None):
+        """
+        Visszaadja a geometriát a cache-ből. Cache miss esetén a tárolt indexből
+        (stored_index) tölt, ha van, különben feldolgozza a GPX fájlt.
+        """
+        key = (track_id,) + gpx_file_identity(field_file)
+        geometry = self.get(key)
+        if geometry is None:
+            # A betöltés a zároláson kívül fut, hogy ne blokkolja a többi szálat
+            if stored_index:
+                geometry = TrackGeometry.from_bytes(stored_index)
+            else:
+                geometry = parse_gpx_file(field_file)
+            self.put(key, geometry)
+        return geometry
+
+    def warm(self, track_id, field_file, geometry):
+        """Egy frissen feldolgozott geometria betétele a cache-be (a háttérfeldolgozás után)."""
+        self.put((track_id,) + gpx_file_identity(field_file), geometry)
+
+
+# Folyamat-szintű példány, ezt használja a Track modell
+geometry_cache = GeometryCache()
@@ -0,0 +1,127 @@
+"""
+Pálya fotók feldolgozása: reszponzív méretek (WebP + JPEG), EXIF nélkül.
+
+A feldolgozás háttérben fut (Track.process_image), nem a feltöltő kérésben. Egy méret
+("200", "400", "1200") a kép szélessége pixelben; kisebb képet nem nagyítunk fel.
+A változatok neve a kép tartalmának hash-éből képződik, így a böngésző korlátlanul
+cache-elheti őket, és ugyanazt a képet nem dolgozzuk fel újra.
+"""
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+# Előállított szélességek (px); a '400'-as JPEG a régi image_thumbnail mező értéke is
+IMAGE_SIZES = getattr(settings, 'TRACK_IMAGE_SIZES', (200, 400, 1200))
+THUMBNAIL_SIZE = 400
+
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+VARIANT_DIR = 'track_images/variants'
+
+# A Pillow WebP támogatása libwebp-től függ; ha nincs, csak JPEG készül
+WEBP_SUPPORTED = features.check('webp')
+
+
+def content_hash(file):
+    """A feltöltött fájl SHA-256 hash-e (darabonként olvasva, a fájlt visszatekerjük)."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1024 * 1024), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _encode(img, fmt):
+    out = BytesIO()
+    if fmt == 'webp':
+        img.save(out, format='WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        img.save(out, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def build_variants(file, prefix):
+    """
+    A kép összes méretének előállítása és mentése a tárolóba.
+    Visszaadja: (változatok, eredeti szélesség, eredeti magasság), ahol
+    változatok = {"400": {"width": .., "height": .., "jpeg": tárolt név, "webp": tárolt név}, ...}
+    """
+    file.seek(0)
+    img = Image.open(file)
+    # JPEG-nél a dekóder eleve kisebb felbontásban olvashat (egy 12 MP-es fotónál sokkal gyorsabb)
+    largest = max(IMAGE_SIZES)
+    img.draft('RGB', (largest * 2, largest * 2))
+    # A telefonos fotók elforgatása az EXIF alapján; az újrakódolt képekből az EXIF kimarad
+    img = ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    width, height = img.size
+    # draft() után az img.size már a csökkentett méret; az eredeti méretet a fejléc adja
+    original_width, original_height = _original_size(file)
+
+    variants = {}
+    for size in sorted(IMAGE_SIZES, reverse=True):
+        if size < width:
+            resized = img.resize((size, max(1, round(height * size / width))), Image.LANCZOS)
+        else:
+            resized = img
+        variant = {'width': resized.width, 'height': resized.height}
+        formats = ('jpeg', 'webp') if WEBP_SUPPORTED else ('jpeg',)
+        for fmt in formats:
+            extension = 'jpg' if fmt == 'jpeg' else fmt
+            name = f"{VARIANT_DIR}/{prefix}_{size}.{extension}"
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variant[fmt] = default_storage.save(name, ContentFile(_encode(resized, fmt)))
+        variants[str(size)] = variant
+        # A következő (kisebb) méretet az előzőből kicsinyítjük, nem a teljes képből
+        img, width, height = resized, resized.width, resized.height
+    return variants, original_width, original_height
+
+
+def _original_size(file):
+    file.seek(0)
+    with Image.open(file) as header:
+        transposed = header.getexif().get(0x0112) in (5, 6, 7, 8)  # 90°-os elforgatás
+        size = header.size
+    return (size[1], size[0]) if transposed else size
+
+
+def delete_variants(variants, keep=()):
+    """A régi változat fájlok törlése (a 'keep' nevek kivételével)."""
+    for variant in (variants or {}).values():
+        for fmt in ('jpeg', 'webp'):
+            name = variant.get(fmt)
+            if name and name not in keep and default_storage.exists(name):
+                default_storage.delete(name)
+
+
+def variant_prefix(track_id, digest):
+    # A pálya ID bármi lehet; fájlnévben csak a biztonságos része
+    safe_id = ''.join(ch for ch in str(track_id) if ch.isalnum() or ch in '-_') or 'track'
+    return f"{safe_id}_{digest[:12]}"
+
+
+def variant_urls(variants):
+    """Tárolt nevek -> URL-ek (az API-nak)."""
+    return {
+        size: {key: (default_storage.url(value) if key in ('jpeg', 'webp') else value)
+               for key, value in variant.items()}
+        for size, variant in (variants or {}).items()
+    }
+
+
+def thumbnail_name(variants):
+    variant = (variants or {}).get(str(THUMBNAIL_SIZE))
+    return variant['jpeg'] if variant else None
+
+
+def variant_names(variants):
+    """Az összes tárolt fájlnév a változatokból."""
+    return {variant[fmt] for variant in (variants or {}).values() for fmt in ('jpeg', 'webp') if variant.get(fmt)}
@@ -0,0 +1,158 @@
+"""
+DB alapú háttérfeladatok feldolgozása: lefoglalás, futtatás, újrapróbálás, karbantartás.
+
+Feladat típusok (HANDLERS):
+  - track.gpx: GPX feldolgozás - geometria index, LOD útvonalak, cache feltöltés (Track.process_gpx)
+  - track.image: reszponzív képváltozatok (Track.process_image)
+  - track.stats: a pálya futó statisztikáinak újraszámolása új körhossznál (UserTrackStats.rebuild_track)
+
+A webszerver folyamatában JOB_WORKERS szál dolgozik (job_pool, induláskor a
+BackgroundWorkersMiddleware indítja); JOB_WORKERS = 0 mellett a run_jobs parancs a worker,
+külön folyamatban. A lefoglalás feltételes UPDATE, így egy feladatot egyszerre csak egy worker futtat.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .background import WorkerPool
+from .models import Job, Track, UserTrackStats
+
+# Folyamaton belüli worker szálak száma (0 = csak a run_jobs parancs dolgozik)
+JOB_WORKERS = getattr(settings, 'JOB_WORKERS', 2)
+
+# Ennyi ideje futó feladat workere elhalt -> a feladat újra sorba kerül
+JOB_LOCK_TIMEOUT = timedelta(minutes=10)
+
+# A kész feladatokat ennyi ideig tartjuk meg (admin / hibakeresés)
+JOB_RETENTION = timedelta(days=7)
+
+# Újrapróbálás előtti várakozás: RETRY_BACKOFF * próbálkozás^2 (10 s, 40 s, ...)
+RETRY_BACKOFF = timedelta(seconds=10)
+
+# Egy lefoglalási körben ennyi jelöltet nézünk (ha a többi worker elvitte az elsőt)
+CLAIM_CANDIDATES = 5
+
+HOUSEKEEPING_INTERVAL = timedelta(minutes=1)
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Feladat típus regisztrálása: @handler('track.gpx') def ...(**payload)"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+@handler('track.gpx')
+def process_track_gpx(track_id):
+    Track.process_gpx(track_id)
+
+
+@handler('track.image')
+def process_track_image(track_id):
+    Track.process_image(track_id)
+
+
+@handler('track.stats')
+def rebuild_track_stats(track_id):
+    UserTrackStats.rebuild_track(track_id)
+
+
+def claim_job(worker_id):
+    """
+    A legrégebben futtatható feladat lefoglalása (vagy None). Optimista zárolás: az UPDATE csak
+    akkor sikerül, ha közben más worker nem vette el - minden adatbázison működik, SQLite-on is.
+    """
+    now = timezone.now()
+    candidates = list(Job.objects.filter(status='queued', run_after__lte=now)
+                      .order_by('run_after', 'pk').values_list('pk', flat=True)[:CLAIM_CANDIDATES])
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Egy lefoglalt feladat futtatása. Hibánál újrapróbálás késleltetéssel, amíg van próbálkozás."""
+    # Csak a saját zárolásunkat írjuk (ha közben elakadtnak nyilvánították, más viszi tovább)
+    own = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by)
+    func = HANDLERS.get(job.kind)
+    if func is None:
+        own.update(status='failed', last_error=f"Ismeretlen feladat típus: {job.kind}", finished_at=timezone.now())
+        return False
+    try:
+        func(**job.payload)
+    except Exception as e:
+        print(f"Háttérfeladat hiba ({job}): {e}")
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            own.update(status='queued', last_error=str(e), locked_by="", locked_at=None,
+                       run_after=now + RETRY_BACKOFF * job.attempts ** 2)
+        else:
+            own.update(status='failed', last_error=str(e), finished_at=now)
+        return False
+    own.update(status='done', last_error="", finished_at=timezone.now())
+    return True
+
+
+def housekeeping(now=None):
+    """
+    Elakadt feladatok (a worker futás közben leállt) visszatétele a sorba, illetve hibásra
+    állítása, ha elfogytak a próbálkozások; a régi kész feladatok törlése.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(status='running', locked_at__lt=now - JOB_LOCK_TIMEOUT)
+    message = "A worker nem fejezte be a feladatot (lejárt zárolás)"
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', locked_by="", locked_at=None, run_after=now, last_error=message,
+    )
+    failed = stale.update(status='failed', last_error=message, finished_at=now)
+    purged, _ = Job.objects.filter(status='done', finished_at__lt=now - JOB_RETENTION).delete()
+    return requeued, failed, purged
+
+
+_last_housekeeping = None
+
+
+def run_next_job(worker_id):
+    """Egy feladat lefoglalása és futtatása. False, ha nem volt futtatható feladat."""
+    global _last_housekeeping
+    now = timezone.now()
+    if _last_housekeeping is None or now - _last_housekeeping > HOUSEKEEPING_INTERVAL:
+        _last_housekeeping = now
+        housekeeping(now)
+
+    job = claim_job(worker_id)
+    if job is None:
+        return False
+    run_job(job)
+    return True
+
+
+def run_pending_jobs(worker_id='sync', limit=None):
+    """A most futtatható feladatok feldolgozása a hívó szálon; visszaadja a futtatott darabszámot."""
+    count = 0
+    while limit is None or count < limit:
+        if not run_next_job(worker_id):
+            break
+        count += 1
+    return count
+
+
+def job_counts():
+    """Feladatok száma típusonként és állapotonként: {"track.gpx": {"queued": 2, "done": 10}, ...}"""
+    counts = {}
+    for row in Job.objects.values('kind', 'status').annotate(count=Count('pk')).order_by('kind'):
+        counts.setdefault(row['kind'], {})[row['status']] = row['count']
+    return counts
+
+
+# Folyamat-szintű készlet; a Job.enqueue ébreszti (background.wake_workers)
+job_pool = WorkerPool('jobs', run_next_job, workers=JOB_WORKERS)
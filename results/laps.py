@@ -0,0 +1,71 @@
+"""
+Köridő lekérdezések a LapSplit táblán (egész ms, indexelt), szöveg-parse-olás nélkül.
+
+  - fastest_laps: egy pálya leggyorsabb körei (opcionálisan csak az n. körök) - (track, [lap_number,] duration_ms) index
+  - fastest_lap_per_track: minden pálya leggyorsabb köre - pályánként egy index-keresés (részlekérdezés)
+  - compare_splits: több eredmény köridői egymás mellett, az első eredményhez mért különbséggel
+"""
+from django.db.models import F, OuterRef, Subquery
+
+from .durations import format_duration
+from .models import LapSplit, Track
+
+SPLIT_FIELDS = ('result_id', 'lap_number', 'duration_ms', 'cumulative_ms')
+
+# Egy összehasonlításban legfeljebb ennyi másik eredmény
+MAX_COMPARE_RESULTS = 10
+
+
+def _with_time(row):
+    row['time'] = format_duration(row['duration_ms'])
+    return row
+
+
+def fastest_laps(track_id, lap_number=None, limit=10):
+    """Egy pálya leggyorsabb körei (legfeljebb 'limit' db), a futó nevével és a futás dátumával."""
+    splits = LapSplit.objects.filter(track_id=track_id)
+    if lap_number is not None:
+        splits = splits.filter(lap_number=lap_number)
+    rows = (splits.order_by('duration_ms', 'result_id', 'lap_number')
+            .values(*SPLIT_FIELDS, 'user_id', runner_name=F('result__runner_name'), date=F('result__date'))[:limit])
+    return [_with_time(row) for row in rows]
+
+
+def fastest_lap_per_track():
+    """Pályánként a leggyorsabb kör (két lekérdezés, függetlenül a körök számától)."""
+    best = LapSplit.objects.filter(track=OuterRef('pk')).order_by('duration_ms', 'result_id').values('pk')[:1]
+    best_ids = dict(
+        Track.objects.annotate(best_split=Subquery(best))
+        .filter(best_split__isnull=False)
+        .values_list('best_split', 'name')
+    )
+    rows = (LapSplit.objects.filter(pk__in=best_ids)
+            .values(*SPLIT_FIELDS, 'id', 'track_id', runner_name=F('result__runner_name'), date=F('result__date')))
+    records = []
+    for row in rows:
+        row['track_name'] = best_ids[row.pop('id')]
+        records.append(_with_time(row))
+    return sorted(records, key=lambda row: row['track_name'])
+
+
+def compare_splits(result_ids):
+    """
+    Eredmények köridői körönként: {"laps": [{"lap_number": 1, "splits": {result_id: {...}}}, ...]}.
+    A 'delta_ms' az első megadott eredmény ugyanazon köréhez mért különbség (pozitív = lassabb).
+    """
+    by_lap = {}
+    for row in LapSplit.objects.filter(result_id__in=result_ids).values(*SPLIT_FIELDS):
+        by_lap.setdefault(row['lap_number'], {})[row['result_id']] = _with_time(row)
+
+    reference = result_ids[0] if result_ids else None
+    laps = []
+    for lap_number in sorted(by_lap):
+        splits = by_lap[lap_number]
+        base = splits.get(reference)
+        for result_id, split in splits.items():
+            split['delta_ms'] = split['duration_ms'] - base['duration_ms'] if base else None
+        laps.append({
+            "lap_number": lap_number,
+            "splits": {result_id: splits[result_id] for result_id in result_ids if result_id in splits},
+        })
+    return {"result_ids": list(result_ids), "laps": laps}
@@ -0,0 +1,76 @@
+"""
+Ranglista lekérdezések a Result.duration_ms alapján.
+
+Minden lekérdezés a (track, duration_ms) vagy a (track, laps_count, duration_ms) indexet
+használja: a top-N egy index-szakasz eleje, a helyezés egy COUNT az index egy szakaszán,
+így nem kell a pálya összes eredményét betölteni és rendezni.
+"""
+from .durations import format_pace
+from .models import Result
+
+# Egy kérésben legfeljebb ennyi helyezést adunk vissza
+MAX_LIMIT = 100
+
+LEADERBOARD_FIELDS = ('id', 'runner_name', 'user_id', 'time', 'duration_ms', 'pace_ms_per_km', 'laps_count', 'date')
+
+
+def laps_for_distance(track, distance_km):
+    """Táv (km) -> körszám az adott pályán; None, ha a táv nem egész számú kör."""
+    if track.distance_km_per_lap <= 0:
+        return None
+    laps = distance_km / track.distance_km_per_lap
+    if laps < 1 or abs(laps - round(laps)) > 0.01:
+        return None
+    return int(round(laps))
+
+
+def ranked_queryset(track_id, laps=None):
+    """Az időeredménnyel rendelkező eredmények egy pályán (opcionálisan adott körszámra), idő szerint."""
+    results = Result.objects.filter(track_id=track_id, duration_ms__isnull=False)
+    if laps is not None:
+        results = results.filter(laps_count=laps)
+    return results.order_by('duration_ms', 'recorded_at')
+
+
+def top_results(track_id, laps=None, limit=10, offset=0):
+    """
+    A legjobb 'limit' eredmény (offset-től) helyezéssel.
+    Holtversenynél azonos helyezés jár (1, 2, 2, 4).
+    """
+    rows = list(ranked_queryset(track_id, laps).values(*LEADERBOARD_FIELDS)[offset:offset + limit])
+    if not rows:
+        return []
+
+    # Az első sor helyezése: hány eredmény jobb nála (offset > 0 esetén nem feltétlenül offset+1)
+    rank = rank_for_duration(track_id, rows[0]['duration_ms'], laps)
+    previous = rows[0]['duration_ms']
+    for position, row in enumerate(rows):
+        if row['duration_ms'] != previous:
+            rank = offset + position + 1
+            previous = row['duration_ms']
+        row['rank'] = rank
+        row['pace'] = format_pace(row['pace_ms_per_km'])
+    return rows
+
+
+def rank_for_duration(track_id, duration_ms, laps=None):
+    """Helyezés egy adott időhöz: 1 + a nála jobb eredmények száma (index-szakasz COUNT)."""
+    return ranked_queryset(track_id, laps).filter(duration_ms__lt=duration_ms).count() + 1
+
+
+def rank_of_result(result, same_laps=True):
+    """
+    Egy eredmény helyezése a pályáján (alapból az azonos körszámú futások között).
+    Visszaadja: {"rank": .., "total": .., "percentile": ..} vagy None, ha nincs értelmezhető ideje.
+    """
+    if result.duration_ms is None:
+        return None
+    laps = result.laps_count if same_laps else None
+    rank = rank_for_duration(result.track_id, result.duration_ms, laps)
+    total = ranked_queryset(result.track_id, laps).count()
+    return {
+        "rank": rank,
+        "total": total,
+        # Hány százaléknál jobb (az utolsó 0, az egyedüli/első 100)
+        "percentile": round(100.0 * (total - rank) / (total - 1), 1) if total > 1 else 100.0,
+    }
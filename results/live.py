@@ -0,0 +1,367 @@
+"""
+Live Tracker állapotgép: a GPS jelek feldolgozása (rajt, auto-pause, körváltás, célbaérés).
+
+Az egyes (update_gps_position), a kötegelt (update_gps_batch) és a kézi táv
+(update_live_distance) végpont is ezt használja, így a logika egy helyen van.
+A függvények csak a LiveRun objektumot módosítják, a mentés a hívó dolga
+(a live_state motor dönti el, mikor kerül a DB-be).
+
+Itt van a stopper kijelző státusz-válasza (live_status_payload) is, amit a polling és az
+SSE stream egyaránt használ, valamint a LiveRun változások folyamaton belüli jelzője.
+"""
+import json
+import math
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geometry import MATCH_WINDOW_BEHIND, MapMatch
+
+# Küszöbérték: 2.5 km/h (séta tempó alatt) -> auto-pause
+AUTO_PAUSE_THRESHOLD = 2.5
+
+# Egy kötegben legfeljebb ennyi GPS pontot fogadunk el
+MAX_BATCH_SIZE = 1000
+
+
+def calculate_pace_and_speed(distance_delta_m, time_delta_sec):
+    """
+    Kiszámolja a sebességet (km/h) és a tempót (min/km).
+    """
+    if time_delta_sec <= 0 or distance_delta_m <= 0:
+        return 0.0, "-:--"
+
+    # Sebesség: m/s -> km/h
+    speed_mps = distance_delta_m / time_delta_sec
+    speed_kmh = speed_mps * 3.6
+
+    # Pace: min/km
+    # 1000m / (m/s) = másodperc/km
+    seconds_per_km = 1000 / speed_mps
+    pace_min = int(seconds_per_km // 60)
+    pace_sec = int(seconds_per_km % 60)
+    pace_str = f"{pace_min}:{pace_sec:02d}"
+
+    return round(speed_kmh, 2), pace_str
+
+
+def parse_fix_time(value):
+    """
+    A kliens (telefon) időbélyegének feldolgozása.
+    Elfogad Unix időt másodpercben vagy ezredmásodpercben, illetve ISO 8601 stringet.
+    """
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.replace('.', '', 1).isdigit()):
+        ts = float(value)
+        if ts > 1e11:  # ezredmásodperc
+            ts /= 1000.0
+        return datetime.fromtimestamp(ts, tz=dt_timezone.utc)
+
+    parsed = parse_datetime(str(value)) if value else None
+    if parsed is None:
+        raise ValueError(f"Érvénytelen időbélyeg: {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+# Jelzi, hogy a map matchinget az apply_gps_fix maga végezze
+_MATCH_HERE = object()
+
+
+def apply_gps_fix(run, track, lat, lon, now, match=_MATCH_HERE):
+    """
+    A "SMART BRAIN" + AUTO-PAUSE: egy GPS jel alkalmazása a futásra.
+    'now' a jel időpontja (egyes végpontnál a szerver ideje, kötegnél a kliensé).
+    'match' előre kiszámolt (kötegelt) map matching eredmény, ha van.
+    Visszaadja a kliensnek szánt választ (dict). Nem ment!
+    """
+    if run.status == 'finished':
+        return {"status": "finished"}
+
+    # Az előző jel ideje (régi soroknál a last_update, ha még nincs last_fix_at)
+    prev_fix_at = run.last_fix_at or run.last_update or now
+    run.last_fix_at = now
+
+    # 1. MAP MATCHING (a legutóbbi illesztés körül keresünk, nem az egész pályán)
+    prev_segment, prev_ratio = run.matched_segment, run.matched_ratio
+    if match is _MATCH_HERE:
+        match = track.match_position(lat, lon, prev_segment, prev_ratio)
+    geometry = track.get_geometry() if match else None
+    lap_len_m = track.distance_km_per_lap * 1000
+    if match and geometry is not None and geometry.length > 0:
+        # Zárt körön a rajt előtti (a zajtól a cél elé eső) jel még a rajtvonalon van
+        if (run.status == 'ready' and geometry.is_closed
+                and match.distance > geometry.length - MATCH_WINDOW_BEHIND):
+            match = MapMatch(0, 0.0, 0.0, match.deviation)
+        run.matched_segment = match.segment
+        run.matched_ratio = match.ratio
+        # A tárolt körhossz kerekített (km), a GPX geometria hosszához arányosítunk
+        matched_distance = float(match.distance) * lap_len_m / geometry.length
+    else:
+        matched_distance = 0.0
+        run.matched_segment = None
+        run.matched_ratio = 0.0
+
+    # Körváltás logika: az illesztés a cél után a rajtnál folytatódik (vége -> eleje ugrás)
+    if run.status in ['running', 'paused'] and geometry is not None:
+        crossing = geometry.lap_crossing(prev_segment, prev_ratio, match)
+        if crossing > 0:
+            run.current_lap += 1
+        elif crossing < 0 and run.current_lap > 1:
+            run.current_lap -= 1
+        elif crossing < 0:
+            # Az első körben a rajt mögé nem lépünk vissza
+            matched_distance = 0.0
+            run.matched_segment = 0
+            run.matched_ratio = 0.0
+
+    # Teljes táv
+    current_lap_calc = max(1, run.current_lap)
+    real_total_dist = ((current_lap_calc - 1) * lap_len_m) + matched_distance
+
+    # 2. ÁLLAPOTGÉP ÉS AUTO-PAUSE
+
+    # A) RAJT
+    if run.status == 'ready':
+        run.status = 'running'
+        run.start_time = now
+        run.current_lap = 1
+        run.current_lap_start = now
+        run.current_distance = matched_distance
+        return {"status": "started", "msg": "Rajt érzékelve!"}
+
+    # B) FUTÁS / SZÜNET KEZELÉSE (running vagy paused)
+    # Fizika számítása
+    time_diff = (now - prev_fix_at).total_seconds()
+    dist_diff = real_total_dist - run.current_distance
+
+    # Sebesség számítás (ha telt el idő)
+    current_speed = 0
+    if time_diff > 0:
+        # m/s -> km/h
+        current_speed = (dist_diff / time_diff) * 3.6
+
+        # Pace számítás
+        if dist_diff > 0:
+            _, pace = calculate_pace_and_speed(dist_diff, time_diff)
+            run.current_pace = pace
+            run.current_speed = current_speed
+
+    # --- AUTO-PAUSE LOGIKA ---
+    if current_speed < AUTO_PAUSE_THRESHOLD:
+        # Ha lassú, és eddig futott -> PAUSE
+        if run.status == 'running':
+            run.status = 'paused'
+    else:
+        # Ha gyors, és eddig állt -> RUNNING
+        if run.status == 'paused':
+            run.status = 'running'
+    # -------------------------
+
+    # Adatok frissítése
+    run.current_distance = real_total_dist
+
+    # Progress %
+    total_race_len_m = lap_len_m * run.target_laps
+    if total_race_len_m > 0:
+        run.progress_percent = min(100.0, (real_total_dist / total_race_len_m) * 100)
+
+    # C) CÉLBAÉRÉS
+    if real_total_dist >= (total_race_len_m * 0.98):
+        run.status = 'finished'
+        run.current_distance = total_race_len_m
+        run.progress_percent = 100.0
+        return {"status": "finished"}
+
+    return {
+        "status": run.status, # Visszaküldjük, hogy tudd: épp pause vagy run van-e
+        "dist": real_total_dist,
+        "speed": round(current_speed, 1)
+    }
+
+
+def apply_gps_batch(run, track, fixes, received_at):
+    """
+    Időrendbe rendezett GPS pontok [(idő, lat, lon), ...] alkalmazása ugyanazon az
+    állapotgépen. A már feldolgozottnál nem újabb pontokat (pl. újraküldött köteg)
+    kihagyja; a célbaérés után a maradékot eldobja.
+    Visszaadja: (utolsó válasz, alkalmazott pontok listája, kihagyott db). Nem ment!
+    """
+    fixes = sorted(fixes, key=lambda fix: fix[0])
+
+    # Ha a telefon órája siet, eltoljuk a köteget, hogy a legutolsó pont ne legyen a jövőben
+    if fixes and fixes[-1][0] > received_at:
+        skew = fixes[-1][0] - received_at
+        fixes = [(fix_time - skew, lat, lon) for fix_time, lat, lon in fixes]
+
+    # A már feldolgozott (újraküldött) és a duplikált időbélyegű pontok kiszűrése
+    fresh = []
+    last_fix_at = run.last_fix_at
+    for fix in fixes:
+        if last_fix_at is None or fix[0] > last_fix_at:
+            fresh.append(fix)
+            last_fix_at = fix[0]
+    skipped = len(fixes) - len(fresh)
+
+    # Map matching egyben az egész kötegre (vektorizált), a legutóbbi illesztéstől indulva
+    matches = []
+    if fresh and run.status != 'finished':
+        matches = track.match_positions([(lat, lon) for _, lat, lon in fresh],
+                                        run.matched_segment, run.matched_ratio)
+
+    response = {"status": run.status}
+    applied = []
+    for fix, match in zip(fresh, matches):
+        if run.status == 'finished':
+            break
+        fix_time, lat, lon = fix
+        response = apply_gps_fix(run, track, lat, lon, fix_time, match)
+        applied.append(fix)
+    skipped += len(fresh) - len(applied)
+    return response, applied, skipped
+
+
+def apply_distance_update(run, new_distance, now):
+    """
+    Kézi/Szimulált távolság alkalmazása (update_live_distance): rajt, sebesség,
+    körszámlálás és részidők, célbaérés. Visszaadja a kliensnek szánt választ. Nem ment!
+    """
+    # Pálya hossza (1 kör) méterben
+    lap_len_m = run.track.distance_km_per_lap * 1000
+    total_race_len_m = lap_len_m * run.target_laps
+
+    # --- 1. RAJT LOGIKA (Öngyógyító) ---
+    # Ha 'ready', VAGY 'running' de hiányzik a start idő (ez okozhatta a fagyást!)
+    if run.status == 'ready' or (run.status == 'running' and not run.start_time):
+        run.status = 'running'
+        run.start_time = now
+        run.current_lap = 1
+        run.current_lap_start = now
+        run.current_distance = new_distance
+        run.last_update = now
+        return {"status": "started", "run_status": "running"}
+
+    # --- 2. SEBESSÉG SZÁMÍTÁS ---
+    last_update_safe = run.last_update or now
+    time_diff = (now - last_update_safe).total_seconds()
+    dist_diff = new_distance - run.current_distance
+
+    if time_diff > 0 and dist_diff > 0:
+        speed, pace = calculate_pace_and_speed(dist_diff, time_diff)
+        run.current_speed = speed
+        run.current_pace = pace
+
+    # --- 3. KÖRSZÁMLÁLÁS ÉS RÉSZIDŐK ---
+    if lap_len_m > 0:
+        calculated_lap = math.ceil(new_distance / lap_len_m)
+
+        # Ha átléptünk egy új körbe
+        if calculated_lap > run.current_lap:
+            start_ref = run.current_lap_start or run.start_time or now
+            prev_lap_time = now - start_ref
+
+            minutes, seconds = divmod(prev_lap_time.total_seconds(), 60)
+            lap_str = f"{int(minutes):02}:{int(seconds):02}"
+
+            # BIZTONSÁGOS LOG MENTÉS
+            try:
+                current_logs = json.loads(run.lap_times_log or "[]")
+            except:
+                current_logs = []
+            current_logs.append(lap_str)
+            run.lap_times_log = json.dumps(current_logs)
+
+            # Kör adatainak frissítése
+            run.current_lap = calculated_lap
+            run.current_lap_start = now
+
+    # --- 4. ADATOK MENTÉSE ÉS CÉLBAÉRÉS ---
+    run.current_distance = new_distance
+
+    if new_distance >= total_race_len_m:
+        run.status = 'finished'
+        run.progress_percent = 100.0
+
+        # Utolsó kör mentése biztonságosan
+        start_ref = run.current_lap_start or run.start_time or now
+        elapsed_last = now - start_ref
+        minutes, seconds = divmod(elapsed_last.total_seconds(), 60)
+        last_lap_str = f"{int(minutes):02}:{int(seconds):02}"
+
+        # Duplikáció elkerülése és mentés
+        try:
+            current_logs = json.loads(run.lap_times_log or "[]")
+            if len(current_logs) < run.target_laps:
+                 current_logs.append(last_lap_str)
+                 run.lap_times_log = json.dumps(current_logs)
+        except:
+            pass
+
+    else:
+        if total_race_len_m > 0:
+            run.progress_percent = min(100.0, (new_distance / total_race_len_m) * 100)
+
+        if run.status == 'paused':
+            run.status = 'running'
+
+    return {"status": "updated", "run_status": run.status}
+
+
+def live_status_payload(run, now=None):
+    """
+    A stopper kijelző adatai egy futásról (get_live_status és az SSE stream is ezt küldi).
+    Az időt NEM a böngésző méri, hanem a szerver start_time alapján számoljuk!
+    """
+    if run is None:
+        return {"status": "idle"}
+
+    # Eltelt idő számítása szerver oldalon
+    elapsed_seconds = 0
+    if run.start_time and run.status in ['running', 'finished']:
+        # Ha fut, akkor most - start. Ha kész, akkor az utolsó jel - start.
+        end_time = (run.last_fix_at or run.last_update) if run.status == 'finished' else (now or timezone.now())
+        delta = end_time - run.start_time
+        elapsed_seconds = delta.total_seconds()
+
+    return {
+        "status": run.status,
+        "track_id": run.track.id,
+        "track_name": run.track.name,
+        "current_distance": run.current_distance,
+        "total_distance": run.track.distance_km_per_lap * 1000 * run.target_laps,
+        "current_lap": run.current_lap,
+        "target_laps": run.target_laps,
+        "speed": run.current_speed,
+        "pace": run.current_pace,
+        "elapsed_seconds": elapsed_seconds, # A kliens ebből formázza az órát (HH:MM:SS)
+        "progress": run.progress_percent,
+        "lap_times": run.lap_times_log
+    }
+
+
+class ChangeNotifier:
+    """
+    Folyamaton belüli változásszámláló felhasználónként: a LiveRun mentésekor nő,
+    így az SSE stream DB lekérdezés nélkül látja, hogy van-e új adat.
+    (Több worker esetén a stream ezen felül ritkábban a DB-t is ellenőrzi.)
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def notify(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def version(self, key):
+        return self._versions.get(key, 0)
+
+
+# A LiveRun post_save/post_delete jelzése ide fut be (models.py)
+live_run_changes = ChangeNotifier()
+
+# Kulcs, ami bármelyik futás változásakor nő (a Dashboard pillanatképéhez)
+ANY_RUN = '*'
@@ -0,0 +1,190 @@
+"""
+Aktív futók pillanatképe a Dashboardhoz (api/live/active/).
+
+A pillanatképet nem minden kérésnél számoljuk újra: egy folyamaton belül közös,
+és csak akkor építjük újra, ha a futások változtak. Ezt a LiveRun mentéskor
+jelzett számláló (live_run_changes) mutatja meg, illetve - más workerekben történt
+mentések miatt - egy olcsó aggregált lekérdezés (db, max last_update) és a live_engine
+tárolójának verziója, de legfeljebb FEED_REFRESH_SECONDS-onként. Így a költség a
+futások változásával arányos, nem a nézők x futók számával.
+
+Minden változás növeli a verziót; a kliens a legutóbbi verziótól kérheti csak a
+változásokat (deltát). A verzió tartalmaz egy folyamat-azonosítót (epoch) is:
+ha a kérés másik workerhez fut be, vagy túl régi, teljes pillanatképet kap.
+"""
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .live import live_run_changes, ANY_RUN
+from .live_state import live_engine
+from .models import LiveRun
+
+# Ennyi ideig számít aktívnak egy futás az utolsó jel után
+ACTIVE_WINDOW = timedelta(hours=1)
+
+# Legfeljebb ilyen gyakran nézzük meg, hogy kell-e újraépíteni (másodperc)
+FEED_REFRESH_SECONDS = getattr(settings, 'LIVE_FEED_REFRESH_SECONDS', 1.0)
+
+# Ennyi törölt futót tartunk meg a deltákhoz; ennél régebbi verzióra teljes választ adunk
+MAX_TOMBSTONES = 500
+
+
+def runner_entry(run):
+    """Egy futó adatai a Dashboardnak (a térképes pozícióval együtt)."""
+    # --- RELATÍV POZÍCIÓ (Modulo) ---
+    track_len_m = run.track.distance_km_per_lap * 1000
+
+    if track_len_m > 0:
+        # A % (modulo) operátor megadja a körön belüli pozíciót
+        relative_distance = run.current_distance % track_len_m
+
+        # Speciális eset: Célban vagyunk (maradék 0), de nem a startnál
+        if relative_distance == 0 and run.current_distance > 0:
+            relative_distance = track_len_m
+    else:
+        relative_distance = 0
+
+    # A relatív távolságot használjuk a koordinátához (a geometria a cache-ből jön)
+    coords = run.track.get_lat_lon_at_distance(relative_distance)
+
+    return {
+        'id': run.pk,
+        'full_name': run.user.get_full_name() or run.user.username,
+        'track_id': run.track.id,
+        'track_name': run.track.name,
+        'distance': run.current_distance,
+        'position': coords,
+        'status': run.status
+    }
+
+
+class ActiveRunnersFeed:
+    """
+    Folyamaton belül közös, verziózott pillanatkép az aktív futókról.
+    A verzió formája: '<epoch>.<sorszám>'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self._entries = {}       # run id -> futó adatai
+        self._changed_at = {}    # run id -> melyik verzióban változott utoljára
+        self._removed_at = {}    # run id -> melyik verzióban tűnt el
+        self._horizon = 0        # ennél régebbi verziótól nem tudunk deltát adni
+        self._fingerprint = None
+        self._seen_notify = None
+        self._checked_at = None
+
+    # --- FRISSÍTÉS ---
+
+    def _active_runs(self, cutoff):
+        return LiveRun.objects.filter(last_update__gte=cutoff)
+
+    def _current_fingerprint(self, cutoff):
+        stats = self._active_runs(cutoff).aggregate(count=Count('id'), latest=Max('last_update'))
+        return stats['count'], stats['latest'], live_engine.version()
+
+    def _rebuild(self, cutoff):
+        # Egyetlen lekérdezés a futókkal, pályákkal és felhasználókkal (nincs N+1).
+        # A nagy geometria mezőket nem töltjük le: a pozíció a geometry_cache-ből jön.
+        runs = list(
+            self._active_runs(cutoff)
+            .select_related('user', 'track')
+            .defer('track__geometry_index', 'track__simplified_geometry')
+            .order_by('pk')
+        )
+        self._fingerprint = (len(runs), max((run.last_update for run in runs), default=None),
+                             live_engine.version())
+        # A még ki nem írt (memóriában lévő) állapot felülírja a DB sort
+        runs = live_engine.overlay(runs)
+
+        entries = {run.pk: runner_entry(run) for run in runs}
+        changed = [pk for pk, entry in entries.items() if self._entries.get(pk) != entry]
+        removed = [pk for pk in self._entries if pk not in entries]
+        if not changed and not removed:
+            return
+
+        self.version += 1
+        for pk in changed:
+            self._changed_at[pk] = self.version
+            self._removed_at.pop(pk, None)
+        for pk in removed:
+            del self._changed_at[pk]
+            self._removed_at[pk] = self.version
+        self._entries = entries
+
+        # A túl sok törlési jelet eldobjuk, ennél régebbi verzióra teljes válasz megy
+        if len(self._removed_at) > MAX_TOMBSTONES:
+            oldest = sorted(self._removed_at.items(), key=lambda item: item[1])
+            for pk, version in oldest[:len(oldest) - MAX_TOMBSTONES]:
+                del self._removed_at[pk]
+                self._horizon = max(self._horizon, version)
+
+    def refresh(self, force=False):
+        """Újraépíti a pillanatképet, ha a futások változtak (legfeljebb FEED_REFRESH_SECONDS-onként)."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < FEED_REFRESH_SECONDS:
+                return
+            self._checked_at = now
+            cutoff = timezone.now() - ACTIVE_WINDOW
+
+            notified = live_run_changes.version(ANY_RUN)
+            if force or notified != self._seen_notify or self._fingerprint is None:
+                self._seen_notify = notified
+                self._rebuild(cutoff)
+            elif self._current_fingerprint(cutoff) != self._fingerprint:
+                # Másik workerben történt mentés, vagy egy futás kiesett az aktív ablakból
+                self._rebuild(cutoff)
+
+    # --- LEKÉRDEZÉS ---
+
+    def token(self):
+        return f"{self.epoch}.{self.version}"
+
+    def runners(self):
+        """A teljes lista (a régi, tömböt váró klienseknek)."""
+        self.refresh()
+        with self._lock:
+            return list(self._entries.values())
+
+    def changes_since(self, since):
+        """
+        Változások a kliens utolsó verziója óta.
+        Ha a verzió ismeretlen (másik worker, túl régi vagy üres), teljes pillanatképet ad.
+        """
+        self.refresh()
+        with self._lock:
+            epoch, _, number = (since or '').partition('.')
+            try:
+                since_version = int(number)
+            except ValueError:
+                since_version = None
+
+            if (epoch != self.epoch or since_version is None
+                    or since_version < self._horizon or since_version > self.version):
+                return {
+                    "version": self.token(),
+                    "full": True,
+                    "runners": list(self._entries.values()),
+                    "removed": []
+                }
+
+            return {
+                "version": self.token(),
+                "full": False,
+                "runners": [self._entries[pk] for pk, version in self._changed_at.items()
+                            if version > since_version],
+                "removed": [pk for pk, version in self._removed_at.items() if version > since_version]
+            }
+
+
+# Folyamaton belül közös példány
+active_runners_feed = ActiveRunnersFeed()
@@ -0,0 +1,497 @@
+"""
+Élő futások memóriában tartott állapota, késleltetett (write-behind) DB írással.
+
+A GPS jelek nem írják minden alkalommal a LiveRun sort: az állapotot egy tárolóban
+(backend) tartjuk, és az állapotgép (live.py) itt fut. A LiveRun sorba csak akkor
+írunk, ha
+  - állapotváltás történt (ready -> running, szünet, kör, célbaérés), vagy
+  - az utolsó írás óta eltelt LIVE_STATE_FLUSH_SECONDS (ezt egy háttérszál is pótolja).
+
+Összeomlás után a memóriában lévő állapot elvész, ilyenkor az utolsó kiírt LiveRun
+sorból folytatjuk (legfeljebb LIVE_STATE_FLUSH_SECONDS-nyi adat veszhet el).
+
+Tárolók (settings.LIVE_STATE_BACKEND):
+  - 'memory'                     egy folyamaton belül (alapértelmezett, egy workerhez)
+  - 'sqlite:///eleresi/ut.db'    közös SQLite fájl több workerhez (külön fájl, nem a fő DB!)
+  - 'redis://localhost:6379/0'   Redis-kompatibilis szerver (a redis csomag opcionális)
+"""
+import atexit
+import json
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .live import live_run_changes, ANY_RUN
+from .models import LiveRun, Track, ResourceVersion, TRACKS_VERSION_KEY
+
+# Ennyi másodpercenként írjuk ki a változott futásokat akkor is, ha nem volt állapotváltás
+FLUSH_SECONDS = getattr(settings, 'LIVE_STATE_FLUSH_SECONDS', 10.0)
+
+# Legfeljebb ennyi másodpercenként nézzük meg, változtak-e a gyorsítótárazott pályák (más
+# folyamatban, vagy post_save nélkül, pl. a process_gpx update()-je)
+TRACK_CHECK_SECONDS = getattr(settings, 'LIVE_STATE_TRACK_CHECK_SECONDS', FLUSH_SECONDS)
+
+# Ennyiszer próbáljuk újra a módosítást, ha közben más is írta a LiveRun sort;
+# a próbálkozások között véletlenszerűen, egyre tovább várunk (hogy ne ütközzenek újra)
+MAX_RETRIES = 10
+RETRY_BACKOFF = 0.002
+
+# A LiveRun mezők, amiket a tároló tart ('id', 'user_id', 'track_id' az azonosításhoz,
+# 'version' az optimista zároláshoz kell, ezeket nem írjuk vissza)
+KEY_FIELDS = ('id', 'user_id', 'track_id', 'version')
+STATE_FIELDS = (
+    'status', 'start_time', 'last_update', 'last_fix_at', 'current_distance', 'target_laps',
+    'current_speed', 'current_pace', 'progress_percent', 'current_lap', 'current_lap_start',
+    'matched_segment', 'matched_ratio', 'lap_times_log',
+)
+DATETIME_FIELDS = ('start_time', 'last_update', 'last_fix_at', 'current_lap_start')
+
+# A LiveRun sor kiírásának lehetséges eredményei
+WRITTEN, CONFLICT, GONE = 'written', 'conflict', 'gone'
+
+
+class LiveRunConflict(Exception):
+    """A futást többszöri újrapróbálás után sem sikerült ütközés nélkül kiírni."""
+
+
+# --- ÁLLAPOT <-> LIVERUN ---
+
+def run_to_state(run):
+    """LiveRun -> JSON-kompatibilis dict (az időpontok ISO stringként)."""
+    state = {}
+    for field in KEY_FIELDS + STATE_FIELDS:
+        value = getattr(run, field)
+        if field in DATETIME_FIELDS and value is not None:
+            value = value.isoformat()
+        state[field] = value
+    return state
+
+
+def _field_values(state, fields=STATE_FIELDS):
+    values = {}
+    for field in fields:
+        value = state[field]
+        if field in DATETIME_FIELDS and value is not None:
+            value = parse_datetime(value)
+        values[field] = value
+    return values
+
+
+def apply_state(run, state):
+    """A tárolt állapot ráírása egy (DB-ből betöltött) LiveRun objektumra."""
+    for field, value in _field_values(state).items():
+        setattr(run, field, value)
+    return run
+
+
+def state_to_run(state, track=None):
+    """Tárolt állapot -> mentetlen LiveRun objektum (az állapotgép ezen dolgozik)."""
+    run = LiveRun(id=state['id'], user_id=state['user_id'], track_id=state['track_id'], version=state['version'])
+    apply_state(run, state)
+    if track is not None:
+        run.track = track
+    return run
+
+
+# --- TÁROLÓK ---
+
+class MemoryBackend:
+    """Folyamaton belüli tároló (egy worker esetén)."""
+
+    def __init__(self):
+        self._states = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self._version = 0
+
+    @contextmanager
+    def lock(self, user_id):
+        with self._guard:
+            user_lock = self._locks.setdefault(user_id, threading.Lock())
+        with user_lock:
+            yield
+
+    def get(self, user_id):
+        state = self._states.get(user_id)
+        return dict(state) if state is not None else None
+
+    def get_many(self, user_ids):
+        return {user_id: dict(self._states[user_id]) for user_id in user_ids if user_id in self._states}
+
+    def put(self, user_id, state):
+        with self._guard:
+            self._states[user_id] = dict(state)
+            self._version += 1
+
+    def delete(self, user_id):
+        with self._guard:
+            if self._states.pop(user_id, None) is not None:
+                self._version += 1
+
+    def dirty_keys(self):
+        return [user_id for user_id, state in list(self._states.items()) if state.get('_dirty')]
+
+    def version(self):
+        return self._version
+
+
+class SQLiteBackend:
+    """
+    Közös SQLite fájl több workerhez. Külön fájl a fő adatbázistól, így a sűrű
+    GPS írások nem versenyeznek a fő DB zárjáért (WAL mód, synchronous=NORMAL).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS live_state ('
+                     'user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, dirty INTEGER NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS live_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO live_meta (name, value) VALUES ('version', 0)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def lock(self, user_id):
+        # Egy írási tranzakció (BEGIN IMMEDIATE) zárja a fájlt a többi worker elől is
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def get(self, user_id):
+        row = self._conn().execute('SELECT data FROM live_state WHERE user_id = ?', (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        placeholders = ','.join('?' * len(user_ids))
+        rows = self._conn().execute(
+            f'SELECT user_id, data FROM live_state WHERE user_id IN ({placeholders})', user_ids)
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def put(self, user_id, state):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO live_state (user_id, data, dirty) VALUES (?, ?, ?)',
+                     (user_id, json.dumps(state), int(bool(state.get('_dirty')))))
+        conn.execute("UPDATE live_meta SET value = value + 1 WHERE name = 'version'")
+
+    def delete(self, user_id):
+        conn = self._conn()
+        if conn.execute('DELETE FROM live_state WHERE user_id = ?', (user_id,)).rowcount:
+            conn.execute("UPDATE live_meta SET value = value + 1 WHERE name = 'version'")
+
+    def dirty_keys(self):
+        return [row[0] for row in self._conn().execute('SELECT user_id FROM live_state WHERE dirty = 1')]
+
+    def version(self):
+        return self._conn().execute("SELECT value FROM live_meta WHERE name = 'version'").fetchone()[0]
+
+
+class RedisBackend:
+    """Redis-kompatibilis tároló (pl. Redis, Valkey, KeyDB). A 'redis' csomag opcionális."""
+
+    PREFIX = 'prorunner:live:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("A LIVE_STATE_BACKEND Redis tárolóhoz telepíteni kell a 'redis' csomagot.")
+        self.client = redis.Redis.from_url(url)
+        self.states_key = self.PREFIX + 'states'
+        self.dirty_key = self.PREFIX + 'dirty'
+        self.version_key = self.PREFIX + 'version'
+
+    def lock(self, user_id):
+        return self.client.lock(f'{self.PREFIX}lock:{user_id}', timeout=10, blocking_timeout=10)
+
+    def get(self, user_id):
+        data = self.client.hget(self.states_key, user_id)
+        return json.loads(data) if data else None
+
+    def get_many(self, user_ids):
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        values = self.client.hmget(self.states_key, user_ids)
+        return {user_id: json.loads(data) for user_id, data in zip(user_ids, values) if data}
+
+    def put(self, user_id, state):
+        pipe = self.client.pipeline()
+        pipe.hset(self.states_key, user_id, json.dumps(state))
+        if state.get('_dirty'):
+            pipe.sadd(self.dirty_key, user_id)
+        else:
+            pipe.srem(self.dirty_key, user_id)
+        pipe.incr(self.version_key)
+        pipe.execute()
+
+    def delete(self, user_id):
+        pipe = self.client.pipeline()
+        pipe.hdel(self.states_key, user_id)
+        pipe.srem(self.dirty_key, user_id)
+        pipe.incr(self.version_key)
+        pipe.execute()
+
+    def dirty_keys(self):
+        return [int(user_id) for user_id in self.client.smembers(self.dirty_key)]
+
+    def version(self):
+        return int(self.client.get(self.version_key) or 0)
+
+
+def get_backend(url):
+    """A settings.LIVE_STATE_BACKEND értékéből a megfelelő tároló."""
+    if not url or url == 'memory':
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ImproperlyConfigured(f"Ismeretlen LIVE_STATE_BACKEND: {url!r}")
+
+
+# --- MOTOR ---
+
+class LiveRunEngine:
+    """
+    Az élő futások állapotgépe a tároló fölött. Minden módosítás a felhasználó zárja alatt
+    fut: betöltés (tárolóból, vagy ha nincs, a LiveRun sorból) -> módosítás -> visszaírás,
+    és ha kell, kiírás a LiveRun sorba.
+    """
+
+    def __init__(self, backend=None, flush_seconds=None):
+        self._backend = backend
+        self.flush_seconds = FLUSH_SECONDS if flush_seconds is None else flush_seconds
+        self._tracks = {}
+        self._tracks_version = None
+        self._tracks_checked_at = 0.0
+        self._flusher = None
+        self._flusher_lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend(getattr(settings, 'LIVE_STATE_BACKEND', 'memory'))
+        return self._backend
+
+    # --- Pályák (a futás közben csak akkor kérdezzük le újra, ha változtak) ---
+
+    def _track(self, track_id):
+        if time.monotonic() - self._tracks_checked_at >= TRACK_CHECK_SECONDS:
+            self._check_tracks()
+        track = self._tracks.get(track_id)
+        if track is None:
+            track = Track.objects.get(pk=track_id)
+            self._tracks[track_id] = track
+        return track
+
+    def _check_tracks(self):
+        """
+        A pályák verziójának ellenőrzése (legfeljebb TRACK_CHECK_SECONDS-onként). Ha változott,
+        csak azokat a tárolt pályákat dobjuk el, amelyeknek a futást érintő mezői is változtak
+        (egy értékelés pl. nem ilyen).
+        """
+        self._tracks_checked_at = time.monotonic()
+        version = ResourceVersion.current(TRACKS_VERSION_KEY)
+        if version == self._tracks_version:
+            return
+        self._tracks_version = version
+        cached = dict(self._tracks)
+        if not cached:
+            return
+        # A futás számolását a körhossz és a GPX (fájl, feldolgozott tartalom) érinti
+        current = {pk: (lap_km, gpx_file or "", gpx_hash) for pk, lap_km, gpx_file, gpx_hash in
+                   Track.objects.filter(pk__in=list(cached))
+                   .values_list('pk', 'distance_km_per_lap', 'gpx_file', 'gpx_hash')}
+        for track_id, track in cached.items():
+            if current.get(track_id) != (track.distance_km_per_lap, track.gpx_file.name or "", track.gpx_hash):
+                self.forget_track(track_id)
+
+    def forget_track(self, track_id):
+        self._tracks.pop(track_id, None)
+
+    # --- Olvasás ---
+
+    def get_run(self, user_id):
+        """A futás aktuális állapota (LiveRun objektum pályával), vagy None. Nem ír semmit."""
+        state = self.backend.get(user_id)
+        if state is not None:
+            return state_to_run(state, self._track(state['track_id']))
+        return LiveRun.objects.select_related('track').filter(user_id=user_id).first()
+
+    def overlay(self, runs):
+        """DB-ből betöltött LiveRun-ok frissítése a még ki nem írt állapottal (Dashboard)."""
+        runs = list(runs)
+        states = self.backend.get_many(run.user_id for run in runs)
+        for run in runs:
+            state = states.get(run.user_id)
+            if state is not None and state['id'] == run.pk:
+                apply_state(run, state)
+        return runs
+
+    def version(self):
+        """A tároló változásszámlálója (más workerek módosításait is mutatja, ha közös a tároló)."""
+        return self.backend.version()
+
+    # --- Módosítás ---
+
+    def update(self, user_id, apply):
+        """
+        apply(run) lefuttatása a futáson a zár alatt; visszaadja az apply eredményét.
+        Állapotváltásnál, vagy ha régen írtunk, rögtön kiírjuk a LiveRun sorba.
+        Ha a sort közben más (pl. másik worker) módosította, a DB-ből újratöltjük és
+        az apply-t újra lefuttatjuk (legfeljebb MAX_RETRIES-szor).
+        """
+        for attempt in range(MAX_RETRIES):
+            if attempt:
+                time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** min(attempt, 6)))
+            with self.backend.lock(user_id):
+                state = self.backend.get(user_id) if not attempt else None
+                if state is None:
+                    # Nincs a memóriában (első jel, újraindulás vagy ütközés után): a DB sorból indulunk
+                    run = LiveRun.objects.get(user_id=user_id)
+                    flushed_at = time.time()
+                    changed = set()
+                else:
+                    run = state_to_run(state)
+                    flushed_at = state['_flushed_at']
+                    changed = set(state['_changed'])
+                run.track = self._track(run.track_id)
+
+                before = run_to_state(run)
+                result = apply(run)
+                if run_to_state(run) == before:
+                    # Nem változott semmi (pl. jel célbaérés után): nincs mit írni
+                    return result
+
+                run.last_update = timezone.now()  # a LiveRun.last_update auto_now megfelelője
+                state = run_to_state(run)
+                changed.update(field for field in STATE_FIELDS if state[field] != before[field])
+                state['_changed'] = sorted(changed)
+                state['_dirty'] = True
+                state['_flushed_at'] = flushed_at
+
+                outcome = WRITTEN
+                transition = any(state[field] != before[field] for field in ('status', 'current_lap', 'lap_times_log'))
+                if transition or time.time() - flushed_at >= self.flush_seconds:
+                    outcome = self._write(state)
+
+                if outcome == WRITTEN:
+                    self.backend.put(user_id, state)
+                else:
+                    # A sort közben törölték, vagy más módosította: a DB állapota nyer
+                    self.backend.delete(user_id)
+
+            if outcome != CONFLICT:
+                break
+        else:
+            raise LiveRunConflict(f"A futás ({user_id}) írása {MAX_RETRIES} próbálkozás után is ütközött.")
+
+        self._notify(user_id)
+        self._ensure_flusher()
+        return result
+
+    def _write(self, state):
+        """
+        Feltételes kiírás a LiveRun sorba (a zár alatt hívjuk): csak a változott mezőket
+        írjuk, és csak akkor, ha a sor verziója még az, amiből az állapot indult
+        (UPDATE ... WHERE version = n). Visszaadja: WRITTEN, CONFLICT vagy GONE.
+        """
+        written = LiveRun.objects.filter(pk=state['id'], version=state['version']).update(
+            version=F('version') + 1, **_field_values(state, state['_changed']))
+        if not written:
+            return CONFLICT if LiveRun.objects.filter(pk=state['id']).exists() else GONE
+
+        state['version'] += 1
+        state['_changed'] = []
+        state['_dirty'] = False
+        state['_flushed_at'] = time.time()
+        return WRITTEN
+
+    def flush(self, user_id):
+        """Egy futás kiírása, ha van ki nem írt változása."""
+        with self.backend.lock(user_id):
+            state = self.backend.get(user_id)
+            if state is None or not state.get('_dirty'):
+                return
+            outcome = self._write(state)
+            if outcome == WRITTEN:
+                self.backend.put(user_id, state)
+            else:
+                if outcome == CONFLICT:
+                    print(f"Live state ütközés ({user_id}): a DB-ben újabb állapot van, a memóriát eldobjuk.")
+                self.backend.delete(user_id)
+
+    def flush_due(self, force=False):
+        """A régen kiírt (vagy force=True esetén az összes) változott futás kiírása."""
+        now = time.time()
+        for user_id in self.backend.dirty_keys():
+            state = self.backend.get(user_id)
+            if state is not None and (force or now - state['_flushed_at'] >= self.flush_seconds):
+                try:
+                    self.flush(user_id)
+                except Exception as e:
+                    print(f"Live state flush hiba ({user_id}): {e}")
+
+    def forget(self, user_id):
+        """Az állapot eldobása kiírás nélkül (új futás, vagy a futás törlése előtt)."""
+        with self.backend.lock(user_id):
+            self.backend.delete(user_id)
+        self._notify(user_id)
+
+    def _notify(self, user_id):
+        live_run_changes.notify(user_id)
+        live_run_changes.notify(ANY_RUN)
+
+    # --- Háttér kiírás ---
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._flusher_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='live-state-flusher', daemon=True)
+                self._flusher.start()
+                # Szabályos leállításkor mindent kiírunk
+                atexit.register(self.flush_due, force=True)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(max(self.flush_seconds / 2, 0.5))
+            self.flush_due()
+
+
+# Folyamaton belül közös példány
+live_engine = LiveRunEngine()
+
+
+@receiver([post_save, post_delete], sender=Track)
+def forget_cached_track(sender, instance, **kwargs):
+    # A pálya változott (név, hossz): a következő jelnél újra betöltjük
+    live_engine.forget_track(instance.pk)
@@ -0,0 +1,56 @@
+"""
+A háttérfeldolgozás (track.gpx feladat) bevezetése előtt feltöltött GPX-ek sorba állítása.
+
+Új feltöltésnél a Track.save() veszi fel a feladatot; a régi pályáknak nincs geometria
+indexe, ezért minden lookupnál a GPX-et olvassák. Alapból csak a fel nem dolgozott (nincs
+index, vagy nem 'ready' állapotú) pályák kerülnek sorba; egy pályához egyszerre csak egy
+várakozó feladat tartozik (dedupe_key), így az újrafuttatás nem duplikál.
+
+    python manage.py backfill_gpx
+    python manage.py backfill_gpx --all --track <pálya_id>
+    python manage.py backfill_gpx --run     # a feladatok lefuttatása ebben a folyamatban
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from results.jobs import job_pool, run_pending_jobs, job_counts
+from results.models import Job, ResourceVersion, Track, TRACKS_VERSION_KEY
+
+
+class Command(BaseCommand):
+    help = "A meglévő pályák GPX feldolgozásának (track.gpx) sorba állítása."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="A már feldolgozott pályákat is újra sorba állítja")
+        parser.add_argument('--track', help="Csak ez a pálya")
+        parser.add_argument('--run', action='store_true',
+                            help="A sorba állított feladatok lefuttatása itt (különben a workerek viszik)")
+
+    def handle(self, *args, **options):
+        # A parancs folyamatában ne induljanak worker szálak: kilépéskor félbeszakadnának
+        job_pool.workers = 0
+
+        tracks = Track.objects.exclude(gpx_file='')
+        if not options['all']:
+            tracks = tracks.filter(Q(geometry_index__isnull=True) | ~Q(gpx_status='ready'))
+        if options['track']:
+            tracks = tracks.filter(pk=options['track'])
+        track_ids = list(tracks.order_by('pk').values_list('pk', flat=True))
+
+        with transaction.atomic():
+            # A még fel nem dolgozott pályák állapota a lista / admin felé is 'queued' legyen
+            Track.objects.filter(pk__in=track_ids).exclude(gpx_status='ready').update(
+                gpx_status='queued', gpx_error="")
+            for track_id in track_ids:
+                Job.enqueue('track.gpx', dedupe_key=f'track.gpx:{track_id}', track_id=track_id)
+            ResourceVersion.bump(TRACKS_VERSION_KEY)
+        self.stdout.write(self.style.SUCCESS(f"{len(track_ids)} pálya GPX feldolgozása sorba állítva"))
+
+        if options['run']:
+            started = time.perf_counter()
+            count = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(
+                f"{count} feladat lefutott {time.perf_counter() - started:.1f} mp alatt; állapot: {job_counts()}"))
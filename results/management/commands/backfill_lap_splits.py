@@ -0,0 +1,64 @@
+"""
+A meglévő eredmények 'lap_times' szövegéből ("05:30, 05:12, ...") LapSplit sorok készítése.
+
+Új vagy módosított eredményeknél a Result.save() írja őket; ezt egyszer kell lefuttatni a
+tábla bevezetése után. Alapból csak azokat az eredményeket dolgozza fel, amelyeknek még
+nincs köridő sora, így megszakítás után újraindítva ott folytatja, ahol abbahagyta.
+
+    python manage.py backfill_lap_splits
+    python manage.py backfill_lap_splits --all --track <pálya_id>
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from results.models import Result, LapSplit
+
+
+class Command(BaseCommand):
+    help = "LapSplit sorok előállítása a Result.lap_times szövegekből (kötegelt bulk_create)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="A már meglévő köridő sorokat is újraírja")
+        parser.add_argument('--track', help="Csak ennek a pályának az eredményei")
+        parser.add_argument('--batch-size', type=int, default=500, help="Eredmények száma kötegenként")
+
+    def handle(self, *args, **options):
+        results = Result.objects.exclude(lap_times='').only('id', 'track_id', 'user_id', 'lap_times')
+        if not options['all']:
+            results = results.exclude(Exists(LapSplit.objects.filter(result=OuterRef('pk'))))
+        if options['track']:
+            results = results.filter(track_id=options['track'])
+
+        started = time.perf_counter()
+        stats = {'results': 0, 'splits': 0, 'unparsable': 0}
+        batch = []
+        for result in results.order_by('pk').iterator(chunk_size=options['batch_size']):
+            batch.append(result)
+            if len(batch) >= options['batch_size']:
+                self._write(batch, options['all'], stats)
+                batch = []
+        if batch:
+            self._write(batch, options['all'], stats)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['results']} eredmény, {stats['splits']} köridő sor "
+            f"{time.perf_counter() - started:.1f} mp alatt"))
+        if stats['unparsable']:
+            self.stdout.write(self.style.WARNING(f"{stats['unparsable']} köridő nem értelmezhető (kihagyva)"))
+
+    def _write(self, batch, replace, stats):
+        rows = []
+        for result in batch:
+            splits = result.split_rows()
+            stats['unparsable'] += sum(1 for part in result.lap_times.split(',') if part.strip()) - len(splits)
+            rows.extend(splits)
+        # Kötegenként egy tranzakció: egy megszakított futás nem hagy félig feltöltött eredményt
+        with transaction.atomic():
+            if replace:
+                LapSplit.objects.filter(result_id__in=[result.pk for result in batch]).delete()
+            LapSplit.objects.bulk_create(rows)
+        stats['results'] += len(batch)
+        stats['splits'] += len(rows)
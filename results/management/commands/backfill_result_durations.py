@@ -0,0 +1,53 @@
+"""
+A Result.duration_ms és pace_ms_per_km feltöltése a meglévő eredményekhez (a 'time' szövegből).
+
+Új eredményeknél a Result.save() tölti ki; ezt egyszer kell lefuttatni a mezők bevezetése után
+(vagy --all kapcsolóval, ha egy pálya hossza megváltozott és a tempót újra kell számolni).
+
+    python manage.py backfill_result_durations
+    python manage.py backfill_result_durations --all --track <pálya_id>
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from results.models import Result
+
+
+class Command(BaseCommand):
+    help = "Result.duration_ms és pace_ms_per_km kitöltése a 'time' mezőből (kötegelt bulk_update)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="A már kitöltött sorokat is újraszámolja")
+        parser.add_argument('--track', help="Csak ennek a pályának az eredményei")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        results = Result.objects.select_related('track').only(
+            'id', 'time', 'laps_count', 'track__id', 'track__distance_km_per_lap')
+        if not options['all']:
+            results = results.filter(duration_ms__isnull=True)
+        if options['track']:
+            results = results.filter(track_id=options['track'])
+
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+        batch = []
+        updated = unparsable = 0
+        for result in results.order_by('pk').iterator(chunk_size=batch_size):
+            result.compute_duration()
+            if result.duration_ms is None:
+                unparsable += 1
+            batch.append(result)
+            if len(batch) >= batch_size:
+                Result.objects.bulk_update(batch, ['duration_ms', 'pace_ms_per_km'])
+                updated += len(batch)
+                batch = []
+        if batch:
+            Result.objects.bulk_update(batch, ['duration_ms', 'pace_ms_per_km'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{updated} eredmény frissítve {time.perf_counter() - started:.1f} mp alatt"))
+        if unparsable:
+            self.stdout.write(self.style.WARNING(f"{unparsable} eredmény ideje nem értelmezhető (duration_ms = NULL)"))
@@ -0,0 +1,337 @@
+"""
+Mikrobenchmark a geometria forró útvonalaira, szintetikus GPX pályákon.
+
+Pálya alakok (--shapes): kör ('loop'), oda-vissza ('out_and_back') és zajos GPS jelekből
+rögzített kör ('noisy'); méretek (--sizes): 100, 1k, 10k és 100k pont. Mérések:
+  - gpx_parse: gpxpy.parse a GPX szövegre
+  - build_geometry: pontlista + kumulált táv index (TrackGeometry)
+  - process_gpx: a Track.save GPX ága (háttérfeladat): parse, index, LOD útvonalak, DB írás
+  - get_geometry_cold: geometria betöltése a tárolt indexből (üres cache mellett)
+  - get_coordinates_list, get_lat_lon_at_distance, get_distance_from_lat_lon (meleg cache)
+
+Hívásonként mérjük az időt (átlag, medián, p95, min), és egy külön hívásban a csúcs memóriát
+(tracemalloc). Az eredmény JSON fájlba kerül (commit azonosítóval), és egy korábbi futással
+összevethető:
+
+    python manage.py bench_geometry --output bench.json
+    python manage.py bench_geometry --sizes 100 1000 --shapes loop --min-time 0.2
+    python manage.py bench_geometry --compare bench.json --output uj.json   # lassulások jelzése
+    python manage.py bench_geometry --no-numpy                              # tiszta Python kernelek
+
+A pályák egy visszagörgetett tranzakcióban jönnek létre (a DB-ben nem marad nyomuk, a GPX
+fájlokat a végén töröljük); a mérés alatt a tranzakció írási zárat tart.
+"""
+import json
+import math
+import platform
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import gpxpy
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from results.geokernels import ONE_DEGREE, numpy_enabled
+from results.geometry import build_geometry, geometry_cache
+from results.models import Track
+
+SHAPES = ('loop', 'out_and_back', 'noisy')
+SIZES = (100, 1000, 10000, 100000)
+
+BENCHES = ('gpx_parse', 'build_geometry', 'process_gpx', 'get_geometry_cold',
+           'get_coordinates_list', 'get_lat_lon_at_distance', 'get_distance_from_lat_lon')
+
+# Pontok távolsága (m): 1 mp-es rögzítés futótempóban
+POINT_SPACING = 3.0
+
+# A 'noisy' pálya és a map matching bemenetek GPS zaja (szórás, méter)
+GPS_NOISE = 4.0
+
+# Ennyi különböző bemenetet (táv / GPS jel) forgatunk a lookup méréseknél
+LOOKUP_INPUTS = 1000
+
+START = (47.5, 19.05)
+
+
+# --- SZINTETIKUS PÁLYÁK ---
+
+def _offset(lat, lon, north, east):
+    """Eltolás méterben (kis távolságokra elég a síkbeli közelítés)."""
+    return lat + north / ONE_DEGREE, lon + east / (ONE_DEGREE * math.cos(math.radians(lat)))
+
+
+def loop_points(count, rng):
+    """Hullámos kör (nem tökéletes kör, hogy a Douglas-Peucker is dolgozzon), zárt pálya."""
+    radius = count * POINT_SPACING / (2 * math.pi)
+    points = []
+    for i in range(count):
+        angle = 2 * math.pi * i / (count - 1)
+        r = radius * (1 + 0.05 * math.sin(7 * angle))
+        points.append(_offset(*START, r * math.sin(angle), r * math.cos(angle) - radius))
+    return points
+
+
+def out_and_back_points(count, rng):
+    """Kanyargó út a fordulóig és ugyanazon vissza (a map matchingnek a két ág nehéz eset)."""
+    half = count // 2 + 1
+    out = []
+    north = east = 0.0
+    heading = rng.uniform(0, 2 * math.pi)
+    for _ in range(half):
+        out.append(_offset(*START, north, east))
+        heading += rng.gauss(0, 0.05)
+        north += POINT_SPACING * math.cos(heading)
+        east += POINT_SPACING * math.sin(heading)
+    return (out + out[-2::-1])[:count]
+
+
+def noisy_points(count, rng):
+    """Kör, ahogy egy telefon rögzíti: minden pont független GPS hibával."""
+    return [_offset(lat, lon, rng.gauss(0, GPS_NOISE), rng.gauss(0, GPS_NOISE))
+            for lat, lon in loop_points(count, rng)]
+
+
+GENERATORS = {
+    'loop': loop_points,
+    'out_and_back': out_and_back_points,
+    'noisy': noisy_points,
+}
+
+
+def gpx_text(points):
+    """GPX 1.1 track magassággal és időbélyeggel (mint egy órából exportált fájl)."""
+    started = datetime(2024, 5, 1, 6, 0, tzinfo=dt_timezone.utc)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<gpx version="1.1" creator="bench_geometry" xmlns="http://www.topografix.com/GPX/1/1">',
+             '<trk><name>bench</name><trkseg>']
+    for i, (lat, lon) in enumerate(points):
+        stamp = (started + timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        lines.append(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}"><ele>{110 + 5 * math.sin(i / 50):.1f}</ele>'
+                     f'<time>{stamp}</time></trkpt>')
+    lines.append('</trkseg></trk></gpx>')
+    return '\n'.join(lines)
+
+
+# --- MÉRÉS ---
+
+def measure(func, inputs, min_time, min_calls, max_calls):
+    """
+    func(bemenet) hívása, amíg össze nem jön min_time másodperc és min_calls hívás
+    (legfeljebb max_calls). Az első hívás bemelegítés (cache, import), kivéve ha lassú.
+    """
+    started = time.perf_counter()
+    func(inputs[0])
+    first = time.perf_counter() - started
+    times = [first] if first >= min_time else []
+
+    total = sum(times)
+    index = 0
+    while (total < min_time or len(times) < min_calls) and len(times) < max_calls:
+        value = inputs[index % len(inputs)]
+        index += 1
+        started = time.perf_counter()
+        func(value)
+        elapsed = time.perf_counter() - started
+        times.append(elapsed)
+        total += elapsed
+    return times
+
+
+def peak_memory(func, value):
+    """Egy hívás alatti csúcs memóriafoglalás (byte) a tracemalloc szerint."""
+    tracemalloc.start()
+    try:
+        func(value)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Geometria mikrobenchmark szintetikus GPX pályákon; hívásonkénti idő és csúcs memória JSON-ba."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="Pontszámok")
+        parser.add_argument('--shapes', nargs='+', choices=SHAPES, default=list(SHAPES))
+        parser.add_argument('--bench', nargs='+', choices=BENCHES, help="Csak ezek a mérések")
+        parser.add_argument('--min-time', type=float, default=0.5, help="Mérési idő mérésenként legalább (mp)")
+        parser.add_argument('--min-calls', type=int, default=3)
+        parser.add_argument('--max-calls', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--no-numpy', action='store_true', help="A tiszta Python kernelek mérése")
+        parser.add_argument('--output', '-o', help="Eredmény JSON fájl")
+        parser.add_argument('--compare', help="Korábbi eredmény JSON, a medián idők összevetéséhez")
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help="Ekkora relatív lassulás felett jelzünk (0.10 = 10%%)")
+
+    def handle(self, *args, **options):
+        if any(size < 2 for size in options['sizes']):
+            raise CommandError("A pálya legalább 2 pontból álljon (--sizes).")
+        baseline = self.load_baseline(options['compare']) if options['compare'] else None
+
+        with override_settings(GEOMETRY_USE_NUMPY=False) if options['no_numpy'] else override_settings():
+            kernels = 'numpy' if numpy_enabled() else 'python'
+            self.stdout.write(f"Kernelek: {kernels}")
+            results = self.run_all(options)
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "kernels": kernels,
+                "seed": options['seed'],
+            },
+            "results": results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2)
+            self.stdout.write(f"Eredmény mentve: {options['output']}")
+        if baseline is not None:
+            if baseline.get('meta', {}).get('kernels') not in (None, kernels):
+                self.stdout.write(self.style.WARNING(
+                    f"A korábbi futás más kernelekkel készült ({baseline['meta']['kernels']}), az összevetés torz"))
+            self.compare(baseline, results, options['threshold'])
+
+    def load_baseline(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Az összevetendő eredmény nem olvasható ({path}): {e}")
+
+    def run_all(self, options):
+        benches = options['bench'] or BENCHES
+        results, files, track_ids = [], [], []
+        self.stdout.write(f"{'alak':<14}{'pont':>8}  {'mérés':<28}{'hívás':>7}{'medián µs':>13}"
+                          f"{'p95 µs':>13}{'csúcs KB':>11}")
+        try:
+            # A pályák csak a mérés idejére kellenek: a tranzakciót a végén visszagörgetjük
+            with transaction.atomic():
+                for shape in options['shapes']:
+                    for size in options['sizes']:
+                        rng = random.Random(f"{options['seed']}-{shape}-{size}")
+                        text = gpx_text(GENERATORS[shape](size, rng))
+                        track = self.create_track(shape, size, text, files, track_ids)
+                        for bench, func, inputs in self.cases(text, track, rng):
+                            if bench not in benches:
+                                continue
+                            row = self.run_case(shape, size, bench, func, inputs, options)
+                            results.append(row)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            for name in files:
+                default_storage.delete(name)
+            for track_id in track_ids:
+                geometry_cache.invalidate(track_id)
+        return results
+
+    def create_track(self, shape, size, text, files, track_ids):
+        """Mentett pálya a GPX-szel, ahogy a feltöltés után (a feldolgozást a process_gpx mérés végzi)."""
+        track = Track(id=f"bench-{uuid.uuid4().hex[:8]}-{shape}-{size}", name=f"bench {shape} {size}", lat=0, lon=0)
+        track.gpx_file.save(f"bench_{shape}_{size}.gpx", ContentFile(text.encode()), save=False)
+        files.append(track.gpx_file.name)
+        track_ids.append(track.pk)
+        track.save()
+        return track
+
+    def cases(self, text, track, rng):
+        """(név, func, bemenetek) hármasok, a Track.process_gpx után a feldolgozott pályán."""
+        gpx = gpxpy.parse(text)
+        yield 'gpx_parse', lambda _: gpxpy.parse(text), [None]
+        yield 'build_geometry', lambda _: build_geometry(gpx), [None]
+        yield 'process_gpx', lambda _: Track.process_gpx(track.pk), [None]
+
+        # A lookupok a DB-ből betöltött, feldolgozott pályán (tárolt indexszel) futnak
+        track = Track.objects.get(pk=track.pk)
+        if track.gpx_status != 'ready':
+            Track.process_gpx(track.pk)
+            track = Track.objects.get(pk=track.pk)
+        geometry = track.get_geometry()
+
+        def cold(_):
+            geometry_cache.invalidate(track.pk)
+            return track.get_geometry()
+
+        yield 'get_geometry_cold', cold, [None]
+        track.get_geometry()
+        yield 'get_coordinates_list', lambda _: track.get_coordinates_list(), [None]
+
+        distances = [rng.uniform(0, geometry.length) for _ in range(LOOKUP_INPUTS)]
+        yield 'get_lat_lon_at_distance', track.get_lat_lon_at_distance, distances
+
+        fixes = []
+        for distance in distances:
+            lat, lon = geometry.position_at_distance(distance)
+            fixes.append(_offset(lat, lon, rng.gauss(0, GPS_NOISE), rng.gauss(0, GPS_NOISE)))
+        yield 'get_distance_from_lat_lon', lambda fix: track.get_distance_from_lat_lon(*fix), fixes
+
+    def run_case(self, shape, size, bench, func, inputs, options):
+        times = measure(func, inputs, options['min_time'], options['min_calls'], options['max_calls'])
+        times.sort()
+        peak = peak_memory(func, inputs[0])
+        row = {
+            "shape": shape,
+            "points": size,
+            "bench": bench,
+            "calls": len(times),
+            "mean_us": round(statistics.fmean(times) * 1e6, 2),
+            "median_us": round(statistics.median(times) * 1e6, 2),
+            "p95_us": round(times[min(len(times) - 1, int(0.95 * len(times)))] * 1e6, 2),
+            "min_us": round(times[0] * 1e6, 2),
+            "peak_kb": round(peak / 1024, 1),
+        }
+        self.stdout.write(f"{shape:<14}{size:>8}  {bench:<28}{row['calls']:>7}{row['median_us']:>13,.1f}"
+                          f"{row['p95_us']:>13,.1f}{row['peak_kb']:>11,.1f}")
+        return row
+
+    def compare(self, baseline, results, threshold):
+        """Medián idők összevetése a korábbi futással (alak, pontszám és mérés szerint)."""
+        old = {(row['shape'], row['points'], row['bench']): row for row in baseline.get('results', [])}
+        commit = baseline.get('meta', {}).get('commit') or '?'
+        self.stdout.write(f"Összevetés: {commit} -> {git_commit() or '?'} (új medián / régi medián)")
+        regressions = 0
+        for row in results:
+            before = old.get((row['shape'], row['points'], row['bench']))
+            if before is None or not before['median_us']:
+                continue
+            ratio = row['median_us'] / before['median_us']
+            line = (f"{row['shape']:<14}{row['points']:>8}  {row['bench']:<28}"
+                    f"{before['median_us']:>13,.1f}{row['median_us']:>13,.1f}{ratio:>8.2f}x")
+            if ratio > 1 + threshold:
+                regressions += 1
+                self.stdout.write(self.style.WARNING(line + "  LASSULÁS"))
+            elif ratio < 1 - threshold:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.WARNING(f"{regressions} mérés lassult {threshold:.0%}-nál többet"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Nincs lassulás"))
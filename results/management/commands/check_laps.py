@@ -0,0 +1,142 @@
+"""
+Körszámlálás ellenőrzése szimulált futásokkal (regressziós próba a rajt/cél vonal kezelésére).
+
+Egy zárt körpályán (a GPX hossza szándékosan nem kerek, pl. 1003 m, a Track-en tárolt
+körhossz pedig kerekített km érték) több véletlen maggal lefuttatunk egy futást: a jelek
+egyenletes tempóval, GPS zajjal jönnek, és az apply_gps_fix állapotgépen mennek át, ahogy
+a gps-update végponton. Egy futás akkor helyes, ha a célbaérés a várt távnál történik
+(a körök nem maradnak ki és nem duplázódnak), és a táv közben nem esik vissza.
+
+    python manage.py check_laps
+    python manage.py check_laps --seeds 20 --laps 5 --noise 3
+    python manage.py check_laps --matcher global     # globális illesztés (get_distance_from_lat_lon útja)
+
+A pálya egy visszagörgetett tranzakcióban jön létre, a GPX fájlt a végén töröljük.
+"""
+import math
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from results.geokernels import ONE_DEGREE
+from results.geometry import geometry_cache
+from results.live import apply_gps_fix
+from results.models import LiveRun, Track
+
+START = (47.5, 19.05)
+
+# A célbaérés a teljes táv 98%-ánál történik (live.py); ennyi eltérés fér bele (m)
+FINISH_TOLERANCE = 30.0
+
+# Ennél nagyobb visszaesés a futó távjában hibának számít (a zaj ennél kisebb)
+MAX_DISTANCE_DROP = 20.0
+
+
+def loop_gpx(length, spacing):
+    """Zárt, enyhén hullámos kör GPX-e; az utolsó pont azonos az elsővel."""
+    count = max(8, int(length / spacing))
+    radius = length / (2 * math.pi)
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<gpx version="1.1" creator="check_laps" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>']
+    for i in range(count + 1):
+        angle = 2 * math.pi * (i % count) / count
+        r = radius * (1 + 0.03 * math.sin(5 * angle))
+        lat = START[0] + (r * math.cos(angle) - radius) / ONE_DEGREE
+        lon = START[1] + r * math.sin(angle) / (ONE_DEGREE * math.cos(math.radians(START[0])))
+        lines.append(f'<trkpt lat="{lat:.7f}" lon="{lon:.7f}"></trkpt>')
+    lines.append('</trkseg></trk></gpx>')
+    return '\n'.join(lines)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Szimulált futások egy zárt körpályán; ellenőrzi, hogy a körszámlálás és a célbaérés helyes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seeds', type=int, default=8, help="Véletlen magok (futások) száma")
+        parser.add_argument('--laps', type=int, default=3)
+        parser.add_argument('--length', type=float, default=1003.0, help="A pálya hossza (m)")
+        parser.add_argument('--spacing', type=float, default=5.0, help="GPX pontok távolsága (m)")
+        parser.add_argument('--speed', type=float, default=3.0, help="Futási sebesség (m/s)")
+        parser.add_argument('--noise', type=float, default=2.0, help="GPS zaj szórása (m)")
+        parser.add_argument('--matcher', choices=('window', 'global'), default='window',
+                            help="window: inkrementális (élő végpont), global: illesztés a teljes pályán")
+
+    def handle(self, *args, **options):
+        failures = 0
+        track = None
+        try:
+            with transaction.atomic():
+                track = Track(id=f"check-laps-{uuid.uuid4().hex[:8]}", name="check_laps", lat=0, lon=0)
+                track.gpx_file.save('check_laps.gpx', ContentFile(loop_gpx(options['length'], options['spacing']).encode()),
+                                    save=False)
+                track.save()
+                Track.process_gpx(track.pk)
+                track = Track.objects.get(pk=track.pk)
+                geometry = track.get_geometry()
+                if geometry is None:
+                    raise CommandError(f"A GPX feldolgozása nem sikerült: {track.gpx_error}")
+                self.stdout.write(f"Pálya: {geometry.length:.1f} m (tárolt körhossz {track.distance_km_per_lap} km), "
+                                  f"{options['laps']} kör, {options['speed']} m/s, zaj {options['noise']} m, "
+                                  f"illesztés: {options['matcher']}")
+                for seed in range(options['seeds']):
+                    failures += not self.simulate(track, geometry, seed, options)
+                raise Rollback
+        except Rollback:
+            pass
+        finally:
+            if track is not None:
+                track.gpx_file.delete(save=False)
+                geometry_cache.invalidate(track.pk)
+
+        if failures:
+            raise CommandError(f"{failures}/{options['seeds']} futásnál hibás a körszámlálás.")
+        self.stdout.write(self.style.SUCCESS(f"OK: mind a {options['seeds']} futás helyesen ért célba."))
+
+    def simulate(self, track, geometry, seed, options):
+        rng = random.Random(seed)
+        run = LiveRun(track=track, target_laps=options['laps'], status='ready', current_distance=0,
+                      current_lap=1, lap_times_log="[]")
+        total = geometry.length * options['laps']
+        started = timezone.now()
+        kx = ONE_DEGREE * math.cos(math.radians(START[0]))
+
+        travelled = 0.0
+        max_drop = 0.0
+        pauses = 0
+        step = 0
+        while run.status != 'finished' and travelled < total * 1.5:
+            lat, lon = geometry.position_at_distance(travelled % geometry.length)
+            lat += rng.gauss(0, options['noise']) / ONE_DEGREE
+            lon += rng.gauss(0, options['noise']) / kx
+            now = started + timedelta(seconds=step)
+
+            before, status_before = run.current_distance, run.status
+            # Globális módban az illesztés nem a legutóbbi helyzet körül keres
+            extra = {'match': track.match_position(lat, lon)} if options['matcher'] == 'global' else {}
+            apply_gps_fix(run, track, lat, lon, now, **extra)
+            if status_before == 'running' and run.status != 'finished':
+                max_drop = max(max_drop, before - run.current_distance)
+                pauses += run.status == 'paused'
+            if run.status == 'finished':
+                break
+
+            step += 1
+            travelled = options['speed'] * step
+
+        expected = total * 0.98
+        ok = (run.status == 'finished' and abs(travelled - expected) <= FINISH_TOLERANCE
+              and max_drop <= MAX_DISTANCE_DROP)
+        line = (f"mag {seed}: {'célba ért' if run.status == 'finished' else 'nem ért célba'} "
+                f"{travelled:.0f} m után (várt ~{expected:.0f} m), kör {run.current_lap}, "
+                f"legnagyobb visszaesés {max_drop:.1f} m, auto-pause {pauses}")
+        self.stdout.write(self.style.SUCCESS(line) if ok else self.style.WARNING(line))
+        return ok
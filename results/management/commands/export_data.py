@@ -0,0 +1,42 @@
+"""
+Eredmények vagy értékelések exportja CSV / NDJSON fájlba (vagy a kimenetre), állandó memóriával.
+
+    python manage.py export_data results -o results.ndjson
+    python manage.py export_data results --format csv --track margitsziget -o margit.csv
+    python manage.py export_data reviews --format csv > reviews.csv
+"""
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from results.transfer import EXPORTS, FORMATS, export_lines, format_from_name
+
+
+class Command(BaseCommand):
+    help = "Eredmények / értékelések tömeges exportja (CSV vagy NDJSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('-o', '--output', help="Kimeneti fájl (alapértelmezés: a standard kimenet)")
+        parser.add_argument('--format', choices=FORMATS, help="Alapértelmezés: a kimeneti fájl kiterjesztése alapján, különben ndjson")
+        parser.add_argument('--track', help="Csak ennek a pályának a sorai")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        output = options['output']
+        fmt = options['format'] or format_from_name(output or '')
+
+        target = open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+        size = 0
+        try:
+            for chunk in export_lines(options['kind'], fmt, options['track']):
+                target.write(chunk)
+                size += len(chunk)
+        finally:
+            if output:
+                target.close()
+
+        if output:
+            self.stdout.write(self.style.SUCCESS(
+                f"{output}: {size / 1e6:.1f} MB {time.perf_counter() - started:.1f} mp alatt"))
@@ -0,0 +1,46 @@
+"""
+Eredmények vagy értékelések tömeges importja CSV / NDJSON fájlból (pl. egy régi időmérő rendszerből).
+
+    python manage.py import_data results regi_rendszer.csv
+    python manage.py import_data results export.ndjson --batch-size 5000
+    python manage.py import_data reviews reviews.csv --dry-run
+
+Oszlopok (az export_data kimenete is ilyen): track, runner_name, time, laps_count, lap_times, date,
+runner_weight, runner_height, és a futó: runner_id / user_id (azonosító) vagy username.
+Értékelésnél: track, rating, comment, user (azonosító) vagy username. A sorokat kötegenként validálja
+és bulk_create-tel írja; a végén a futó statisztikákat / értékelés összesítőket újraszámolja.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from results.transfer import EXPORTS, FORMATS, IMPORT_BATCH_SIZE, BulkImporter, read_rows, format_from_name
+
+
+class Command(BaseCommand):
+    help = "Eredmények / értékelések tömeges importja (CSV vagy NDJSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('path', help="Bemeneti fájl (.csv vagy .ndjson)")
+        parser.add_argument('--format', choices=FORMATS, help="Alapértelmezés: a fájl kiterjesztése alapján")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Csak validál, nem ír az adatbázisba")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        fmt = options['format'] or format_from_name(options['path'])
+        importer = BulkImporter(options['kind'], batch_size=options['batch_size'], dry_run=options['dry_run'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as file:
+                summary = importer.run(read_rows(file, fmt))
+        except OSError as e:
+            raise CommandError(f"A fájl nem olvasható: {e}")
+
+        for error in summary['errors']:
+            self.stdout.write(self.style.WARNING(f"{error['line']}. sor: {error['error']}"))
+        elapsed = time.perf_counter() - started
+        verb = "érvényes (dry run)" if summary['dry_run'] else "beírva"
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['created']} sor {verb}, {summary['error_count']} hibás; "
+            f"{elapsed:.1f} mp ({summary['created'] / elapsed:.0f} sor/mp)"))
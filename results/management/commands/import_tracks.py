@@ -0,0 +1,157 @@
+"""
+Pályák tömeges importja GPX fájlokból és fotókból (pl. egy új város feltöltéséhez).
+
+    python manage.py import_tracks ./budapest/                # mappa: *.gpx + azonos nevű fotó
+    python manage.py import_tracks ./budapest/palyak.csv      # manifest: gpx, image, id, name, surface_type, ...
+    python manage.py import_tracks ./budapest/ --workers 8 --batch-size 200 --owner admin
+
+A GPX-et és a képeket worker folyamatok dolgozzák fel (track_import.prepare_track), a pályák
+kötegenként, bulk_create-tel kerülnek a DB-be, kész geometriával (nincs háttérfeladat utánuk).
+A GPX tartalom hash-e alapján a már importált (vagy a bemenetben kétszer szereplő) pályákat
+kihagyjuk, így egy megszakított import ugyanazzal a paranccsal folytatható.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import BooleanField
+
+from results.models import Track, ResourceVersion, TRACKS_VERSION_KEY
+from results.track_import import (
+    scan_directory, read_manifest, default_name, track_id_for, file_hash, init_worker, prepare_track,
+)
+
+# A manifestből állítható Track mezők (a fájlokat, a számolt és a tulajdonos mezőket nem)
+MANIFEST_FIELDS = {
+    field.name: field for field in Track._meta.concrete_fields
+    if field.editable and field.name not in ('id', 'image', 'image_thumbnail', 'gpx_file', 'created_by')
+}
+
+TRUE_VALUES = ('1', 'true', 'igen', 'i', 'yes', 'y', 't')
+
+
+class Command(BaseCommand):
+    help = "Pályák tömeges importja egy mappából vagy manifestből (CSV / JSON)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Mappa (*.gpx + fotók) vagy manifest fájl (.csv / .json)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker folyamatok száma")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--owner', help="A pályák létrehozója (felhasználónév)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        source = Path(options['source'])
+        if not source.exists():
+            raise CommandError(f"Nem található: {source}")
+        entries = scan_directory(source) if source.is_dir() else read_manifest(source)
+
+        owner = None
+        if options['owner']:
+            owner = User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"Nincs ilyen felhasználó: {options['owner']}")
+
+        tasks, values_by_id, skipped, errors = self.plan(entries)
+        self.stdout.write(f"{len(entries)} bejegyzés: {len(tasks)} új, {skipped} már importálva, {len(errors)} hibás")
+
+        imported = points = 0
+        if tasks:
+            workers = max(options['workers'], 1)
+            chunksize = max(1, min(16, len(tasks) // (workers * 4)))
+            batch = []
+            # A worker folyamatok ne örököljék a nyitott DB kapcsolatot
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                try:
+                    for prepared in executor.map(prepare_track, tasks, chunksize=chunksize):
+                        if 'error' in prepared:
+                            errors.append(f"{prepared['id']}: {prepared['error']}")
+                            continue
+                        if 'warning' in prepared:
+                            self.stdout.write(self.style.WARNING(f"{prepared['id']}: {prepared['warning']}"))
+                        batch.append(self.build_track(prepared, values_by_id[prepared['id']], owner))
+                        points += prepared['points']
+                        if len(batch) >= options['batch_size']:
+                            imported += self.flush(batch)
+                            batch = []
+                            self.report(imported, len(tasks), points, started)
+                    if batch:
+                        imported += self.flush(batch)
+                except KeyboardInterrupt:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.stdout.write(self.style.WARNING(
+                        f"Megszakítva: {imported} pálya beírva, újraindításkor a többivel folytatódik"))
+                    return
+
+        for error in errors[:20]:
+            self.stdout.write(self.style.WARNING(error))
+        if len(errors) > 20:
+            self.stdout.write(self.style.WARNING(f"... és még {len(errors) - 20} hiba"))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{imported} új pálya, {skipped} kihagyva, {len(errors)} hiba; {elapsed:.1f} mp "
+            f"({imported / elapsed:.1f} pálya/mp, {points / elapsed:.0f} GPX pont/mp)"))
+
+    def plan(self, entries):
+        """
+        A bemenet szűrése a feldolgozás előtt: manifest értékek ellenőrzése, azonosító kiosztása,
+        duplikátumok kihagyása a GPX hash alapján (a DB-ben és a bemeneten belül is).
+        """
+        known_hashes = set(Track.objects.exclude(gpx_hash="").values_list('gpx_hash', flat=True))
+        known_ids = set(Track.objects.values_list('id', flat=True))
+        tasks, values_by_id, skipped, errors = [], {}, 0, []
+        for entry in entries:
+            label = entry.get('gpx') or entry.get('id') or entry.get('name') or '?'
+            if not entry.get('gpx'):
+                errors.append(f"{label}: hiányzik a GPX fájl")
+                continue
+            try:
+                values = {name: self.clean_value(MANIFEST_FIELDS[name], value)
+                          for name, value in entry.items() if name in MANIFEST_FIELDS}
+                values.setdefault('name', default_name(entry))
+                digest = file_hash(entry['gpx'])
+            except (OSError, ValidationError) as e:
+                errors.append(f"{label}: {e}")
+                continue
+            if digest in known_hashes:
+                skipped += 1
+                continue
+            track_id = track_id_for(entry, values['name'])
+            if track_id in known_ids:
+                errors.append(f"{label}: a(z) '{track_id}' azonosító már foglalt")
+                continue
+            known_hashes.add(digest)
+            known_ids.add(track_id)
+            values_by_id[track_id] = values
+            tasks.append({'id': track_id, 'gpx': entry['gpx'], 'gpx_hash': digest, 'image': entry.get('image')})
+        return tasks, values_by_id, skipped, errors
+
+    def clean_value(self, field, value):
+        # CSV-ben a logikai mezők szövegek: 'igen' / 'true' / '1' -> True
+        if isinstance(field, BooleanField) and isinstance(value, str):
+            value = value.strip().lower() in TRUE_VALUES
+        return field.clean(value, None)
+
+    def build_track(self, prepared, values, owner):
+        fields = dict(values, **prepared['fields'])
+        # Kezdőpont a GPX-ből, ha a manifest nem ad meg (mint a Track.process_gpx-ben)
+        if prepared['start'] and not (values.get('lat') and values.get('lon')):
+            fields['lat'], fields['lon'] = prepared['start']
+        return Track(id=prepared['id'], created_by=owner, **fields)
+
+    def flush(self, batch):
+        with transaction.atomic():
+            Track.objects.bulk_create(batch)
+            # bulk_create nem küld post_save-et: a pályalista ETag-je kézzel avul el
+            ResourceVersion.bump(TRACKS_VERSION_KEY)
+        return len(batch)
+
+    def report(self, imported, total, points, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{imported}/{total} pálya, {imported / elapsed:.1f} pálya/mp, {points / elapsed:.0f} GPX pont/mp")
@@ -0,0 +1,461 @@
+"""
+Terhelési próba az élő követés végpontjaira: N egyidejű, szimulált futó.
+
+Minden futó egy valódi pálya GPX geometriáján halad, reális tempóval (--pace, perc/km,
+futónként véletlenszerűen), GPS zajjal és időnkénti megállással (ilyenkor a szerver
+auto-pause-t érzékel). A futók --interval másodpercenként küldenek jelet (gps-update) és
+--status-interval másodpercenként lekérik a saját kijelzőjüket (status), közben --dashboards
+darab dashboard a futók listáját pollozza (active, '?since=' verzióval, mint a böngésző).
+
+A szerver a saját órája szerint számol (tempó, auto-pause), ezért a szimuláció valós időben fut.
+
+    python manage.py live_load --runners 50 --duration 60
+    python manage.py live_load --runners 200 --interval 2 --dashboards 20 --json eredmeny.json
+    python manage.py live_load --url http://127.0.0.1:8000 --runners 50   # futó helyi szerver ellen
+
+Alapesetben a kérések a parancs folyamatán belül futnak (django.test.Client, hálózat nélkül),
+így végpontonként a DB lekérdezések száma, ideje és a zárra várások is mérhetők. --url mellett
+valódi HTTP kérések mennek (a szervernek ugyanazt az adatbázist kell használnia, mert a futókat
+és a futásokat a parancs hozza létre); ilyenkor csak a késleltetés és a hibaarány mérhető.
+A végén az ideiglenes felhasználókat (és a futásaikat) töröljük, hacsak nincs --keep.
+"""
+import http.cookiejar
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from django.test import Client
+
+from results.live_state import live_engine
+from results.models import LiveRun, Track
+from results.samples import sample_store
+
+GPS_URL = '/api/live/gps-update/'
+STATUS_URL = '/api/live/status/'
+ACTIVE_URL = '/api/live/active/'
+LOGIN_URL = '/api/login/'
+
+# Egy fokra jutó méter (szélességben); a GPS zaj méterben van megadva
+METERS_PER_DEGREE = 111320.0
+
+# GPS zaj: AR(1) folyamat, a szórása hosszú távon a megadott --noise
+NOISE_MEMORY = 0.98
+NOISE_STEP = math.sqrt(1 - NOISE_MEMORY ** 2)
+
+# Ennél hosszabb lekérdezés zárra várásnak számít (SQLite írási zár, sorzár)
+DEFAULT_LOCK_THRESHOLD_MS = 50.0
+
+PERCENTILES = (50, 95, 99)
+
+LOGIN_THREADS = 8
+
+
+def percentile(sorted_values, p):
+    """Legközelebbi rang szerinti percentilis egy rendezett listából (üres listánál 0)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class QueryMeter:
+    """
+    connection.execute_wrapper: a szál DB lekérdezéseinek száma, ideje és a zárra várások
+    (a küszöbnél lassabb vagy 'database is locked' hibával elszálló lekérdezések).
+    """
+
+    def __init__(self, lock_threshold):
+        self.lock_threshold = lock_threshold
+        self.queries = 0
+        self.seconds = 0.0
+        self.lock_waits = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        locked = False
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            locked = 'locked' in str(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.seconds += elapsed
+            if locked or elapsed >= self.lock_threshold:
+                self.lock_waits += 1
+
+    def snapshot(self):
+        return self.queries, self.seconds, self.lock_waits
+
+
+class LocalTransport:
+    """Kérések a folyamaton belül (django.test.Client); a DB-t a QueryMeter méri."""
+
+    measures_db = True
+
+    def __init__(self):
+        self.client = Client()
+
+    def login(self, user, password):
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        if method == 'POST':
+            response = self.client.post(path, data, content_type='application/json')
+        else:
+            response = self.client.get(path)
+        return response.status_code, response.content
+
+
+class HttpTransport:
+    """Valódi HTTP kérések egy futó (helyi) szerver felé, saját session sütivel."""
+
+    measures_db = False
+
+    def __init__(self, base_url, timeout=10):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def login(self, user, password):
+        status, _ = self.request('POST', LOGIN_URL, {'username': user.username, 'password': password})
+        if status != 200:
+            raise CommandError(f"Sikertelen bejelentkezés ({user.username}): HTTP {status}")
+
+    def request(self, method, path, data=None):
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {'Content-Type': 'application/json'}
+        # Bejelentkezve a POST-hoz CSRF token kell (mint a stopwatch.js-ben); a login válasz állítja be
+        csrf = next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), None)
+        if csrf:
+            headers['X-CSRFToken'] = csrf
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.lock_waits = 0
+
+    def summary(self, elapsed, measures_db):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        row = {
+            "requests": count,
+            "rps": round(count / elapsed, 1) if elapsed else 0,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items(), key=lambda item: str(item[0]))},
+        }
+        for p in PERCENTILES:
+            row[f"p{p}_ms"] = round(percentile(latencies, p) * 1000, 1)
+        row["max_ms"] = round(latencies[-1] * 1000, 1) if latencies else 0
+        if measures_db:
+            row["queries_per_request"] = round(self.queries / count, 2) if count else 0
+            row["db_ms_per_request"] = round(self.db_seconds * 1000 / count, 2) if count else 0
+            row["lock_waits"] = self.lock_waits
+        return row
+
+
+class SimulatedRunner:
+    """
+    Egy futó helyzete a pályán: tempó szerint halad a geometrián (körökön át), időnként megáll.
+    A helyzetet a valós eltelt időből számoljuk, mert a szerver is a saját órája szerint mér.
+    """
+
+    def __init__(self, user, track, geometry, pace_range, pause_chance, pause_range, noise):
+        self.user = user
+        self.track = track
+        self.geometry = geometry
+        self.speed = 1000 / (random.uniform(*pace_range) * 60)  # m/s
+        self.pause_chance = pause_chance
+        self.pause_range = pause_range
+        self.noise = noise
+        self.distance = 0.0
+        self.paused_until = 0.0
+        self.last_tick = None
+        self.offset = [0.0, 0.0]  # GPS hiba (méter): lassan változik, nem jelenként független
+
+    def advance(self, now):
+        if self.last_tick is not None and now >= self.paused_until:
+            elapsed = now - self.last_tick
+            self.distance += self.speed * elapsed
+            # A zaj állás közben nem vándorol (különben a szerver nem látna megállást)
+            self.offset = [NOISE_MEMORY * value + random.gauss(0, self.noise * NOISE_STEP) for value in self.offset]
+            # Megállás (lámpa, cipőfűző): percenkénti pause_chance valószínűséggel
+            if random.random() < self.pause_chance * elapsed / 60:
+                self.paused_until = now + random.uniform(*self.pause_range)
+        self.last_tick = now
+
+    def fix(self):
+        lat, lon = self.geometry.position_at_distance(self.distance % self.geometry.length)
+        lat += self.offset[0] / METERS_PER_DEGREE
+        lon += self.offset[1] / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        return {'lat': lat, 'lon': lon, 'username': self.user.username}
+
+
+class Command(BaseCommand):
+    help = "N szimulált élő futó és dashboard terhelése; végpontonként p50/p95/p99, hibaarány, DB lekérdezések."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runners', type=int, default=20, help="Egyidejű futók száma")
+        parser.add_argument('--duration', type=float, default=30.0, help="A mérés hossza (mp)")
+        parser.add_argument('--interval', type=float, default=1.0, help="GPS jelek közti idő futónként (mp)")
+        parser.add_argument('--status-interval', type=float, default=2.0,
+                            help="A futó kijelzőjének pollozása (mp, 0 = nincs)")
+        parser.add_argument('--dashboards', type=int, default=5, help="Egyidejű dashboardok száma")
+        parser.add_argument('--poll', type=float, default=3.0, help="Dashboard pollozási idő (mp)")
+        parser.add_argument('--track', action='append', help="Pálya ID (többször is megadható; alap: minden GPX-es pálya)")
+        parser.add_argument('--pace', type=float, nargs=2, default=(4.5, 7.0), metavar=('MIN', 'MAX'),
+                            help="Tempó tartomány (perc/km)")
+        parser.add_argument('--pause-chance', type=float, default=0.2, help="Megállás valószínűsége percenként")
+        parser.add_argument('--pause', type=float, nargs=2, default=(10.0, 40.0), metavar=('MIN', 'MAX'),
+                            help="Megállás hossza (mp)")
+        parser.add_argument('--noise', type=float, default=3.0, help="GPS zaj szórása (méter)")
+        parser.add_argument('--lock-threshold', type=float, default=DEFAULT_LOCK_THRESHOLD_MS,
+                            help="Ennél lassabb lekérdezés zárra várásnak számít (ms)")
+        parser.add_argument('--url', help="Futó szerver címe (pl. http://127.0.0.1:8000); alap: folyamaton belül")
+        parser.add_argument('--seed', type=int, help="Véletlen mag (megismételhető futásokhoz)")
+        parser.add_argument('--json', dest='json_path', help="Az eredmény mentése JSON fájlba")
+        parser.add_argument('--keep', action='store_true', help="Az ideiglenes futók megtartása")
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        if options['runners'] < 1 or options['duration'] <= 0 or options['interval'] <= 0:
+            raise CommandError("A --runners, --duration és --interval értéke pozitív kell legyen.")
+
+        tracks = self.load_tracks(options['track'])
+        self.lock_threshold = options['lock_threshold'] / 1000
+        self.url = options['url']
+        self.stats = defaultdict(EndpointStats)
+        self.stats_lock = threading.Lock()
+
+        if self.url:
+            try:
+                HttpTransport(self.url).request('GET', ACTIVE_URL)
+            except urllib.error.URLError as e:
+                raise CommandError(f"A szerver nem érhető el ({self.url}): {e.reason}")
+
+        prefix = f"live_load_{uuid.uuid4().hex[:6]}"
+        password = uuid.uuid4().hex
+        runners = self.create_runners(prefix, password, tracks, options)
+        self.stdout.write(f"{len(runners)} futó {len(tracks)} pályán, {options['dashboards']} dashboard, "
+                          f"{options['duration']:.0f} mp ({'HTTP: ' + self.url if self.url else 'folyamaton belül'})")
+        try:
+            elapsed = self.run_load(runners, password, options)
+            report = self.report(elapsed, options)
+        finally:
+            # A pufferelt nyers jeleket kiírjuk, hogy a felhasználókkal együtt törlődjenek
+            sample_store.flush(force=True)
+            if not options['keep']:
+                for runner in runners:
+                    live_engine.forget(runner.user.id)
+                User.objects.filter(username__startswith=prefix).delete()
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Eredmény mentve: {options['json_path']}")
+
+    def load_tracks(self, track_ids):
+        queryset = Track.objects.filter(gpx_status='ready').exclude(gpx_file='')
+        if track_ids:
+            queryset = queryset.filter(pk__in=track_ids)
+        tracks = []
+        for track in queryset:
+            geometry = track.get_geometry()
+            if geometry is not None and geometry.length > 0 and track.distance_km_per_lap > 0:
+                tracks.append((track, geometry))
+        if not tracks:
+            raise CommandError("Nincs feldolgozott GPX geometriájú pálya (--track).")
+        return tracks
+
+    def create_runners(self, prefix, password, tracks, options):
+        """Ideiglenes futók 'ready' futással (mint a set-ready végpont), a pályákon szétosztva."""
+        users = [User(username=f"{prefix}_{index}") for index in range(options['runners'])]
+        for user in users:
+            user.set_password(password) if self.url else user.set_unusable_password()
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(username__startswith=prefix).order_by('pk'))
+
+        runners, runs = [], []
+        for index, user in enumerate(users):
+            track, geometry = tracks[index % len(tracks)]
+            # Ennyi kört nem futnak le a mérés alatt: nincs célbaérés
+            runs.append(LiveRun(user=user, track=track, target_laps=10 ** 6, current_distance=0,
+                                status='ready', lap_times_log="[]"))
+            runners.append(SimulatedRunner(user, track, geometry, options['pace'], options['pause_chance'],
+                                           options['pause'], options['noise']))
+        LiveRun.objects.bulk_create(runs)
+        return runners
+
+    def transport(self):
+        return HttpTransport(self.url) if self.url else LocalTransport()
+
+    def call(self, endpoint, transport, meter, method, path, data=None):
+        """Egy kérés mérése; visszaadja a választ (dict) vagy None-t hibánál."""
+        before = meter.snapshot() if meter else None
+        started = time.perf_counter()
+        try:
+            status, content = transport.request(method, path, data)
+        except Exception as e:
+            status, content = type(e).__name__, b""
+        elapsed = time.perf_counter() - started
+        error = not isinstance(status, int) or status >= 400
+
+        with self.stats_lock:
+            stats = self.stats[endpoint]
+            stats.latencies.append(elapsed)
+            stats.statuses[status] += 1
+            stats.errors += error
+            if meter:
+                queries, seconds, lock_waits = meter.snapshot()
+                stats.queries += queries - before[0]
+                stats.db_seconds += seconds - before[1]
+                stats.lock_waits += lock_waits - before[2]
+        if error:
+            return None
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+
+    def instrumented(self, func, *args):
+        """Szál törzse: a saját DB kapcsolatára QueryMeter-t tesz (folyamaton belüli módban)."""
+        def target():
+            try:
+                if self.url:
+                    func(None, *args)
+                    return
+                meter = QueryMeter(self.lock_threshold)
+                with connection.execute_wrapper(meter):
+                    func(meter, *args)
+            except Exception as e:
+                self.stdout.write(self.style.WARNING(f"Szál hiba: {e!r}"))
+            finally:
+                connection.close()
+        return threading.Thread(target=target, daemon=True)
+
+    def login(self, runner, password):
+        transport = self.transport()
+        try:
+            transport.login(runner.user, password)
+        finally:
+            connection.close()
+        return transport
+
+    def runner_loop(self, meter, runner, transport, deadline, options):
+        interval, status_interval = options['interval'], options['status_interval']
+        # A futók ne egyszerre küldjenek: véletlen eltolás az első jelig
+        next_fix = time.monotonic() + random.uniform(0, interval)
+        next_status = next_fix + random.uniform(0, status_interval) if status_interval else float('inf')
+        while True:
+            due = min(next_fix, next_status)
+            if due >= deadline:
+                break
+            time.sleep(max(0.0, due - time.monotonic()))
+            now = time.monotonic()
+            if now >= next_fix:
+                runner.advance(now)
+                self.call('gps-update', transport, meter, 'POST', GPS_URL, runner.fix())
+                next_fix += interval
+            if now >= next_status:
+                self.call('status', transport, meter, 'GET', STATUS_URL)
+                next_status += status_interval
+
+    def dashboard_loop(self, meter, deadline, options):
+        transport = self.transport()
+        poll = options['poll']
+        next_poll = time.monotonic() + random.uniform(0, poll)
+        version = None
+        while next_poll < deadline:
+            time.sleep(max(0.0, next_poll - time.monotonic()))
+            # Az első kérés a teljes lista, utána csak a változások (mint a dashboard.js)
+            path = ACTIVE_URL if version is None else f"{ACTIVE_URL}?since={version}"
+            data = self.call('active', transport, meter, 'GET', path)
+            if isinstance(data, dict):
+                version = data.get('version', version)
+            elif data is not None:
+                version = ''
+            next_poll += poll
+
+    def run_load(self, runners, password, options):
+        # Bejelentkezés a mérés előtt (a jelszó ellenőrzés lassú, ne torzítsa az első másodperceket)
+        with ThreadPoolExecutor(max_workers=LOGIN_THREADS) as executor:
+            transports = list(executor.map(self.login, runners, [password] * len(runners)))
+
+        started = time.monotonic()
+        deadline = started + options['duration']
+        threads = [self.instrumented(self.runner_loop, runner, transport, deadline, options)
+                   for runner, transport in zip(runners, transports)]
+        threads += [self.instrumented(self.dashboard_loop, deadline, options) for _ in range(options['dashboards'])]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Megszakítva, részleges eredmény:"))
+        return time.monotonic() - started
+
+    def report(self, elapsed, options):
+        measures_db = not self.url
+        with self.stats_lock:
+            endpoints = {name: stats.summary(elapsed, measures_db) for name, stats in sorted(self.stats.items())}
+
+        header = f"{'végpont':<11}{'kérés':>8}{'kérés/mp':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'hiba%':>8}"
+        if measures_db:
+            header += f"{'lekérd.':>9}{'DB ms':>8}{'zár':>6}"
+        self.stdout.write(header)
+        for name, row in endpoints.items():
+            line = (f"{name:<11}{row['requests']:>8}{row['rps']:>10}{row['p50_ms']:>9}{row['p95_ms']:>9}"
+                    f"{row['p99_ms']:>9}{row['max_ms']:>9}{row['error_rate'] * 100:>8.2f}")
+            if measures_db:
+                line += f"{row['queries_per_request']:>9}{row['db_ms_per_request']:>8}{row['lock_waits']:>6}"
+            self.stdout.write(line)
+        self.stdout.write("(késleltetés ms-ben; lekérd. és DB ms kérésenként; zár: zárra várt lekérdezések)")
+
+        total = sum(row['requests'] for row in endpoints.values())
+        errors = sum(row['errors'] for row in endpoints.values())
+        summary = f"{total} kérés {elapsed:.1f} mp alatt ({total / elapsed:.0f}/mp), {errors} hiba"
+        for name, row in endpoints.items():
+            failed = {status: n for status, n in row['statuses'].items() if not status.isdigit() or int(status) >= 400}
+            if failed:
+                self.stdout.write(self.style.WARNING(f"{name}: hibás válaszok {failed}"))
+        self.stdout.write(self.style.WARNING(summary) if errors else self.style.SUCCESS(summary))
+
+        return {
+            "mode": "http" if self.url else "local",
+            "url": self.url,
+            "runners": options['runners'],
+            "dashboards": options['dashboards'],
+            "duration_s": round(elapsed, 2),
+            "interval_s": options['interval'],
+            "status_interval_s": options['status_interval'],
+            "poll_s": options['poll'],
+            "lock_threshold_ms": options['lock_threshold'],
+            "endpoints": endpoints,
+        }
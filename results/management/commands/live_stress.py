@@ -0,0 +1,116 @@
+"""
+Párhuzamossági terhelési próba a LiveRun frissítésekre.
+
+Egy futást sok szálból, több "worker" (külön live_engine, külön memória-tároló) felől
+frissítünk egyszerre, azonnali kiírással (flush_seconds=0), hogy minden jel egy
+feltételes UPDATE legyen. Minden frissítés ugyanannyi métert ad hozzá, így a végső
+táv és körszám determinisztikus: ha bármelyik írás elveszne vagy kétszer számolódna,
+eltérést kapunk. Extrém ütközésnél egy frissítés LiveRunConflict hibával elutasítódhat
+(ezt a kliens újraküldi) - ez nem eltérés, de külön jelezzük.
+
+    python manage.py live_stress --threads 8 --fixes 100 --workers 2
+    python manage.py live_stress --naive   # a régi olvasás-módosítás-save() összevetésnek
+"""
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from results.live_state import LiveRunEngine, MemoryBackend, LiveRunConflict
+from results.models import LiveRun, Track
+
+
+class Command(BaseCommand):
+    help = "Egy futás párhuzamos frissítése sok szálból; ellenőrzi, hogy a táv és a kör determinisztikus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--track', help="Pálya ID (alapértelmezés: az első pálya)")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--fixes', type=int, default=100, help="Frissítések száma szálanként")
+        parser.add_argument('--workers', type=int, default=2, help="Szimulált workerek (külön engine-ek) száma")
+        parser.add_argument('--step', type=float, default=10.0, help="Méter frissítésenként")
+        parser.add_argument('--naive', action='store_true',
+                            help="Régi módszer: get() + save() zárolás nélkül (összevetésnek)")
+
+    def handle(self, *args, **options):
+        track = Track.objects.filter(pk=options['track']).first() if options['track'] else Track.objects.first()
+        if track is None:
+            raise CommandError("Nincs pálya az adatbázisban (--track).")
+        lap_len_m = track.distance_km_per_lap * 1000
+        if lap_len_m <= 0:
+            raise CommandError("A pálya hossza 0, a körszám nem ellenőrizhető.")
+
+        threads, fixes, step = options['threads'], options['fixes'], options['step']
+        user = User.objects.create_user(f"live_stress_{uuid.uuid4().hex[:8]}")
+        try:
+            run = LiveRun.objects.create(user=user, track=track, status='running', target_laps=10 ** 6, current_lap=1)
+            engines = [LiveRunEngine(MemoryBackend(), flush_seconds=0) for _ in range(max(1, options['workers']))]
+
+            def step_run(run):
+                run.current_distance += step
+                run.current_lap = int(run.current_distance // lap_len_m) + 1
+
+            def naive_step():
+                run = LiveRun.objects.get(user=user)
+                step_run(run)
+                run.save()
+
+            errors = []
+            applied = []
+            rejected = []
+
+            def worker(index):
+                engine = engines[index % len(engines)]
+                done = refused = 0
+                try:
+                    for _ in range(fixes):
+                        if options['naive']:
+                            naive_step()
+                        else:
+                            try:
+                                engine.update(user.id, step_run)
+                            except LiveRunConflict:
+                                refused += 1
+                                continue
+                        done += 1
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    applied.append(done)
+                    rejected.append(refused)
+                    connection.close()
+
+            started = time.perf_counter()
+            pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            for engine in engines:
+                engine.flush_due(force=True)
+            run.refresh_from_db()
+
+            total = threads * fixes
+            expected_distance = sum(applied) * step
+            expected_lap = int(expected_distance // lap_len_m) + 1
+            self.stdout.write(
+                f"{total} frissítés {elapsed:.2f} mp alatt ({total / elapsed:.0f}/mp), "
+                f"{len(engines)} worker, {threads} szál")
+            self.stdout.write(f"Táv: {run.current_distance:.1f} m (várt {expected_distance:.1f} m), "
+                              f"kör: {run.current_lap} (várt {expected_lap}), verzió: {run.version}")
+            if sum(rejected):
+                self.stdout.write(self.style.WARNING(
+                    f"{sum(rejected)} frissítés ütközés miatt elutasítva (nem veszett el csendben)"))
+            for error in errors[:5]:
+                self.stdout.write(self.style.WARNING(f"Hiba: {error!r}"))
+
+            if errors or run.current_distance != expected_distance or run.current_lap != expected_lap:
+                raise CommandError(f"ELTÉRÉS: elveszett vagy hibás frissítések ({len(errors)} hiba).")
+            self.stdout.write(self.style.SUCCESS("OK: a táv és a körszám determinisztikus."))
+        finally:
+            user.delete()
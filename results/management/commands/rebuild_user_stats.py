@@ -0,0 +1,55 @@
+"""
+A UserTrackStats (futó + pálya statisztikák) teljes újraszámolása az eredményekből.
+
+Normál működésben a Result írásai frissítik; ez a bevezetés utáni feltöltésre és javításra
+való. Az eredményeket egyetlen rendezett végigolvasással dolgozza fel (futó, pálya szerint),
+a statisztikákat memóriában állítja elő és kötegelt bulk_create-tel írja ki.
+
+    python manage.py rebuild_user_stats
+    python manage.py rebuild_user_stats --user 42
+    python manage.py rebuild_user_stats --user 42 --user 43
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from results.models import Result, Track, UserTrackStats, RESULT_STATS_FIELDS
+
+
+class Command(BaseCommand):
+    help = "UserTrackStats újraszámolása az összes (vagy egy futó) eredményéből."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help="Csak ezeknek a felhasználóknak a statisztikái (ismételhető)")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        lap_km = dict(Track.objects.values_list('id', 'distance_km_per_lap'))
+
+        results = Result.objects.filter(user__isnull=False)
+        existing = UserTrackStats.objects.all()
+        if options['user']:
+            results = results.filter(user_id__in=options['user'])
+            existing = existing.filter(user_id__in=options['user'])
+        rows = (results.order_by('user_id', 'track_id', 'date', 'recorded_at')
+                .values('pk', *RESULT_STATS_FIELDS).iterator(chunk_size=5000))
+
+        created = runs = 0
+        with transaction.atomic():
+            existing.delete()
+            batch = []
+            for stats in UserTrackStats.build(rows, lap_km):
+                runs += stats.run_count
+                batch.append(stats)
+                if len(batch) >= options['batch_size']:
+                    UserTrackStats.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                UserTrackStats.objects.bulk_create(batch)
+                created += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} statisztika ({runs} eredményből) {time.perf_counter() - started:.1f} mp alatt"))
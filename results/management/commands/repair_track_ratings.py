@@ -0,0 +1,59 @@
+"""
+A pályák értékelés összesítőinek (review_count, average_rating, rating_histogram) teljes
+újraszámolása a TrackReview táblából.
+
+Normál működésben a TrackReview írásai frissítik őket; ez a parancs a bevezetés utáni
+feltöltésre és javításra való (pl. ha nyers SQL-lel módosítottak értékeléseket).
+
+    python manage.py repair_track_ratings
+    python manage.py repair_track_ratings --dry-run
+"""
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from results.models import Track, TrackReview
+from results.ratings import summarize_ratings, rating_stats
+
+
+class Command(BaseCommand):
+    help = "A Track értékelés összesítőinek újraszámolása az értékelésekből; csak az eltérő pályákat írja."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Csak kiírja az eltéréseket, nem javít")
+
+    def handle(self, *args, **options):
+        # Egy végigolvasás pályánként rendezve (nincs pályánkénti lekérdezés)
+        rows = TrackReview.objects.order_by('track_id').values_list('track_id', 'rating').iterator(chunk_size=5000)
+        expected = {
+            track_id: summarize_ratings([rating for _, rating in group])
+            for track_id, group in groupby(rows, key=lambda row: row[0])
+        }
+        empty = rating_stats(0, 0.0, {})
+
+        fixed = []
+        with transaction.atomic():
+            tracks = Track.objects.select_for_update().only('id', *Track.RATING_FIELDS)
+            for track in tracks:
+                stats = expected.get(track.id, empty)
+                if self._differs(track, stats):
+                    self.stdout.write(
+                        f"{track.id}: {track.review_count} db / {track.average_rating} -> "
+                        f"{stats['review_count']} db / {stats['average_rating']}")
+                    for field, value in stats.items():
+                        setattr(track, field, value)
+                    fixed.append(track)
+            if fixed and not options['dry_run']:
+                Track.objects.bulk_update(fixed, list(Track.RATING_FIELDS), batch_size=500)
+
+        verb = "eltér" if options['dry_run'] else "javítva"
+        self.stdout.write(self.style.SUCCESS(f"{len(fixed)} pálya {verb}, {len(expected)} pályának van értékelése"))
+
+    def _differs(self, track, stats):
+        if track.review_count != stats['review_count'] or (track.rating_histogram or {}) != stats['rating_histogram']:
+            return True
+        if (track.average_rating is None) != (stats['average_rating'] is None):
+            return True
+        # Az összeg növekményes frissítésnél lebegőpontos hibát gyűjthet; ezt nem tekintjük eltérésnek
+        return abs(track.rating_sum - stats['rating_sum']) > 1e-6
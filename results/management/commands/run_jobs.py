@@ -0,0 +1,45 @@
+"""
+Háttérfeladat worker külön folyamatban (GPX feldolgozás, képváltozatok).
+
+Ha a webszerver folyamatán belüli workerek ki vannak kapcsolva (JOB_WORKERS = 0), ez a parancs
+dolgozza fel a sort; mellettük is futhat, a lefoglalás miatt egy feladatot csak egy worker kap meg.
+
+    python manage.py run_jobs --threads 4
+    python manage.py run_jobs --burst      # a most futtatható feladatok, majd kilépés
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from results.jobs import job_pool, run_pending_jobs, housekeeping, job_counts
+
+
+class Command(BaseCommand):
+    help = "A DB alapú háttérfeladat sor feldolgozása."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help="Párhuzamos worker szálak száma")
+        parser.add_argument('--burst', action='store_true', help="A várakozó feladatok lefuttatása, majd kilépés")
+
+    def handle(self, *args, **options):
+        requeued, failed, purged = housekeeping()
+        if requeued or failed:
+            self.stdout.write(self.style.WARNING(
+                f"Elakadt feladatok: {requeued} újra sorban, {failed} sikertelen"))
+
+        if options['burst']:
+            started = time.perf_counter()
+            count = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(
+                f"{count} feladat lefutott {time.perf_counter() - started:.1f} mp alatt; állapot: {job_counts()}"))
+            return
+
+        job_pool.workers = max(options['threads'], 1)
+        job_pool.start()
+        self.stdout.write(self.style.SUCCESS(f"{job_pool.workers} worker fut (Ctrl+C: leállítás)"))
+        try:
+            while job_pool.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Leállítás, a futó feladatok befejeződnek...")
+            job_pool.stop()
@@ -0,0 +1,200 @@
+"""
+Folyamaton belüli teljesítmény metrikák (számlálók, hisztogramok) Prometheus szöveges
+formátumban (api/metrics/).
+
+A mérés olcsó: egy megfigyelés egy zár alatti bisect + két összeadás, a szöveget csak a
+lekérdezéskor állítjuk elő. A metrikák folyamatonként gyűlnek (több worker folyamatnál
+mindegyiket külön kell lekérdezni, mint a prometheus_client alap módjában); a címkék
+értékkészlete legyen korlátos (URL név, nem nyers útvonal).
+
+    REQUEST_SECONDS.observe(0.012, 'live-status', 'GET')
+    with GPX_PARSE_SECONDS.time('process_gpx'):
+        gpx = gpxpy.parse(...)
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Késleltetés vödrök (másodperc): a mikroszekundumos lookupoktól a többmásodperces GPX-ig
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: {len(self.labelnames)} címke kell ({', '.join(self.labelnames)})")
+        return tuple(str(label) for label in labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, self._snapshot(value)) for key, value in self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(Metric):
+    """Csak növekvő számláló, címkénként."""
+
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _snapshot(self, value):
+        return value
+
+    def _samples(self, key, value):
+        yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_number(value)}"
+
+
+class Histogram(Metric):
+    """Rögzített vödrös hisztogram; vödrönként csak a darabszámot tároljuk (nem az értékeket)."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [vödör darabszámok (+Inf-fel), összeg]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Időmérés: with HISTOGRAM.time('címke'): ... (kivételnél is mér)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels):
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def _snapshot(self, state):
+        return list(state[0]), state[1]
+
+    def _samples(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            yield (f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_number(bound)))} "
+                   f"{cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        yield f"{self.name}_sum{labels} {_format_number(total)}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"A metrika már regisztrálva van: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Az összes metrika Prometheus szöveges formátumban (text/plain; version=0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+# --- HTTP KÉRÉSEK (MetricsMiddleware) ---
+REQUESTS = registry.counter(
+    'prorunner_http_requests', "HTTP kérések száma nézetenként, metódusonként és státuszkódonként",
+    ('view', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram(
+    'prorunner_http_request_duration_seconds', "A kérés feldolgozási ideje (a válasz elkészültéig)",
+    ('view', 'method'))
+REQUEST_QUERIES = registry.histogram(
+    'prorunner_http_request_db_queries', "DB lekérdezések száma kérésenként", ('view',), QUERY_COUNT_BUCKETS)
+REQUEST_DB_SECONDS = registry.histogram(
+    'prorunner_http_request_db_seconds', "DB lekérdezésekkel töltött idő kérésenként", ('view',))
+RESPONSE_BYTES = registry.histogram(
+    'prorunner_http_response_size_bytes', "A válasz törzsének mérete (streamnél a teljes stream)",
+    ('view',), SIZE_BUCKETS)
+
+# --- FORRÓ ÚTVONALAK ---
+GPX_PARSE_SECONDS = registry.histogram(
+    'prorunner_gpx_parse_seconds', "GPX fájl beolvasása és geometria építése", ('source',))
+MAP_MATCH_SECONDS = registry.histogram(
+    'prorunner_map_match_seconds', "Map matching (GPS jel -> pályamenti táv)", ('mode',))
+SERIALIZE_SECONDS = registry.histogram(
+    'prorunner_serialization_seconds', "DRF szerializálás (serializer.data)", ('serializer',))
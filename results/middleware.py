@@ -0,0 +1,156 @@
+"""
+Kérésenkénti teljesítmény mérés (metrics.py): késleltetés, DB lekérdezések száma és ideje,
+válaszméret és státuszkód, nézetenként (URL név szerint).
+
+A DB lekérdezéseket connection.execute_wrapper-rel számoljuk. WSGI alatt a kérés szálán
+telepítjük; ASGI alatt a nézet (a szinkron is) a sync_to_async szálán fut, ezért ott a kérés
+számlálója egy ContextVar-ban utazik (a sync_to_async a kontextust átviszi a szálba), és a
+minden kapcsolatra feltett _count_queries ebbe számol. Stream válasznál a késleltetés és a
+lekérdezések a válasz objektum elkészültéig számítanak, a méretet a stream végén rögzítjük.
+
+Itt van a háttér workereket induláskor elindító BackgroundWorkersMiddleware is.
+"""
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .jobs import job_pool
+from .metrics import REQUESTS, REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, RESPONSE_BYTES
+
+# Illesztetlen URL (404) - a nyers útvonal címkeként végtelen sok értéket adhatna
+UNMATCHED_VIEW = '<unmatched>'
+
+
+class QueryTimer:
+    """execute_wrapper: lekérdezések száma és a bennük töltött idő."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# Az ASGI alatt futó kérés számlálója (a nézet szálában is látszik)
+_request_queries = ContextVar('metrics_request_queries', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    return queries(execute, sql, params, many, context)
+
+
+def _install_query_counter(conn):
+    if _count_queries not in conn.execute_wrappers:
+        conn.execute_wrappers.append(_count_queries)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # Újracsatlakozásnál is lefut, ezért a telepítés idempotens
+    _install_query_counter(connection)
+
+
+# A middleware betöltése előtt már megnyitott kapcsolatok (pl. induláskori ellenőrzések)
+for _conn in connections.all(initialized_only=True):
+    _install_query_counter(_conn)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_VIEW
+    return match.view_name or match.route or UNMATCHED_VIEW
+
+
+def _counted_stream(content, view):
+    size = 0
+    try:
+        for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        RESPONSE_BYTES.observe(size, view)
+
+
+async def _acounted_stream(content, view):
+    size = 0
+    try:
+        async for chunk in content:
+            size += len(chunk)
+            yield chunk
+    finally:
+        RESPONSE_BYTES.observe(size, view)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        queries = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryTimer()
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    def record(self, request, response, elapsed, queries):
+        view = view_label(request)
+        REQUESTS.inc(view, request.method, response.status_code)
+        REQUEST_SECONDS.observe(elapsed, view, request.method)
+        REQUEST_QUERIES.observe(queries.count, view)
+        REQUEST_DB_SECONDS.observe(queries.seconds, view)
+        if response.streaming:
+            # A méret csak a stream végén ismert: a tartalmat számláló generátorba csomagoljuk
+            if response.is_async:
+                response.streaming_content = _acounted_stream(response.streaming_content, view)
+            else:
+                response.streaming_content = _counted_stream(response.streaming_content, view)
+        else:
+            RESPONSE_BYTES.observe(len(response.content), view)
+
+
+class BackgroundWorkersMiddleware:
+    """
+    A folyamaton belüli háttér workerek (jobs.job_pool) indítása a webszerver indulásakor: a
+    middleware lánc a folyamat elején egyszer épül fel, így az újraindítás előtt sorban
+    maradt feladatok nem várnak a következő feltöltésre. Kérést nem dolgoz fel.
+    """
+
+    def __init__(self, get_response):
+        # JOB_WORKERS = 0 mellett nem indul szál (a run_jobs parancs dolgozik)
+        job_pool.start()
+        raise MiddlewareNotUsed
@@ -1,16 +1,24 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator, MaxValueValidator
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
-import os
 import gpxpy
+import gpxpy.geo
 import math
 import json
+from itertools import groupby
+from .geometry import geometry_cache, build_geometry, gpx_start_point, LOD_FULL
+from .live import live_run_changes, ANY_RUN
+from .durations import parse_duration_ms, parse_lap_times
+from .ratings import rating_bucket, rating_stats
+from .images import content_hash, build_variants, variant_prefix, delete_variants, thumbnail_name, variant_names
+from .background import wake_workers
+from .metrics import GPX_PARSE_SECONDS, MAP_MATCH_SECONDS
+from .user_stats import as_date, week_key, month_key, add_volume, oldest_week_key, oldest_month_key
 
 class Track(models.Model):
     """
@@ -33,12 +41,37 @@ class Track(models.Model):
     # EREDETI (NAGY) KÉP
     image = models.ImageField(upload_to='track_images/', blank=True, null=True, verbose_name="Pálya fotó")
 
-    # KICSI KÉP (Thumbnail)
+    # KICSI KÉP (Thumbnail) - a háttérben készülő 400 px-es JPEG változat
     image_thumbnail = models.ImageField(upload_to='track_images/thumbs/', blank=True, null=True, verbose_name="Kicsi kép")
 
+    # Reszponzív képváltozatok (images.py) - a háttérfeldolgozás tölti, ha a kép tartalma változott
+    image_variants = models.JSONField(default=dict, blank=True, editable=False) # {"400": {"width", "height", "jpeg", "webp"}}
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    image_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+
     # --- ÚJ MEZŐ: GPX fájl feltöltése ---
     gpx_file = models.FileField(upload_to='track_gpx/', blank=True, null=True, verbose_name="GPX Fájl")
 
+    # Előre kiszámolt geometria index (lat/lon/kumulált táv tömbök, bináris) - a save() tölti
+    geometry_index = models.BinaryField(null=True, blank=True, editable=False)
+
+    # Egyszerűsített útvonalak részletességi szintenként (encoded polyline) - a save() tölti
+    simplified_geometry = models.JSONField(default=dict, blank=True, editable=False)
+
+    # GPX feldolgozás állapota - a háttérfeladat (process_gpx) lépteti, a felület ebből mutatja a folyamatot
+    GPX_STATUS_CHOICES = [
+        ('none', 'Nincs feldolgozás'),
+        ('queued', 'Sorban áll'),
+        ('processing', 'Feldolgozás alatt'),
+        ('ready', 'Kész'),
+        ('failed', 'Hibás GPX'),
+    ]
+    gpx_status = models.CharField(max_length=12, choices=GPX_STATUS_CHOICES, default='none', editable=False)
+    gpx_error = models.CharField(max_length=255, blank=True, default="", editable=False)
+    # A GPX tartalom SHA-256 hash-e (tömeges importnál ez alapján szűrjük a duplikátumokat)
+    gpx_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+
     # Szolgáltatások
     is_free = models.BooleanField(default=True, verbose_name="Ingyenes?")
     is_24_7 = models.BooleanField(default=True, verbose_name="0-24 nyitva?")
@@ -62,35 +95,85 @@ class Track(models.Model):
     lon = models.FloatField()
     zoom = models.IntegerField(default=12)
 
+    # Értékelés összesítők - a TrackReview írásakor frissülnek, ugyanabban a tranzakcióban
+    # (a pályalista így nem aggregál minden kérésnél az összes értékelésen)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.FloatField(default=0.0, editable=False)
+    average_rating = models.FloatField(null=True, blank=True, editable=False)
+    rating_histogram = models.JSONField(default=dict, blank=True, editable=False) # {"1": db, ..., "5": db}
+
+    RATING_FIELDS = ('review_count', 'rating_sum', 'average_rating', 'rating_histogram')
+    IMAGE_FIELDS = ('image_thumbnail', 'image_variants', 'image_width', 'image_height', 'image_hash')
+    GPX_FIELDS = ('geometry_index', 'simplified_geometry', 'gpx_status', 'gpx_error', 'gpx_hash')
+
+    class Meta:
+        indexes = [models.Index(fields=['name'], name='track_name_idx')]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_files()
+        return instance
+
+    def _remember_files(self):
+        # A mentett fájlnevek: a save() ebből tudja, hogy új kép / GPX került-e a mezőbe
+        self._loaded_files = {name: self.__dict__.get(name) for name in ('image', 'gpx_file')}
+
+    def _file_changed(self, field_name):
+        """Új fájl van a mezőben (feltöltés, vagy FieldFile.save(..., save=False) után)."""
+        file = getattr(self, field_name)
+        if not file:
+            return False
+        if not file._committed:
+            return True
+        loaded = getattr(self, '_loaded_files', None)
+        return loaded is None or loaded.get(field_name) != file.name
+
+    # --- GPX geometria a gyorsítótárból (nem parse-olunk minden hívásnál) ---
+    def get_geometry(self):
+        """
+        Visszaadja a pálya feldolgozott geometriáját (TrackGeometry) vagy None-t.
+        A GPX-et csak akkor olvassuk újra, ha a fájl megváltozott vagy kiesett a cache-ből.
+        """
+        if not self.gpx_file:
+            return None
+        return geometry_cache.get_or_load(self.pk, self.gpx_file, self.geometry_index)
+
     # --- Koordináták kinyerése a térképhez (Leaflet útvonalrajzoláshoz) ---
     def get_coordinates_list(self):
         """
         Visszaadja a GPX-ből a koordinátákat [[lat, lon], [lat, lon], ...] formátumban
         a Leaflet térkép számára.
         """
-        if not self.gpx_file:
+        try:
+            geometry = self.get_geometry()
+            if geometry is None:
+                return []
+            # A Leaflet [szélesség, hosszúság] párokat vár
+            return [[lat, lon] for lat, lon in geometry.points]
+        except Exception as e:
+            print(f"Hiba a GPX olvasásakor: {e}")
             return []
 
+    # --- Egyszerűsített útvonal a térképhez (LOD) ---
+    def get_polyline(self, level='coarse'):
+        """
+        Visszaadja az útvonalat encoded polyline formában a kért részletességgel
+        ('coarse', 'medium', 'fine' vagy 'full'). A tárolt szinteket nem számoljuk újra.
+        """
+        if level != LOD_FULL and level in (self.simplified_geometry or {}):
+            return self.simplified_geometry[level]
         try:
-            # Fájl megnyitása olvasásra
-            self.gpx_file.open()
-            gpx = gpxpy.parse(self.gpx_file)
-
-            points = []
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        # A Leaflet [szélesség, hosszúság] párokat vár
-                        points.append([point.latitude, point.longitude])
-
-            self.gpx_file.close() # Fontos bezárni!
-            return points
+            geometry = self.get_geometry()
+            if geometry is None:
+                return ""
+            return geometry.encoded_polyline(level)
         except Exception as e:
             print(f"Hiba a GPX olvasásakor: {e}")
-            return []
+            return ""
 
     # --- ÚJ FÜGGVÉNY: GPS pont kiszámolása távolság alapján (Live Trackerhez) ---
     def get_lat_lon_at_distance(self, target_meters):
@@ -98,133 +181,233 @@ class Track(models.Model):
         Kiszámolja, hogy a GPX útvonalon hol van a 'target_meters' távolság.
         Visszaadja: {'lat': x, 'lon': y} vagy None
         """
-        if not self.gpx_file:
-            return None
-
         try:
-            self.gpx_file.open()
-            gpx = gpxpy.parse(self.gpx_file)
-            self.gpx_file.seek(0) # Visszatekerjük az elejére
+            geometry = self.get_geometry()
+            if geometry is None:
+                return None
 
-            total_dist = 0
-            prev_point = None
-
-            # Végigmegyünk a pontokon
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        if prev_point:
-                            # Távolság az előző ponttól (méterben)
-                            dist = point.distance_2d(prev_point)
-                            total_dist += dist
-
-                            # Ha átléptük a cél távolságot, ez a mi pontunk!
-                            if total_dist >= target_meters:
-                                return {'lat': point.latitude, 'lon': point.longitude}
-
-                        prev_point = point
-
-            # Ha a futó többet nyomott, mint a pálya hossza, visszaadjuk az utolsó pontot
-            if prev_point:
-                 return {'lat': prev_point.latitude, 'lon': prev_point.longitude}
+            # Bináris keresés a kumulált táv indexen + interpoláció a két szomszédos pont között.
+            # Ha a futó többet nyomott, mint a pálya hossza, az utolsó pontot kapjuk.
+            position = geometry.position_at_distance(target_meters)
+            if position is None:
+                return None
+            return {'lat': position[0], 'lon': position[1]}
 
         except Exception as e:
             print(f"GPX hiba: {e}")
             return None
-        return None
 
     # --- SAVE METÓDUS: KÉP + GPX LOGIKA EGYBEN ---
     def save(self, *args, **kwargs):
-        # 1. KÉP FELDOLGOZÁSA
-        if self.image:
-            try:
-                img = Image.open(self.image)
-                if img.mode in ("RGBA", "P"):
-                    img = img.convert("RGB")
-                img.thumbnail((400, 400))
-                thumb_io = BytesIO()
-                img.save(thumb_io, format='JPEG', quality=85)
-                thumb_filename = os.path.basename(self.image.name).split('.')[0] + '_thumb.jpg'
-                if not self.image_thumbnail:
-                     self.image_thumbnail.save(thumb_filename, ContentFile(thumb_io.getvalue()), save=False)
-            except Exception as e:
-                print(f"Thumbnail hiba: {e}")
-
-        # 2. GPX FELDOLGOZÁSA
-        if self.gpx_file:
+        # 1. KÉP: csak azt jegyezzük fel, hogy új fájl jött; a méretezés a háttérben fut (process_image)
+        image_uploaded = self._file_changed('image')
+        image_removed = not self.image and bool(self.image_variants or self.image_thumbnail)
+        if image_removed:
+            delete_variants(self.image_variants)
+            self.image_variants, self.image_width, self.image_height, self.image_hash = {}, None, None, ""
+            self.image_thumbnail = None
+
+        # 2. GPX: a feldolgozás háttérfeladat (process_gpx), itt csak az állapotot állítjuk
+        gpx_uploaded = self._file_changed('gpx_file')
+        gpx_removed = not self.gpx_file and (self.gpx_status != 'none' or bool(self.geometry_index or self.gpx_hash))
+        if gpx_uploaded or gpx_removed:
+            # A régi fájl indexe nem kerülhet az új fájl kulcsa alá a cache-be (get_or_load)
+            self.geometry_index, self.simplified_geometry, self.gpx_hash = None, {}, ""
+        if gpx_uploaded:
+            self.gpx_status, self.gpx_error = 'queued', ""
+        elif gpx_removed:
+            self.gpx_status, self.gpx_error = 'none', ""
+
+        # Az értékelés összesítőket csak a TrackReview írása, a kép- és GPX adatokat a háttérfeldolgozás
+        # módosítja: egy teljes save() (pl. pálya szerkesztése) ne írja vissza a memóriában lévő,
+        # esetleg elavult értékeket (kivéve, ha a fájlt épp most cserélték vagy törölték)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            skipped = self.RATING_FIELDS + (() if image_removed else self.IMAGE_FIELDS)
+            skipped += () if gpx_uploaded or gpx_removed else self.GPX_FIELDS
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+
+        # A feladatok a mentés tranzakciójában kerülnek a sorba (jobs.py dolgozza fel őket)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if gpx_uploaded:
+                Job.enqueue('track.gpx', dedupe_key=f'track.gpx:{self.pk}', track_id=self.pk)
+            if image_uploaded:
+                Job.enqueue('track.image', dedupe_key=f'track.image:{self.pk}', track_id=self.pk)
+        self._remember_files()
+
+        # A régi geometria érvénytelen (új fájl vagy módosított pálya)
+        geometry_cache.invalidate(self.pk)
+
+    # --- GPX feldolgozás (háttérfeladat) ---
+    @classmethod
+    def process_gpx(cls, track_id):
+        """
+        A feltöltött GPX feldolgozása: geometria index, egyszerűsített útvonalak, körhossz és
+        kezdőpont, majd a geometria cache feltöltése. Hibás GPX-nél a pálya 'failed' állapotba
+        kerül; tároló hibánál (OSError) a kivételt továbbadjuk, a feladatot a sor újrapróbálja.
+        """
+        track = cls.objects.filter(pk=track_id).only('id', 'gpx_file', 'lat', 'lon', 'distance_km_per_lap').first()
+        if track is None or not track.gpx_file:
+            return
+        # Csak akkor írunk, ha közben nem cserélték le a fájlt (akkor az újabb feladat dolgozik)
+        current = cls.objects.filter(pk=track_id, gpx_file=track.gpx_file.name)
+        current.update(gpx_status='processing', gpx_error="")
+        ResourceVersion.bump(TRACKS_VERSION_KEY)
+
+        try:
+            track.gpx_file.open() # Kinyitjuk olvasásra
             try:
-                self.gpx_file.open() # Kinyitjuk olvasásra
-                gpx = gpxpy.parse(self.gpx_file)
-
-                # Hossz kiszámolása
-                length_2d = gpx.length_2d()
-                if length_2d > 0:
-                    self.distance_km_per_lap = round(length_2d / 1000, 2)
-
-                # Kezdőpont beállítása
-                if self.lat == 0 or self.lon == 0:
-                    # Először próbáljuk track-ként
-                    if gpx.tracks and gpx.tracks[0].segments and gpx.tracks[0].segments[0].points:
-                        start_pt = gpx.tracks[0].segments[0].points[0]
-                        self.lat = start_pt.latitude
-                        self.lon = start_pt.longitude
-                    # Ha nincs track, próbáljuk route-ként
-                    elif gpx.routes and gpx.routes[0].points:
-                        start_pt = gpx.routes[0].points[0]
-                        self.lat = start_pt.latitude
-                        self.lon = start_pt.longitude
-
-                # Visszatekerjük a fájlt mentés előtt
-                self.gpx_file.seek(0)
-
-            except Exception as e:
-                print(f"GPX feldolgozási hiba: {e}")
-
-        super().save(*args, **kwargs)
+                digest = content_hash(track.gpx_file)
+                with GPX_PARSE_SECONDS.time('process_gpx'):
+                    gpx = gpxpy.parse(track.gpx_file)
+                    # Geometria index előállítása (a lookupok ebből dolgoznak, nem a GPX-ből)
+                    geometry = build_geometry(gpx)
+            finally:
+                track.gpx_file.close()
+        except OSError as e:
+            current.update(gpx_status='failed', gpx_error=f"A fájl nem olvasható: {e}"[:255])
+            ResourceVersion.bump(TRACKS_VERSION_KEY)
+            raise
+        except Exception as e:
+            print(f"GPX feldolgozási hiba: {e}")
+            current.update(gpx_status='failed', gpx_error=str(e)[:255], geometry_index=None, simplified_geometry={})
+            ResourceVersion.bump(TRACKS_VERSION_KEY)
+            return
+
+        fields = {
+            'geometry_index': geometry.to_bytes() if len(geometry) else None,
+            'simplified_geometry': geometry.lod_polylines(),
+            'gpx_status': 'ready',
+            'gpx_error': "",
+            'gpx_hash': digest,
+        }
+
+        # Hossz kiszámolása a kumulált táv indexből (vektorizált, route-only fájlra is jó)
+        if geometry.length > 0:
+            fields['distance_km_per_lap'] = round(geometry.length / 1000, 2)
+
+        # Kezdőpont beállítása (ha nincs megadva)
+        start = gpx_start_point(gpx)
+        if start and (track.lat == 0 or track.lon == 0):
+            fields['lat'], fields['lon'] = start
+
+        if current.update(**fields):
+            # Cache feltöltés: az első térkép / live tracker kérés már nem parse-ol
+            geometry_cache.invalidate(track_id)
+            geometry_cache.warm(track_id, track.gpx_file, geometry)
+            # update() nem küld post_save-et: a pályalista ETag-je kézzel avul el
+            ResourceVersion.bump(TRACKS_VERSION_KEY)
+            # A futók statisztikái a körhosszal számolt távot tárolják (a már beszámolt eredményeket
+            # a régivel): új körhossznál a pálya statisztikáit újraszámoljuk
+            if fields.get('distance_km_per_lap', track.distance_km_per_lap) != track.distance_km_per_lap:
+                Job.enqueue('track.stats', dedupe_key=f'track.stats:{track_id}', track_id=track_id)
+
+    # --- Képfeldolgozás (háttérfeladat) ---
+    @classmethod
+    def process_image(cls, track_id):
+        """
+        A pálya fotójának reszponzív változatai (images.py). Ha a kép tartalma (hash) nem
+        változott és a változatok megvannak, nem dolgozzuk fel újra.
+        """
+        track = cls.objects.filter(pk=track_id).only('id', 'image', *cls.IMAGE_FIELDS).first()
+        if track is None or not track.image:
+            return
+        with track.image.open('rb') as file:
+            digest = content_hash(file)
+            if digest == track.image_hash and track.image_variants:
+                return
+            variants, width, height = build_variants(file, variant_prefix(track.pk, digest))
+
+        # Közben lecserélték a képet -> az újabb feladat írja be a saját változatait
+        updated = cls.objects.filter(pk=track_id, image=track.image.name).update(
+            image_variants=variants, image_width=width, image_height=height, image_hash=digest,
+            image_thumbnail=thumbnail_name(variants) or track.image_thumbnail.name,
+        )
+        if updated:
+            delete_variants(track.image_variants, keep=variant_names(variants))
+            # update() nem küld post_save-et: a pályalista ETag-je kézzel avul el
+            ResourceVersion.bump(TRACKS_VERSION_KEY)
+        else:
+            delete_variants(variants)
+
+    # --- Értékelés összesítők karbantartása ---
+    @classmethod
+    def apply_rating_change(cls, track_id, added=None, removed=None):
+        """
+        Egy értékelés hozzáadása (added) és/vagy elvétele (removed) a pálya összesítőiből.
+        A hívó tranzakciójában fut; a pálya sorát zároljuk, hogy a párhuzamos értékelések
+        ne írják felül egymás számlálóit.
+        """
+        stats = (cls.objects.select_for_update().filter(pk=track_id)
+                 .values('review_count', 'rating_sum', 'rating_histogram').first())
+        if stats is None:
+            return  # A pálya közben törlődött (kaszkád törlés)
+
+        count, total = stats['review_count'], stats['rating_sum']
+        histogram = dict(stats['rating_histogram'] or {})
+        for rating, sign in ((removed, -1), (added, 1)):
+            if rating is None:
+                continue
+            count += sign
+            total += sign * rating
+            bucket = rating_bucket(rating)
+            histogram[bucket] = histogram.get(bucket, 0) + sign
+        cls.objects.filter(pk=track_id).update(**rating_stats(count, total, histogram))
 
     def get_distance_from_lat_lon(self, runner_lat, runner_lon):
         """
-        Map Matching: Megkeresi a GPX útvonalon a legközelebbi pontot,
-        és visszaadja a starttól mért távolságot (float).
+        Map Matching: A futó pozícióját a legközelebbi GPX szakaszra vetíti (rács index),
+        és visszaadja a vetített pont starttól mért távolságát (float).
         """
-        if not self.gpx_file:
-            return 0.0  # Módosítva: 0 -> 0.0
-
         try:
-            self.gpx_file.open()
-            # Az import gpxpy maradhat itt is, vagy a fájl elején
-            import gpxpy
-            gpx = gpxpy.parse(self.gpx_file)
-            self.gpx_file.seek(0)
-
-            best_distance = 0.0
-            min_diff = float('inf')
-
-            current_track_dist = 0.0
-            prev_point = None
-
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    for point in segment.points:
-                        # 1. Pálya távolság növelése
-                        if prev_point:
-                            step = point.distance_2d(prev_point)
-                            current_track_dist += step
+            geometry = self.get_geometry()
+            if geometry is None:
+                return 0.0  # Módosítva: 0 -> 0.0
 
-                        # 2. Távolság mérése a futótól
-                        dist_to_runner = point.distance_2d(gpxpy.gpx.GPXTrackPoint(runner_lat, runner_lon))
+            with MAP_MATCH_SECONDS.time('global'):
+                match = geometry.match(runner_lat, runner_lon)
+            if match is None:
+                return 0.0
 
-                        if dist_to_runner < min_diff:
-                            min_diff = dist_to_runner
-                            best_distance = current_track_dist
+            return float(match.distance) # Módosítva: int() helyett float()
 
-                        prev_point = point
+        except Exception as e:
+            print(f"Map matching hiba: {e}")
+            return 0.0 # Módosítva: 0 -> 0.0
 
-            return float(best_distance) # Módosítva: int() helyett float()
+    def match_position(self, runner_lat, runner_lon, last_segment=None, last_ratio=0.0):
+        """
+        Inkrementális Map Matching (Live Trackerhez): ha ismerjük a futó legutóbbi
+        illesztését (szakasz + arány), csak körülötte egy szűk ablakban keresünk.
+        Visszaadja: MapMatch (segment, ratio, distance, deviation) vagy None.
+        """
+        try:
+            geometry = self.get_geometry()
+            if geometry is None:
+                return None
+            with MAP_MATCH_SECONDS.time('incremental'):
+                return geometry.match_near(runner_lat, runner_lon, last_segment, last_ratio)
+        except Exception as e:
+            print(f"Map matching hiba: {e}")
+            return None
 
+    def match_positions(self, points, last_segment=None, last_ratio=0.0):
+        """
+        Kötegelt inkrementális Map Matching: [(lat, lon), ...] pontokat illeszt sorban,
+        mindegyiket az előző illesztés körül. Visszaadja: [MapMatch, ...] (hibánál None-okat).
+        """
+        try:
+            geometry = self.get_geometry()
+            if geometry is None:
+                return [None] * len(points)
+            with MAP_MATCH_SECONDS.time('batch'):
+                return geometry.match_sequence(points, last_segment, last_ratio)
         except Exception as e:
             print(f"Map matching hiba: {e}")
-            return 0.0 # Módosítva: 0 -> 0.0
+            return [None] * len(points)
 
 
 # --- LIVE RUN MODELL BŐVÍTÉSE ---
@@ -235,6 +418,7 @@ class LiveRun(models.Model):
     # Időzítés
     start_time = models.DateTimeField(null=True, blank=True) # Csak induláskor állítjuk be
     last_update = models.DateTimeField(auto_now=True)
+    last_fix_at = models.DateTimeField(null=True, blank=True) # Az utolsó feldolgozott GPS jel ideje (kötegnél a telefoné)
 
     # Távolság és Célok
     current_distance = models.FloatField(default=0.0) # float a pontosabb számoláshoz
@@ -249,6 +433,13 @@ class LiveRun(models.Model):
     current_lap = models.IntegerField(default=0)      # 0 = Még nem indult el
     current_lap_start = models.DateTimeField(null=True, blank=True) # Mikor kezdte az aktuális kört
 
+    # Map matching állapot: a legutóbb illesztett GPX szakasz és a pozíció rajta (0-1)
+    matched_segment = models.IntegerField(null=True, blank=True)
+    matched_ratio = models.FloatField(default=0.0)
+
+    # Optimista zárolás: minden kiírás növeli, az írás feltétele a korábbi érték (live_state.py)
+    version = models.PositiveIntegerField(default=0)
+
     # Naplózás (JSON stringként tároljuk a részidőket)
     lap_times_log = models.TextField(default="[]", blank=True)
 
@@ -272,6 +463,27 @@ class LiveRun(models.Model):
         except:
             self.lap_times_log = json.dumps([lap_time_str])
 
+class RunSampleChunk(models.Model):
+    """
+    Egy futás nyers GPS jeleinek egy darabja (legfeljebb ~512 jel), tömören kódolva.
+    A kódolás és a pufferelt, kötegelt írás a samples.py-ban van.
+    """
+    # A LiveRun ID-ja; nem ForeignKey, mert a LiveRun a futás végén törlődik, a jelek megmaradnak
+    run_id = models.PositiveBigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sample_chunks')
+    track = models.ForeignKey(Track, on_delete=models.SET_NULL, null=True, blank=True)
+
+    start_time = models.DateTimeField() # Az első jel ideje a darabban
+    end_time = models.DateTimeField()   # Az utolsó jel ideje a darabban
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()         # delta + varint kódolt (idő_ms, lat, lon) hármasok
+
+    class Meta:
+        indexes = [models.Index(fields=['run_id', 'start_time'])]
+
+    def __str__(self):
+        return f"Futás #{self.run_id} - {self.count} jel ({self.start_time:%H:%M:%S})"
+
 class Result(models.Model):
     # ... (A Result modell változatlan maradhat)
     track = models.ForeignKey(Track, on_delete=models.CASCADE)
@@ -280,6 +492,9 @@ class Result(models.Model):
     laps_count = models.IntegerField(default=1)
     lap_times = models.CharField(max_length=500, default="")
     time = models.CharField(max_length=10)
+    # A 'time' számként (rendezéshez, ranglistához) és a tempó - a save() tölti ki
+    duration_ms = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    pace_ms_per_km = models.PositiveIntegerField(null=True, blank=True, editable=False)
     recorded_at = models.DateTimeField(auto_now_add=True)
     date = models.DateField(default=timezone.now)
     # --- ÚJ MEZŐK A BMI SZÁMÍTÁSHOZ ---
@@ -287,11 +502,259 @@ class Result(models.Model):
     runner_height = models.IntegerField(null=True, blank=True, verbose_name="Futó magassága (cm)")
 
     class Meta:
-        ordering = ['time']
+        # Számszerű idő szerint (a szöveges 'time' rendezés egy óra felett hibás)
+        ordering = [F('duration_ms').asc(nulls_last=True), 'recorded_at']
+        indexes = [
+            # Ranglista: pályán belül idő szerint, illetve azonos körszámon belül
+            models.Index(fields=['track', 'duration_ms'], name='result_track_duration_idx'),
+            models.Index(fields=['track', 'laps_count', 'duration_ms'], name='result_track_laps_dur_idx'),
+            # Futónkénti előzmények (my_results, runner_results) kurzoros lapozása
+            models.Index(fields=['user', '-date', '-recorded_at'], name='result_user_date_idx'),
+            models.Index(fields=['runner_name', '-date', '-recorded_at'], name='result_runner_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.runner_name} - {self.time} ({self.track.name})"
 
+    def compute_duration(self):
+        """A 'time' szövegből a duration_ms és a km-enkénti tempó kiszámolása."""
+        self.duration_ms = parse_duration_ms(self.time)
+        self.pace_ms_per_km = None
+        if self.duration_ms and self.track_id:
+            distance_km = (self.laps_count or 1) * self.track.distance_km_per_lap
+            if distance_km > 0:
+                self.pace_ms_per_km = round(self.duration_ms / distance_km)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_split_source()
+        return instance
+
+    def _split_source(self):
+        # Ha ezek közül bármi változik, a köridő sorokat (LapSplit) újra kell írni
+        return (self.__dict__.get('track_id'), self.__dict__.get('user_id'), self.__dict__.get('lap_times'))
+
+    def _remember_split_source(self):
+        self._saved_split_source = self._split_source()
+
+    def split_rows(self):
+        """A 'lap_times' szövegből a LapSplit sorok (mentés nélkül); az értelmezhetetlen köröket kihagyja."""
+        rows = []
+        cumulative = 0
+        for lap_number, lap_ms in enumerate(parse_lap_times(self.lap_times), start=1):
+            if lap_ms is None:
+                cumulative = None
+                continue
+            if cumulative is not None:
+                cumulative += lap_ms
+            rows.append(LapSplit(
+                result_id=self.pk, track_id=self.track_id, user_id=self.user_id,
+                lap_number=lap_number, duration_ms=lap_ms, cumulative_ms=cumulative,
+            ))
+        return rows
+
+    def save(self, *args, **kwargs):
+        self.compute_duration()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'duration_ms', 'pace_ms_per_km'}
+
+        # A köridő sorokat csak akkor írjuk újra, ha a köridők (vagy a pálya/futó) változtak
+        splits_stale = self._state.adding or getattr(self, '_saved_split_source', None) != self._split_source()
+        if update_fields is not None and not {'lap_times', 'track', 'track_id', 'user', 'user_id'} & set(update_fields):
+            splits_stale = False
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if splits_stale:
+                LapSplit.objects.filter(result_id=self.pk).delete()
+                LapSplit.objects.bulk_create(self.split_rows())
+            # A futó statisztikái: a régi (pre_save-ben beolvasott) és az új állapot különbsége
+            UserTrackStats.apply_result_change(self.pk, getattr(self, '_previous_state', None), self.stats_state())
+        if splits_stale:
+            self._remember_split_source()
+
+    def stats_state(self):
+        """Az eredmény statisztikába számító mezői (ugyanaz a forma, mint a pre_save-ben beolvasott régi állapot)."""
+        state = {name: getattr(self, name) for name in RESULT_STATS_FIELDS}
+        state['date'] = as_date(state['date'])
+        return state
+
+# A Result mezői, amelyek a UserTrackStats-ba számítanak
+RESULT_STATS_FIELDS = ('user_id', 'track_id', 'laps_count', 'duration_ms', 'pace_ms_per_km', 'date')
+
+class LapSplit(models.Model):
+    """
+    Egy eredmény egy köre egész ezredmásodpercben (a Result.lap_times szöveg normalizált alakja).
+    A Result.save() tölti (bulk insert); a pálya és a futó a gyors lekérdezésekhez duplikálva van.
+    """
+    result = models.ForeignKey(Result, on_delete=models.CASCADE, related_name='splits')
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='lap_splits')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    lap_number = models.PositiveSmallIntegerField()                 # 1-től
+    duration_ms = models.PositiveIntegerField()
+    cumulative_ms = models.PositiveIntegerField(null=True, blank=True) # Részidő a rajttól (ha minden előző kör értelmezhető)
+
+    class Meta:
+        ordering = ['result', 'lap_number']
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'lap_number'], name='lapsplit_result_lap_uniq'),
+        ]
+        indexes = [
+            # Leggyorsabb kör egy pályán, illetve az n. körök ranglistája
+            models.Index(fields=['track', 'duration_ms'], name='lapsplit_track_dur_idx'),
+            models.Index(fields=['track', 'lap_number', 'duration_ms'], name='lapsplit_track_lap_dur_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.result_id} {self.lap_number}. kör: {self.duration_ms} ms"
+
+class UserTrackStats(models.Model):
+    """
+    Egy futó statisztikái egy pályán: futások száma, összes táv és idő, egyéni csúcsok
+    körszámonként, legjobb tempó, heti/havi volumen. A Result írásakor növekményesen
+    frissül (apply_result_change), a teljes újraszámolás a rebuild_user_stats parancs; a pálya
+    körhosszának változásakor (process_gpx) a pálya statisztikái a track.stats feladatban épülnek újra.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='track_stats')
+    track = models.ForeignKey(Track, on_delete=models.CASCADE, related_name='user_stats')
+
+    run_count = models.PositiveIntegerField(default=0)
+    total_distance_km = models.FloatField(default=0.0)
+    total_duration_ms = models.PositiveBigIntegerField(default=0)
+
+    # Egyéni csúcsok körszámonként: {"3": {"duration_ms": .., "result_id": .., "date": "2026-10-18"}}
+    personal_bests = models.JSONField(default=dict, blank=True)
+    best_pace_ms_per_km = models.PositiveIntegerField(null=True, blank=True)
+    best_pace_result_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    # Volumen időszakonként: {"2026-W42": {"runs": .., "distance_km": .., "duration_ms": ..}} / {"2026-10": {...}}
+    weekly_volume = models.JSONField(default=dict, blank=True)
+    monthly_volume = models.JSONField(default=dict, blank=True)
+    last_run_date = models.DateField(null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'track'], name='usertrackstats_user_track_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.track_id}: {self.run_count} futás"
+
+    # --- Növekményes frissítés ---
+    @classmethod
+    def apply_result_change(cls, result_id, old, new):
+        """
+        Egy eredmény változásának átvezetése: old/new az eredmény statisztikai mezői
+        (Result.stats_state()) a változás előtt és után, None ha nem létezett / törlődött.
+        A hívó tranzakciójában fut; a statisztika sorát zároljuk.
+        """
+        old = old if old and old['user_id'] else None
+        new = new if new and new['user_id'] else None
+        if old == new:
+            return
+
+        states = [state for state in (old, new) if state]
+        lap_km = dict(Track.objects.filter(pk__in={state['track_id'] for state in states})
+                      .values_list('id', 'distance_km_per_lap'))
+        for user_id, track_id in {(state['user_id'], state['track_id']) for state in states}:
+            stats = cls.objects.select_for_update().filter(user_id=user_id, track_id=track_id).first()
+            changes = ((old, -1), (new, 1))
+            if stats is None:
+                # Nincs mit kivonni (pl. a pálya törlésekor a statisztika már törlődött)
+                if not new or (new['user_id'], new['track_id']) != (user_id, track_id):
+                    continue
+                stats, _ = cls.objects.select_for_update().get_or_create(user_id=user_id, track_id=track_id)
+                changes = ((new, 1),)
+            for state, sign in changes:
+                if state and (state['user_id'], state['track_id']) == (user_id, track_id):
+                    distance_km = (state['laps_count'] or 0) * lap_km.get(track_id, 0.0)
+                    if sign > 0:
+                        stats.add_run(result_id, state, distance_km)
+                    else:
+                        stats.remove_run(result_id, state, distance_km)
+            if stats.run_count > 0:
+                stats.save()
+            else:
+                stats.delete()
+
+    # --- Teljes újraszámolás ---
+    @classmethod
+    def build(cls, rows, lap_km):
+        """
+        Statisztika sorok (mentetlen UserTrackStats) az eredményekből. A 'rows' a Result
+        .values('pk', *RESULT_STATS_FIELDS) sorai futó és pálya szerint rendezve.
+        """
+        for (user_id, track_id), group in groupby(rows, key=lambda row: (row['user_id'], row['track_id'])):
+            stats = cls(user_id=user_id, track_id=track_id)
+            for row in group:
+                row['date'] = as_date(row['date'])
+                stats.add_run(row.pop('pk'), row, (row['laps_count'] or 0) * lap_km.get(track_id, 0.0))
+            yield stats
+
+    @classmethod
+    def rebuild_track(cls, track_id):
+        """Egy pálya összes statisztikájának újraszámolása (pl. a körhossz megváltozása után)."""
+        with transaction.atomic():
+            lap_km = dict(Track.objects.filter(pk=track_id).values_list('id', 'distance_km_per_lap'))
+            rows = (Result.objects.filter(track_id=track_id, user__isnull=False)
+                    .order_by('user_id', 'track_id', 'date', 'recorded_at')
+                    .values('pk', *RESULT_STATS_FIELDS))
+            cls.objects.filter(track_id=track_id).delete()
+            cls.objects.bulk_create(cls.build(rows, lap_km))
+
+    def add_run(self, result_id, state, distance_km):
+        duration = state['duration_ms']
+        day = state['date']
+        self.run_count += 1
+        self.total_distance_km = round(self.total_distance_km + distance_km, 3)
+        self.total_duration_ms += duration or 0
+
+        laps = str(state['laps_count'])
+        best = self.personal_bests.get(laps)
+        if duration and (best is None or duration < best['duration_ms']):
+            self.personal_bests[laps] = {'duration_ms': duration, 'result_id': result_id, 'date': day.isoformat()}
+        pace = state['pace_ms_per_km']
+        if pace and (self.best_pace_ms_per_km is None or pace < self.best_pace_ms_per_km):
+            self.best_pace_ms_per_km, self.best_pace_result_id = pace, result_id
+
+        today = timezone.localdate()
+        add_volume(self.weekly_volume, week_key(day), 1, distance_km, duration or 0, oldest_week_key(today))
+        add_volume(self.monthly_volume, month_key(day), 1, distance_km, duration or 0, oldest_month_key(today))
+        if self.last_run_date is None or day > self.last_run_date:
+            self.last_run_date = day
+
+    def remove_run(self, result_id, state, distance_km):
+        duration = state['duration_ms']
+        day = state['date']
+        self.run_count -= 1
+        self.total_distance_km = max(round(self.total_distance_km - distance_km, 3), 0.0)
+        self.total_duration_ms = max(self.total_duration_ms - (duration or 0), 0)
+        today = timezone.localdate()
+        add_volume(self.weekly_volume, week_key(day), -1, -distance_km, -(duration or 0), oldest_week_key(today))
+        add_volume(self.monthly_volume, month_key(day), -1, -distance_km, -(duration or 0), oldest_month_key(today))
+
+        # Ha épp a csúcsot / a legfrissebb futást vettük el, a következőt egy indexelt lekérdezés adja
+        others = Result.objects.filter(user_id=self.user_id, track_id=self.track_id).exclude(pk=result_id)
+        laps = str(state['laps_count'])
+        if self.personal_bests.get(laps, {}).get('result_id') == result_id:
+            best = (others.filter(laps_count=state['laps_count'], duration_ms__isnull=False)
+                    .order_by('duration_ms', 'recorded_at').values('pk', 'duration_ms', 'date').first())
+            if best:
+                self.personal_bests[laps] = {'duration_ms': best['duration_ms'], 'result_id': best['pk'],
+                                             'date': best['date'].isoformat()}
+            else:
+                del self.personal_bests[laps]
+        if self.best_pace_result_id == result_id:
+            best = (others.filter(pace_ms_per_km__isnull=False)
+                    .order_by('pace_ms_per_km', 'recorded_at').values('pk', 'pace_ms_per_km').first())
+            self.best_pace_ms_per_km = best['pace_ms_per_km'] if best else None
+            self.best_pace_result_id = best['pk'] if best else None
+        if self.last_run_date == day:
+            self.last_run_date = others.order_by('-date').values_list('date', flat=True).first()
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     birth_year = models.IntegerField(null=True, blank=True, verbose_name="Születési év")
@@ -329,3 +792,162 @@ class TrackReview(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.track.name} ({self.rating})"
+
+    def save(self, *args, **kwargs):
+        # A pálya értékelés összesítői az értékeléssel egy tranzakcióban frissülnek
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = TrackReview.objects.filter(pk=self.pk).values_list('track_id', 'rating').first()
+            super().save(*args, **kwargs)
+
+            if previous is None:
+                Track.apply_rating_change(self.track_id, added=self.rating)
+            elif previous[0] != self.track_id:
+                # Másik pályára került át
+                Track.apply_rating_change(previous[0], removed=previous[1])
+                Track.apply_rating_change(self.track_id, added=self.rating)
+            elif previous[1] != self.rating:
+                Track.apply_rating_change(self.track_id, added=self.rating, removed=previous[1])
+
+
+# --- HÁTTÉRFELADATOK (DB alapú sor, külső broker nélkül) ---
+class Job(models.Model):
+    """
+    Egy háttérfeladat (pl. GPX feldolgozás) a feladatsorban. A workerek (jobs.py) feltételes
+    UPDATE-tel foglalják le, így több szál vagy folyamat is dolgozhat ugyanabból a sorból.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Sorban áll'),
+        ('running', 'Fut'),
+        ('done', 'Kész'),
+        ('failed', 'Sikertelen'),
+    ]
+
+    kind = models.CharField(max_length=50) # pl. 'track.gpx' - a jobs.HANDLERS kulcsa
+    payload = models.JSONField(default=dict, blank=True) # a handler kulcsszavas argumentumai
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now) # újrapróbálásnál későbbre tolódik
+    dedupe_key = models.CharField(max_length=120, blank=True, default="")
+    locked_by = models.CharField(max_length=120, blank=True, default="")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['dedupe_key', 'status'], name='job_dedupe_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, kind, dedupe_key="", **payload):
+        """
+        Új feladat a sorba, a hívó tranzakciójában. Ha ugyanazzal a dedupe_key-jel már vár egy
+        feladat, nem veszünk fel újat. A workereket a tranzakció lezárása után ébresztjük.
+        """
+        job = cls.objects.filter(dedupe_key=dedupe_key, status='queued').first() if dedupe_key else None
+        if job is None:
+            job = cls.objects.create(kind=kind, payload=payload, dedupe_key=dedupe_key)
+        transaction.on_commit(wake_workers)
+        return job
+
+
+# --- ERŐFORRÁS VERZIÓK (ETag / feltételes GET) ---
+class ResourceVersion(models.Model):
+    """
+    Olcsó verziószámláló erőforrásonként (pl. 'tracks', 'results:<track_id>').
+    Minden írásnál növeljük; az API ebből számolja az ETag-et, így egy változatlan
+    lista újrakérésekor 304-et adhat a szerializálás nélkül.
+    """
+    key = models.CharField(max_length=120, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} (v{self.version})"
+
+    @classmethod
+    def current(cls, key):
+        """Az erőforrás aktuális verziója (0, ha még sosem írták)."""
+        return cls.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, *keys):
+        """A megadott erőforrások verziójának növelése (atomikus UPDATE, szükség esetén INSERT)."""
+        for key in keys:
+            if cls.objects.filter(key=key).update(version=F('version') + 1):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(key=key, version=1)
+            except IntegrityError:
+                # Közben egy másik kérés létrehozta -> sima növelés
+                cls.objects.filter(key=key).update(version=F('version') + 1)
+
+
+TRACKS_VERSION_KEY = 'tracks'
+
+def results_version_key(track_id):
+    return f'results:{track_id}'
+
+def reviews_version_key(track_id):
+    return f'reviews:{track_id}'
+
+
+@receiver([post_save, post_delete], sender=Track)
+def bump_track_version(sender, instance, **kwargs):
+    ResourceVersion.bump(TRACKS_VERSION_KEY)
+
+@receiver(pre_save, sender=Result)
+def remember_result_track(sender, instance, **kwargs):
+    """
+    Az eredmény mentés előtti állapota: ha másik pályára teszik át, a régi pálya listája is
+    elavul, és a futó statisztikáiból a régi értékeket kell kivonni.
+    """
+    instance._previous_track_id = None
+    instance._previous_state = None
+    if instance.pk:
+        previous = Result.objects.filter(pk=instance.pk).values(*RESULT_STATS_FIELDS).first()
+        if previous:
+            instance._previous_track_id = previous['track_id']
+            instance._previous_state = previous
+
+@receiver(post_delete, sender=Result)
+def remove_result_from_user_stats(sender, instance, **kwargs):
+    # A törlés tranzakciójában fut (kaszkád törlésnél is)
+    UserTrackStats.apply_result_change(instance.pk, instance.stats_state(), None)
+
+@receiver([post_save, post_delete], sender=Result)
+def bump_result_version(sender, instance, **kwargs):
+    keys = {results_version_key(instance.track_id)}
+    previous = getattr(instance, '_previous_track_id', None)
+    if previous:
+        keys.add(results_version_key(previous))
+    ResourceVersion.bump(*keys)
+
+@receiver(post_delete, sender=TrackReview)
+def remove_review_from_track_stats(sender, instance, **kwargs):
+    # A törlés (kaszkád törlésnél is) tranzakcióban fut, az összesítő frissítése is abban
+    Track.apply_rating_change(instance.track_id, removed=instance.rating)
+
+@receiver([post_save, post_delete], sender=TrackReview)
+def bump_review_version(sender, instance, **kwargs):
+    # A pályalista is tartalmazza az átlagos értékelést, ezért az is elavul
+    ResourceVersion.bump(reviews_version_key(instance.track_id), TRACKS_VERSION_KEY)
+
+@receiver([post_save, post_delete], sender=LiveRun)
+def notify_live_run_change(sender, instance, **kwargs):
+    """Az SSE stream és a Dashboard pillanatképe ebből tudja, hogy a futás változott."""
+    user_id = instance.user_id
+
+    def notify():
+        live_run_changes.notify(user_id)
+        live_run_changes.notify(ANY_RUN)
+
+    transaction.on_commit(notify)
@@ -0,0 +1,158 @@
+"""
+Kurzor alapú (keyset) lapozás és NDJSON streamelés az eredménylistákhoz.
+
+OFFSET helyett az előző oldal utolsó sorának rendezési kulcsaitól folytatjuk
+("WHERE (kulcsok) > (utolsó kulcsok) ORDER BY kulcsok LIMIT n"), így minden oldal
+egy index-szakasz olvasása, függetlenül attól, hányadik oldalnál tartunk, és a
+lapozás közben beszúrt sorok sem csúsztatják el az oldalakat.
+
+A kurzor az utolsó sor kulcsai base64-be csomagolt JSON-ként; a kliens átlátszatlan
+tokenként kezeli és változatlanul küldi vissza.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+# Oldalméret, ha a kliens nem kér mást, illetve a felső korlát
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Streamelésnél ennyi sort olvasunk egyszerre a szerveroldali kurzorból
+STREAM_CHUNK_SIZE = 2000
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """A DjangoJSONEncoder ezredmásodpercre vágja az időpontokat; a kurzorban a teljes pontosság kell."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(ValueError):
+    """Hibás vagy más listához tartozó kurzor."""
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """A ?limit= paraméter értelmezése: 1..maximum közé szorítva, hibás értékre az alapértelmezés."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+class Keyset:
+    """
+    Egy lista rendezési kulcsai, pl. Keyset('duration_ms', 'recorded_at', 'pk')
+    vagy Keyset('-date', '-recorded_at', '-pk'). Az utolsó kulcs legyen egyedi (pk),
+    különben az azonos kulcsú sorok az oldalak határán elveszhetnek.
+    A NULL értékek mindkét irányban a lista végére kerülnek.
+    """
+
+    def __init__(self, *keys):
+        self.keys = [(key.lstrip('-'), key.startswith('-')) for key in keys]
+
+    def order_by(self):
+        return [
+            F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True)
+            for name, descending in self.keys
+        ]
+
+    # --- Kurzor ---
+
+    def _field(self, model, name):
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def cursor_for(self, row):
+        """A sor (modell példány) kulcsaiból a következő oldal kurzora."""
+        values = [getattr(row, name) for name, _ in self.keys]
+        raw = json.dumps(values, cls=_CursorEncoder, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, model, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (binascii.Error, ValueError):
+            raise InvalidCursor("Érvénytelen kurzor")
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            raise InvalidCursor("Érvénytelen kurzor")
+        try:
+            return [
+                None if value is None else self._field(model, name).to_python(value)
+                for (name, _), value in zip(self.keys, values)
+            ]
+        except ValidationError:
+            raise InvalidCursor("Érvénytelen kurzor")
+
+    def after(self, model, values):
+        """
+        Q feltétel: a sor a kurzor után jön a rendezésben.
+        (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... - a NULL-ok a végén vannak.
+        """
+        conditions = []
+        equal = Q()
+        for (name, descending), value in zip(self.keys, values):
+            nullable = self._field(model, name).null
+            if value is None:
+                # NULL után csak a szintén NULL (és a további kulcsokban nagyobb) sorok jönnek
+                equal &= Q(**{f"{name}__isnull": True})
+                continue
+            later = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+            if nullable:
+                later |= Q(**{f"{name}__isnull": True})
+            conditions.append(equal & later)
+            equal &= Q(**{name: value})
+        condition = Q(pk__in=[])
+        for part in conditions:
+            condition |= part
+        return condition
+
+    # --- Lapozás ---
+
+    def page(self, queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Egy oldal: (sorok listája, következő kurzor vagy None).
+        Egy sorral többet kérünk le, így külön COUNT nélkül tudjuk, van-e még oldal.
+        """
+        queryset = queryset.order_by(*self.order_by())
+        if cursor:
+            queryset = queryset.filter(self.after(queryset.model, self.decode(queryset.model, cursor)))
+        rows = list(queryset[:limit + 1])
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, self.cursor_for(rows[-1])
+
+
+# Az eredménylisták rendezései (a modell indexeihez igazítva)
+RESULT_RANKING = Keyset('duration_ms', 'recorded_at', 'pk')
+RESULT_HISTORY = Keyset('-date', '-recorded_at', '-pk')
+
+# A nyilvános NDJSON stream mezői (a ResultSerializer mezői a kérésfüggő 'can_edit' és a futó
+# testadatai nélkül; a testsúly / magasság csak az adminnak szóló exportban van, transfer.py)
+RESULT_STREAM_FIELDS = ('id', 'track', 'runner_name', 'time', 'duration_ms', 'pace_ms_per_km',
+                        'laps_count', 'lap_times', 'date')
+
+
+def ndjson_lines(rows, chunk_rows=500):
+    """
+    Soronként egy JSON objektum (application/x-ndjson). A sorokat csomagokba fűzzük,
+    hogy ne minden sor legyen külön írás a kapcsolaton.
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    buffer = []
+    for row in rows:
+        buffer.append(encoder.encode(row))
+        if len(buffer) >= chunk_rows:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
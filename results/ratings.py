@@ -0,0 +1,36 @@
+"""
+Pálya értékelés összesítők (darabszám, összeg, átlag, csillagonkénti eloszlás) számolása.
+
+Az összesítőket a Track sorban tároljuk, és a TrackReview írásakor növekményesen
+frissítjük (models.py: Track.apply_rating_change). Ez a modul a közös számolást adja
+a növekményes frissítéshez és a teljes újraszámoláshoz (repair_track_ratings parancs).
+"""
+
+RATING_BUCKETS = ('1', '2', '3', '4', '5')
+
+
+def rating_bucket(rating):
+    """Értékelés (1-5, tört is lehet) -> hisztogram kulcs ("1".."5"), fél csillagtól felfelé kerekítve."""
+    return str(min(5, max(1, int(rating + 0.5))))
+
+
+def rating_stats(count, total, histogram):
+    """A Track összesítő mezőinek értékei (update()/bulk_update-hez) a darabszámból, összegből, eloszlásból."""
+    if count <= 0:
+        return {'review_count': 0, 'rating_sum': 0.0, 'average_rating': None, 'rating_histogram': {}}
+    return {
+        'review_count': count,
+        'rating_sum': total,
+        'average_rating': total / count,
+        # Csak a nem üres csillagszámok, rögzített sorrendben
+        'rating_histogram': {bucket: histogram[bucket] for bucket in RATING_BUCKETS if histogram.get(bucket, 0) > 0},
+    }
+
+
+def summarize_ratings(ratings):
+    """Értékelések listájából a teljes összesítő (ugyanaz, mint a növekményes frissítések eredménye)."""
+    histogram = {}
+    for rating in ratings:
+        bucket = rating_bucket(rating)
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return rating_stats(len(ratings), float(sum(ratings)), histogram)
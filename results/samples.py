@@ -0,0 +1,213 @@
+"""
+A futások nyers GPS jeleinek tömör, csak-hozzáfűzős tárolása (visszajátszás, ellenőrzés, újraszámolás).
+
+A jeleket nem jelenként egy ORM sorban tároljuk, hanem darabokban (RunSampleChunk):
+egy darab legfeljebb CHUNK_SIZE jel, binárisan kódolva:
+  - fixpontos értékek: idő ezredmásodpercben, lat/lon 1e-7 fokban (~1 cm) egész számként,
+  - mindhárom az előző jeltől vett különbségként (delta), zigzag + varint kódolással.
+Egy jel így tipikusan 5-7 bájt.
+
+Az egyes jeleket folyamaton belül pufferben gyűjtjük, és egyetlen bulk_create-tel írjuk ki,
+ha egy futás puffere megtelt, ha a futás célba ért, vagy SAMPLE_FLUSH_SECONDS-onként.
+"""
+import atexit
+import struct
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .models import RunSampleChunk
+
+# Egy darabban legfeljebb ennyi jel
+CHUNK_SIZE = 512
+
+# A pufferelt jeleket legalább ilyen gyakran kiírjuk (másodperc)
+SAMPLE_FLUSH_SECONDS = getattr(settings, 'SAMPLE_FLUSH_SECONDS', 30.0)
+
+# Fixpontos szorzó a koordinátákhoz (1e-7 fok)
+COORD_SCALE = 10 ** 7
+
+_CHUNK_MAGIC = b'GPS1'
+_CHUNK_HEADER = struct.Struct('<4sI')
+
+
+# --- KÓDOLÁS ---
+
+def _write_varint(out, value):
+    """Zigzag + LEB128: kis abszolút értékű (pozitív vagy negatív) egészek kevés bájton."""
+    value = (value << 1) ^ (value >> 63)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_samples(samples):
+    """[(idő_ms, lat, lon), ...] (időrendben) -> bináris darab."""
+    out = bytearray(_CHUNK_HEADER.pack(_CHUNK_MAGIC, len(samples)))
+    prev_t = prev_lat = prev_lon = 0
+    for t_ms, lat, lon in samples:
+        t_ms = int(t_ms)
+        lat_i = round(lat * COORD_SCALE)
+        lon_i = round(lon * COORD_SCALE)
+        _write_varint(out, t_ms - prev_t)
+        _write_varint(out, lat_i - prev_lat)
+        _write_varint(out, lon_i - prev_lon)
+        prev_t, prev_lat, prev_lon = t_ms, lat_i, lon_i
+    return bytes(out)
+
+
+def decode_samples(data):
+    """Bináris darab -> [(idő_ms, lat, lon), ...]."""
+    data = bytes(data)
+    magic, count = _CHUNK_HEADER.unpack_from(data)
+    if magic != _CHUNK_MAGIC:
+        raise ValueError("Ismeretlen GPS darab formátum")
+
+    values = []
+    pos = _CHUNK_HEADER.size
+    for _ in range(count * 3):
+        shift = result = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append((result >> 1) ^ -(result & 1))
+
+    samples = []
+    t_ms = lat_i = lon_i = 0
+    for i in range(0, len(values), 3):
+        t_ms += values[i]
+        lat_i += values[i + 1]
+        lon_i += values[i + 2]
+        samples.append((t_ms, lat_i / COORD_SCALE, lon_i / COORD_SCALE))
+    return samples
+
+
+def to_millis(moment):
+    return round(moment.timestamp() * 1000)
+
+
+def from_millis(t_ms):
+    return datetime.fromtimestamp(t_ms / 1000, tz=dt_timezone.utc)
+
+
+# --- TÁROLÓ ---
+
+class SampleStore:
+    """Futásonkénti puffer a jeleknek + kiírás darabokban (bulk insert)."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE, flush_seconds=SAMPLE_FLUSH_SECONDS):
+        self.chunk_size = chunk_size
+        self.flush_seconds = flush_seconds
+        self._buffers = {}  # run_id -> {'user_id', 'track_id', 'samples', 'since'}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _chunk(self, run_id, user_id, track_id, samples):
+        return RunSampleChunk(
+            run_id=run_id, user_id=user_id, track_id=track_id,
+            start_time=from_millis(samples[0][0]), end_time=from_millis(samples[-1][0]),
+            count=len(samples), data=encode_samples(samples),
+        )
+
+    def append(self, run_id, user_id, track_id, fixes, final=False):
+        """
+        Jelek [(datetime, lat, lon), ...] hozzáfűzése egy futáshoz.
+        A teli darabokat (és final=True esetén a maradékot is) rögtön kiírja.
+        """
+        chunks = []
+        with self._lock:
+            buffer = self._buffers.get(run_id)
+            if buffer is None:
+                buffer = {'user_id': user_id, 'track_id': track_id, 'samples': [], 'since': time.monotonic()}
+                self._buffers[run_id] = buffer
+            buffer['samples'].extend((to_millis(moment), lat, lon) for moment, lat, lon in fixes)
+
+            samples = buffer['samples']
+            while len(samples) >= self.chunk_size:
+                chunks.append(self._chunk(run_id, user_id, track_id, samples[:self.chunk_size]))
+                del samples[:self.chunk_size]
+            if final or not samples:
+                if samples:
+                    chunks.append(self._chunk(run_id, user_id, track_id, samples))
+                del self._buffers[run_id]
+
+        if chunks:
+            RunSampleChunk.objects.bulk_create(chunks)
+        self._ensure_flusher()
+
+    def flush(self, force=False):
+        """A régóta (vagy force=True esetén az összes) pufferben lévő jel kiírása egyetlen bulk inserttel."""
+        now = time.monotonic()
+        chunks = []
+        with self._lock:
+            for run_id, buffer in list(self._buffers.items()):
+                if force or now - buffer['since'] >= self.flush_seconds:
+                    chunks.append(self._chunk(run_id, buffer['user_id'], buffer['track_id'], buffer['samples']))
+                    del self._buffers[run_id]
+        if chunks:
+            RunSampleChunk.objects.bulk_create(chunks)
+        return len(chunks)
+
+    def owner_of(self, run_id):
+        """A futás tulajdonosának user ID-ja, vagy None, ha nincs ilyen futás."""
+        with self._lock:
+            buffer = self._buffers.get(run_id)
+            if buffer is not None:
+                return buffer['user_id']
+        return RunSampleChunk.objects.filter(run_id=run_id).values_list('user_id', flat=True).first()
+
+    def read(self, run_id, start=None, end=None):
+        """
+        Egy futás jelei időrendben [(datetime, lat, lon), ...], opcionálisan [start, end] időszakra.
+        Csak az időszakot átfedő darabokat töltjük be (run_id + start_time index).
+        """
+        chunks = RunSampleChunk.objects.filter(run_id=run_id)
+        if start is not None:
+            chunks = chunks.filter(end_time__gte=start)
+        if end is not None:
+            chunks = chunks.filter(start_time__lte=end)
+
+        samples = []
+        for data in chunks.order_by('start_time', 'pk').values_list('data', flat=True):
+            samples.extend(decode_samples(data))
+        with self._lock:
+            buffer = self._buffers.get(run_id)
+            if buffer is not None:
+                samples.extend(buffer['samples'])
+
+        start_ms = to_millis(start) if start is not None else None
+        end_ms = to_millis(end) if end is not None else None
+        return [
+            (from_millis(t_ms), lat, lon) for t_ms, lat, lon in samples
+            if (start_ms is None or t_ms >= start_ms) and (end_ms is None or t_ms <= end_ms)
+        ]
+
+    # --- Háttér kiírás ---
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='sample-flusher', daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush, force=True)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(max(self.flush_seconds / 2, 0.5))
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"GPS minta kiírási hiba: {e}")
+
+
+# Folyamaton belül közös példány
+sample_store = SampleStore()
@@ -1,9 +1,29 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Track, Result, TrackReview
+from .images import variant_urls
+from .metrics import SERIALIZE_SECONDS
+
+
+# --- IDŐMÉRÉS (metrics.py) ---
+class TimedListSerializer(serializers.ListSerializer):
+    """Lista szerializálás: az egész lista ideje egy mérés, az elem serializer nevével."""
+    @property
+    def data(self):
+        with SERIALIZE_SECONDS.time(type(self.child).__name__):
+            return super().data
+
+
+class TimedModelSerializer(serializers.ModelSerializer):
+    """A serializer.data előállításának idejét méri; listához a Meta-ban: list_serializer_class = TimedListSerializer"""
+    @property
+    def data(self):
+        with SERIALIZE_SECONDS.time(type(self).__name__):
+            return super().data
+
 
 # --- TRACK SERIALIZER ---
-class TrackSerializer(serializers.ModelSerializer):
+class TrackSerializer(TimedModelSerializer):
     """
     Serializer a Track modellhez. Kezeli a képet, tulajdonost, értékeléseket ÉS MOST MÁR A GPX ADATOKAT IS.
     """
@@ -11,22 +31,44 @@ class TrackSerializer(serializers.ModelSerializer):
     created_by = serializers.StringRelatedField(read_only=True)
     image = serializers.ImageField(required=False, allow_null=True)
 
-    # Értékelés mezők (az annotálásból jönnek)
+    # Értékelés mezők (a Track-en tárolt összesítők, a TrackReview írásakor frissülnek)
     average_rating = serializers.FloatField(read_only=True)
     review_count = serializers.IntegerField(read_only=True)
+    rating_histogram = serializers.JSONField(read_only=True)
 
     # --- ÚJ MEZŐK A GPX MIATT ---
-    coordinates = serializers.SerializerMethodField()
+    # Csak a durva körvonal (encoded polyline); a részletes útvonal: /api/tracks/<id>/geometry/
+    outline = serializers.SerializerMethodField()
     gpx_url = serializers.SerializerMethodField()
 
+    # Reszponzív képváltozatok URL-jei: {"200": {"width", "height", "jpeg", "webp"}, "400": ..., "1200": ...}
+    # (üres, amíg a háttérfeldolgozás el nem készül)
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Track
-        fields = '__all__'
+        # A bináris geometria index, a tárolt LOD szintek és az értékelések összege belső adatok, nem küldjük ki
+        exclude = ('geometry_index', 'simplified_geometry', 'rating_sum', 'image_hash', 'gpx_hash')
+        read_only_fields = ('image_thumbnail',)
+        list_serializer_class = TimedListSerializer
 
     # --- ÚJ SEGÉDFÜGGVÉNYEK ---
-    def get_coordinates(self, obj):
-        # Ez hívja meg a models.py-ban írt get_coordinates_list() függvényt
-        return obj.get_coordinates_list()
+    def get_outline(self, obj):
+        # Amíg a GPX feldolgozása a sorban áll, nincs körvonal (a kérésben nem parse-olunk)
+        if obj.gpx_status in ('queued', 'processing'):
+            return ""
+        # Előre kiszámolt, egyszerűsített útvonal (models.py: get_polyline)
+        return obj.get_polyline('coarse')
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        variants = variant_urls(obj.image_variants)
+        if request:
+            for variant in variants.values():
+                for fmt in ('jpeg', 'webp'):
+                    if fmt in variant:
+                        variant[fmt] = request.build_absolute_uri(variant[fmt])
+        return variants
 
     def get_gpx_url(self, obj):
         # Visszaadja a fájl elérési útját, ha van
@@ -35,7 +77,7 @@ class TrackSerializer(serializers.ModelSerializer):
         return None
 
 # --- RESULT SERIALIZER ---
-class ResultSerializer(serializers.ModelSerializer):
+class ResultSerializer(TimedModelSerializer):
     """
     Serializer a Result modellhez.
     Kezeli a köridőket, dátumot és a jogosultságokat.
@@ -45,7 +87,8 @@ class ResultSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Result
-        fields = ('id', 'track', 'runner_name', 'time', 'laps_count', 'lap_times', 'date', 'runner_id', 'can_edit', 'runner_weight', 'runner_height')
+        fields = ('id', 'track', 'runner_name', 'time', 'duration_ms', 'pace_ms_per_km', 'laps_count', 'lap_times', 'date', 'runner_id', 'can_edit', 'runner_weight', 'runner_height')
+        list_serializer_class = TimedListSerializer
 
     def get_can_edit(self, obj):
         request = self.context.get('request', None)
@@ -71,7 +114,7 @@ class UserSerializer(serializers.ModelSerializer):
         return obj.get_full_name() or obj.username
 
 # --- TRACK REVIEW SERIALIZER ---
-class TrackReviewSerializer(serializers.ModelSerializer):
+class TrackReviewSerializer(TimedModelSerializer):
     """
     Serializer a véleményekhez és csillagozáshoz.
     """
@@ -81,3 +124,4 @@ class TrackReviewSerializer(serializers.ModelSerializer):
         model = TrackReview
         fields = ['id', 'track', 'user', 'username', 'rating', 'comment', 'created_at']
         read_only_fields = ['user', 'created_at']
+        list_serializer_class = TimedListSerializer
@@ -0,0 +1,72 @@
+"""
+Server-Sent Events (SSE) a stopper kijelzőhöz: a szerver akkor küld új állapotot,
+amikor a futás változik, így a kliensnek nem kell másodpercenként pollingolnia.
+
+ASGI alatt fut (async view + async generátor, egy kapcsolat nem foglal szálat).
+A változást a folyamaton belüli live_run_changes számláló jelzi; más workerben
+történt változást a ritkább ellenőrzés (last_update, status) veszi észre. Az állapotot
+a live_engine-től kérjük, így a még ki nem írt (memóriában lévő) adatot is látjuk.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .live import live_status_payload, live_run_changes
+from .live_state import live_engine
+
+# Ilyen gyakran nézzük meg a folyamaton belüli változásszámlálót (másodperc)
+STREAM_TICK = 0.5
+
+# Ilyen gyakran kérdezzük le az állapotot akkor is, ha helyben nem volt változás
+STREAM_DB_CHECK = getattr(settings, 'LIVE_STREAM_DB_CHECK', 3.0)
+
+# Ennyi csend után keepalive kommentet küldünk (proxyk ne zárják le a kapcsolatot)
+STREAM_KEEPALIVE = 15.0
+
+# Egy kapcsolat legfeljebb eddig él, utána az EventSource magától újracsatlakozik
+STREAM_MAX_SECONDS = getattr(settings, 'LIVE_STREAM_MAX_SECONDS', 600)
+
+# A kliens újracsatlakozási ideje (ms)
+STREAM_RETRY_MS = 2000
+
+
+def sse_event(event, data):
+    """Egy SSE keret: 'event: ...' + 'data: <json>' + üres sor."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def live_status_events(user_id):
+    """
+    Async generátor: az első keret mindig az aktuális állapot, utána csak változáskor
+    küldünk újat (a kliens a köztes időben maga számolja az eltelt időt).
+    """
+    loop = asyncio.get_running_loop()
+    started = last_sent = loop.time()
+    last_db_check = None
+    seen_version = None
+    sent_fingerprint = object()  # Az első lekérdezés biztosan küld
+
+    yield f"retry: {STREAM_RETRY_MS}\n\n"
+
+    while loop.time() - started < STREAM_MAX_SECONDS:
+        now = loop.time()
+        version = live_run_changes.version(user_id)
+
+        if version != seen_version or last_db_check is None or now - last_db_check >= STREAM_DB_CHECK:
+            seen_version = version
+            last_db_check = now
+            run = await sync_to_async(live_engine.get_run)(user_id)
+            fingerprint = (run.pk, run.last_update, run.status) if run else None
+            if fingerprint != sent_fingerprint:
+                sent_fingerprint = fingerprint
+                last_sent = now
+                yield sse_event('status', live_status_payload(run, timezone.now()))
+
+        if now - last_sent >= STREAM_KEEPALIVE:
+            last_sent = now
+            yield ": keepalive\n\n"
+
+        await asyncio.sleep(STREAM_TICK)
@@ -0,0 +1,134 @@
+"""
+Pályák tömeges importja (import_tracks parancs): a bemenet beolvasása és a GPX / fotó
+feldolgozása worker folyamatokban.
+
+A prepare_track a worker folyamatban fut (ProcessPoolExecutor), ezért nem használ adatbázist:
+parse-olja a GPX-et, előállítja a geometria indexet és az egyszerűsített útvonalakat, elkészíti
+a képváltozatokat, és elmenti a fájlokat a tárolóba. A Track sorokat a fő folyamat írja,
+kötegenként (bulk_create).
+"""
+import csv
+import json
+from pathlib import Path
+
+import django
+import gpxpy
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils.text import slugify
+
+from .geometry import build_geometry, gpx_start_point
+from .images import content_hash, build_variants, variant_prefix, thumbnail_name
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+# A Track FileField-ek upload_to mappái (a feltöltéssel azonos helyre kerülnek a fájlok)
+GPX_DIR = 'track_gpx'
+IMAGE_DIR = 'track_images'
+
+
+def scan_directory(path):
+    """Mappa (almappákkal): minden *.gpx egy pálya, a fotója az azonos nevű kép (pl. liget.gpx + liget.jpg)."""
+    files = sorted(item for item in Path(path).rglob('*') if item.is_file())
+    images = {(item.parent, item.stem): item for item in files if item.suffix.lower() in IMAGE_EXTENSIONS}
+    entries = []
+    for item in files:
+        if item.suffix.lower() != '.gpx':
+            continue
+        entry = {'gpx': str(item)}
+        image = images.get((item.parent, item.stem))
+        if image:
+            entry['image'] = str(image)
+        entries.append(entry)
+    return entries
+
+
+def read_manifest(path):
+    """
+    Manifest (CSV fejléccel vagy JSON lista): soronként {"gpx": .., "image": .., <Track mező>: érték}.
+    A relatív fájl útvonalak a manifest mappájához képest értendők; az üres cellákat kihagyjuk.
+    """
+    path = Path(path)
+    with open(path, newline='', encoding='utf-8') as file:
+        rows = json.load(file) if path.suffix.lower() == '.json' else list(csv.DictReader(file))
+    entries = []
+    for row in rows:
+        entry = {key: value for key, value in row.items() if value not in (None, '')}
+        for key in ('gpx', 'image'):
+            if key in entry:
+                entry[key] = str(path.parent / entry[key])
+        entries.append(entry)
+    return entries
+
+
+def default_name(entry):
+    """Pálya név a fájlnévből, ha a manifest nem ad meg: 'varosliget_kor.gpx' -> 'varosliget kor'."""
+    return Path(entry['gpx']).stem.replace('_', ' ')
+
+
+def track_id_for(entry, name):
+    return entry.get('id') or slugify(name)[:50] or Path(entry['gpx']).stem[:50]
+
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return content_hash(file)
+
+
+def init_worker():
+    # 'spawn' indításnál (macOS, Windows) a worker folyamatban is be kell tölteni a beállításokat
+    django.setup()
+
+
+def prepare_track(task):
+    """
+    Egy pálya előkészítése a worker folyamatban.
+    task: {"id", "gpx", "gpx_hash", "image"}
+    Visszaadja: {"id", "fields": Track mezők, "start": (lat, lon), "points": db, "warning": ..}
+    vagy {"id", "error": szöveg}. A képhiba nem akadályozza a pálya importját (csak figyelmeztetés).
+    """
+    try:
+        with open(task['gpx'], 'rb') as file:
+            data = file.read()
+        gpx = gpxpy.parse(data)
+        geometry = build_geometry(gpx)
+        if not len(geometry):
+            return {'id': task['id'], 'error': "A GPX nem tartalmaz pontokat"}
+
+        fields = {
+            'geometry_index': geometry.to_bytes(),
+            'simplified_geometry': geometry.lod_polylines(),
+            'gpx_status': 'ready',
+            'gpx_hash': task['gpx_hash'],
+        }
+        if geometry.length > 0:
+            fields['distance_km_per_lap'] = round(geometry.length / 1000, 2)
+        fields['gpx_file'] = default_storage.save(f"{GPX_DIR}/{Path(task['gpx']).name}", ContentFile(data))
+    except Exception as e:
+        return {'id': task['id'], 'error': str(e)}
+
+    prepared = {'id': task['id'], 'fields': fields, 'start': gpx_start_point(gpx), 'points': len(geometry)}
+    if task.get('image'):
+        try:
+            fields.update(prepare_image(task['id'], task['image']))
+        except Exception as e:
+            prepared['warning'] = f"a fotó kimaradt: {e}"
+    return prepared
+
+
+def prepare_image(track_id, path):
+    """A fotó mentése és a reszponzív változatai (ugyanaz, mint a Track.process_image eredménye)."""
+    with open(path, 'rb') as file:
+        digest = content_hash(file)
+        variants, width, height = build_variants(file, variant_prefix(track_id, digest))
+        file.seek(0)
+        image_name = default_storage.save(f"{IMAGE_DIR}/{Path(path).name}", File(file))
+    return {
+        'image': image_name,
+        'image_thumbnail': thumbnail_name(variants),
+        'image_variants': variants,
+        'image_width': width,
+        'image_height': height,
+        'image_hash': digest,
+    }
@@ -0,0 +1,248 @@
+"""
+Eredmények és értékelések tömeges exportja / importja (CSV vagy NDJSON).
+
+Export: a sorokat szerveroldali kurzorral olvassuk (iterator(chunk_size=...)) és generátorként
+adjuk tovább (StreamingHttpResponse / fájl), így a memóriahasználat a sorok számától független.
+
+Import: a sorokat kötegenként validáljuk (a pályákat és a futókat kötegenként egy-egy
+lekérdezéssel ellenőrizzük), és bulk_create-tel írjuk. A bulk_create nem hívja a save()-et,
+ezért a származtatott adatokat (duration_ms / tempó, LapSplit sorok) itt töltjük, a futó
+statisztikákat és a pálya értékelés összesítőket pedig az import végén számoljuk újra.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import F
+
+from .models import Track, Result, TrackReview, LapSplit, ResourceVersion
+from .models import TRACKS_VERSION_KEY, results_version_key, reviews_version_key
+from .pagination import RESULT_STREAM_FIELDS, STREAM_CHUNK_SIZE, ndjson_lines
+
+FORMATS = ('csv', 'ndjson')
+
+# Az eredmény export oszlopai: a nyilvános stream mezői és a futó testadatai (csak adminnak)
+RESULT_EXPORT_FIELDS = RESULT_STREAM_FIELDS + ('runner_weight', 'runner_height', 'recorded_at')
+
+# Exportált oszlopok; a futó a felhasználó azonosítójával (runner_id / user) és nevével (username)
+EXPORTS = {
+    'results': (Result, RESULT_EXPORT_FIELDS, {'runner_id': F('user'), 'username': F('user__username')}),
+    'reviews': (TrackReview, ('id', 'track', 'user', 'rating', 'comment', 'created_at'), {'username': F('user__username')}),
+}
+
+# Importnál megengedett oszlopok (a többit, pl. az exportált 'id'-t és az időbélyegeket figyelmen kívül hagyjuk)
+IMPORT_FIELDS = {
+    'results': ('runner_name', 'time', 'laps_count', 'lap_times', 'date', 'runner_weight', 'runner_height'),
+    'reviews': ('rating', 'comment'),
+}
+
+IMPORT_BATCH_SIZE = 1000
+
+# Ennyi hibás sort sorolunk fel a válaszban (a darabszám mindig pontos)
+MAX_REPORTED_ERRORS = 50
+
+
+def format_from_name(name, default='ndjson'):
+    """Fájlnév kiterjesztéséből a formátum ('.csv' -> csv, minden más -> ndjson)."""
+    return 'csv' if str(name).lower().endswith('.csv') else default
+
+
+# --- EXPORT ---
+
+def export_rows(kind, track_id=None):
+    """Az exportált sorok (dict) generátora, elsődleges kulcs szerint, szerveroldali kurzorral."""
+    model, fields, extra = EXPORTS[kind]
+    queryset = model.objects.all()
+    if track_id:
+        queryset = queryset.filter(track_id=track_id)
+    return queryset.order_by('pk').values(*fields, **extra).iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+
+def export_columns(kind):
+    _, fields, extra = EXPORTS[kind]
+    return list(fields) + list(extra)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def csv_lines(rows, columns, chunk_rows=500):
+    """CSV fejléccel; a sorokat csomagokba fűzzük (mint az ndjson_lines)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_lines(kind, fmt, track_id=None):
+    rows = export_rows(kind, track_id)
+    if fmt == 'csv':
+        return csv_lines(rows, export_columns(kind))
+    return ndjson_lines(rows)
+
+
+# --- IMPORT ---
+
+def read_rows(lines, fmt):
+    """
+    Szöveges sorokból (fájl) dict-ek. NDJSON-nál az üres sorokat kihagyjuk, a hibás sor helyén
+    {'_error': ..} áll, így az importer a sorszámmal jelenti, és a többi sort feldolgozza.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {'_error': f"Hibás JSON: {e}"}
+        yield row if isinstance(row, dict) else {'_error': "A sor nem JSON objektum"}
+
+
+class BulkImporter:
+    """
+    Eredmények ('results') vagy értékelések ('reviews') kötegelt importja.
+    A hibás sorokat kihagyja és a sorszámukkal jelenti; a helyes sorok kötegenként, egy-egy
+    tranzakcióban kerülnek be (egy megszakadt importnál a már beírt kötegek megmaradnak).
+    """
+
+    def __init__(self, kind, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+        self.track_ids = set()
+        self.user_ids = set()
+
+    def run(self, rows):
+        numbered = enumerate(rows, start=1)
+        while True:
+            batch = list(islice(numbered, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        if not self.dry_run and self.created:
+            self.finish()
+        return self.summary()
+
+    def summary(self):
+        return {
+            "created": self.created,
+            "error_count": self.error_count,
+            "errors": self.errors,
+            "dry_run": self.dry_run,
+        }
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def import_batch(self, batch):
+        # A kötegben hivatkozott pályák és futók egy-egy lekérdezéssel
+        tracks = Track.objects.only('id', 'distance_km_per_lap').in_bulk(
+            {str(row.get('track') or row.get('track_id') or '') for _, row in batch})
+        user_ids, usernames = self._user_keys(batch)
+        users = User.objects.filter(pk__in=user_ids).only('id').in_bulk()
+        by_name = {user.username: user for user in User.objects.filter(username__in=usernames).only('id', 'username')}
+
+        objects = []
+        for line, row in batch:
+            try:
+                objects.append(self.build(row, tracks, users, by_name))
+            except ValidationError as e:
+                self.error(line, '; '.join(f"{field}: {' '.join(messages)}" for field, messages in e.message_dict.items()))
+            except (ValueError, TypeError) as e:
+                self.error(line, str(e))
+        if objects and not self.dry_run:
+            self.write(objects)
+        self.created += len(objects)
+
+    def _user_keys(self, batch):
+        user_ids, usernames = set(), set()
+        for _, row in batch:
+            user_id = row.get('runner_id') or row.get('user_id') or row.get('user')
+            if user_id not in (None, '') and str(user_id).isdigit():
+                user_ids.add(int(user_id))
+            elif user_id not in (None, ''):
+                usernames.add(str(user_id))
+            elif row.get('username'):
+                usernames.add(row['username'])
+        return user_ids, usernames
+
+    def _user_for(self, row, users, by_name):
+        user_id = row.get('runner_id') or row.get('user_id') or row.get('user')
+        if user_id not in (None, ''):
+            user = users.get(int(user_id)) if str(user_id).isdigit() else by_name.get(str(user_id))
+        elif row.get('username'):
+            user = by_name.get(row['username'])
+        else:
+            return None
+        if user is None:
+            raise ValueError(f"Ismeretlen felhasználó: {user_id or row.get('username')}")
+        return user
+
+    def build(self, row, tracks, users, by_name):
+        """Egy sor -> validált, mentetlen modell példány (ValidationError / ValueError hibánál)."""
+        if '_error' in row:
+            raise ValueError(row['_error'])
+        track_id = str(row.get('track') or row.get('track_id') or '')
+        track = tracks.get(track_id)
+        if track is None:
+            raise ValueError(f"Ismeretlen pálya: {track_id or '-'}")
+        user = self._user_for(row, users, by_name)
+        values = {name: row[name] for name in IMPORT_FIELDS[self.kind] if row.get(name) not in (None, '')}
+
+        if self.kind == 'results':
+            obj = Result(track=track, user=user, **values)
+            exclude = ['track', 'user', 'duration_ms', 'pace_ms_per_km']
+        else:
+            if user is None:
+                raise ValueError("Az értékeléshez felhasználó kell (user vagy username)")
+            obj = TrackReview(track=track, user=user, **values)
+            exclude = ['track', 'user']
+        # A pálya és a futó már ellenőrizve (kötegenként); a full_clean a szöveges értékeket is átalakítja
+        obj.full_clean(exclude=exclude, validate_unique=False)
+        if self.kind == 'results':
+            # A származtatott mezők (a save() helyett): duration_ms és tempó
+            obj.compute_duration()
+        return obj
+
+    def write(self, objects):
+        with transaction.atomic():
+            if self.kind == 'results':
+                Result.objects.bulk_create(objects)
+                LapSplit.objects.bulk_create([split for result in objects for split in result.split_rows()])
+            else:
+                TrackReview.objects.bulk_create(objects)
+        self.track_ids.update(obj.track_id for obj in objects)
+        self.user_ids.update(obj.user_id for obj in objects if obj.user_id)
+
+    def finish(self):
+        """A bulk_create által kihagyott származtatott adatok és a cache verziók frissítése."""
+        if self.kind == 'results':
+            if self.user_ids:
+                call_command('rebuild_user_stats', user=sorted(self.user_ids), stdout=io.StringIO())
+            ResourceVersion.bump(*(results_version_key(track_id) for track_id in self.track_ids))
+        else:
+            call_command('repair_track_ratings', stdout=io.StringIO())
+            ResourceVersion.bump(*(reviews_version_key(track_id) for track_id in self.track_ids), TRACKS_VERSION_KEY)
@@ -0,0 +1,133 @@
+"""
+Futónkénti (felhasználó + pálya) statisztikák segédfüggvényei: heti/havi volumen kulcsok,
+dátum normalizálás és az API válasz összeállítása.
+
+A statisztikákat a UserTrackStats sor tárolja, és a Result írásakor növekményesen frissül
+(models.py: UserTrackStats.apply_result_change); a teljes újraszámolás a
+rebuild_user_stats parancs. A profil így egyetlen lekérdezés, akárhány futás után.
+"""
+from datetime import date, datetime, timedelta
+
+# Ennyi hetet / hónapot tartunk meg a volumen tárolókban a mai naptól visszafelé (a régebbiek kiesnek)
+WEEKS_KEPT = 26
+MONTHS_KEPT = 24
+
+# Az API ennyi hetet / hónapot ad vissza visszamenőleg
+RECENT_WEEKS = 8
+RECENT_MONTHS = 6
+
+
+def as_date(value):
+    """Result.date -> date (a mező alapértéke datetime, a kliens szövegként is küldheti)."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def week_key(day):
+    """ISO hét kulcs, pl. '2026-W42'."""
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02}"
+
+
+def month_key(day):
+    return f"{day.year}-{day.month:02}"
+
+
+def add_volume(buckets, key, runs, distance_km, duration_ms, oldest_key):
+    """
+    Egy futás hozzáadása (runs=1) vagy elvétele (runs=-1, negatív táv/idő) egy volumen tárolóhoz.
+    A kiürült kulcsot töröljük; az oldest_key-nél régebbi időszakokat nem tároljuk.
+    A kulcsok (ISO hét / hónap) szövegként is időrendben rendezhetők.
+    """
+    for old_key in [old_key for old_key in buckets if old_key < oldest_key]:
+        del buckets[old_key]
+    if key < oldest_key:
+        return
+    bucket = buckets.get(key)
+    if bucket is None:
+        if runs < 0:
+            return
+        bucket = buckets[key] = {'runs': 0, 'distance_km': 0.0, 'duration_ms': 0}
+    bucket['runs'] += runs
+    bucket['distance_km'] = round(bucket['distance_km'] + distance_km, 3)
+    bucket['duration_ms'] += duration_ms
+    if bucket['runs'] <= 0:
+        del buckets[key]
+
+
+def oldest_week_key(today):
+    return week_key(today - timedelta(weeks=WEEKS_KEPT - 1))
+
+
+def oldest_month_key(today):
+    return recent_months(today, MONTHS_KEPT)[-1]
+
+
+def recent_weeks(today, count=RECENT_WEEKS):
+    """Az aktuális és az azt megelőző hetek kulcsai, a legfrissebb elöl."""
+    return [week_key(today - timedelta(weeks=offset)) for offset in range(count)]
+
+
+def recent_months(today, count=RECENT_MONTHS):
+    keys = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        keys.append(f"{year}-{month:02}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return keys
+
+
+def _series(buckets, keys):
+    empty = {'runs': 0, 'distance_km': 0.0, 'duration_ms': 0}
+    return [dict(buckets.get(key, empty), period=key) for key in keys]
+
+
+def _merge(all_buckets):
+    merged = {}
+    for buckets in all_buckets:
+        for key, bucket in buckets.items():
+            target = merged.setdefault(key, {'runs': 0, 'distance_km': 0.0, 'duration_ms': 0})
+            target['runs'] += bucket['runs']
+            target['distance_km'] = round(target['distance_km'] + bucket['distance_km'], 3)
+            target['duration_ms'] += bucket['duration_ms']
+    return merged
+
+
+def stats_payload(stats_rows, today):
+    """
+    Az API válasz: pályánkénti statisztikák + összesítés az összes pályára.
+    stats_rows: UserTrackStats példányok, 'track_name' annotációval.
+    """
+    weeks, months = recent_weeks(today), recent_months(today)
+    tracks = []
+    for stats in stats_rows:
+        tracks.append({
+            "track_id": stats.track_id,
+            "track_name": stats.track_name,
+            "run_count": stats.run_count,
+            "total_distance_km": stats.total_distance_km,
+            "total_duration_ms": stats.total_duration_ms,
+            "best_pace_ms_per_km": stats.best_pace_ms_per_km,
+            "personal_bests": stats.personal_bests,
+            "last_run_date": stats.last_run_date,
+            "weekly": _series(stats.weekly_volume, weeks),
+            "monthly": _series(stats.monthly_volume, months),
+        })
+
+    weekly = _merge(stats.weekly_volume for stats in stats_rows)
+    monthly = _merge(stats.monthly_volume for stats in stats_rows)
+    return {
+        "totals": {
+            "run_count": sum(track["run_count"] for track in tracks),
+            "total_distance_km": round(sum(track["total_distance_km"] for track in tracks), 3),
+            "total_duration_ms": sum(track["total_duration_ms"] for track in tracks),
+            "this_week": _series(weekly, weeks[:1])[0],
+            "this_month": _series(monthly, months[:1])[0],
+            "weekly": _series(weekly, weeks),
+            "monthly": _series(monthly, months),
+        },
+        "tracks": tracks,
+    }
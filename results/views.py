@@ -3,18 +3,38 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from rest_framework import viewsets, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, AllowAny
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
 from .models import LiveRun
-from django.db.models import Avg, Count
+from django.db.models import F
 from django.utils import timezone
-from datetime import timedelta  # <--- EZ A SOR KRITIKUS A DASHBOARDHOZ!
-import math
-import json
-from .models import Track, Result, Profile, TrackReview
+import io
+from .models import Track, Result, Profile, TrackReview, UserTrackStats
+from .models import TRACKS_VERSION_KEY, results_version_key, reviews_version_key
+from .geometry import LOD_TOLERANCES, LOD_FULL
+from .conditional import conditional_response, resource_etag
 from .serializers import TrackSerializer, ResultSerializer, TrackReviewSerializer
+from .live import apply_gps_fix, apply_gps_batch, parse_fix_time, MAX_BATCH_SIZE
+from .live import live_status_payload, apply_distance_update
+from .live_state import live_engine, LiveRunConflict
+from .samples import sample_store, to_millis
+from .leaderboard import top_results, rank_of_result, laps_for_distance, MAX_LIMIT
+from .user_stats import stats_payload
+from .laps import fastest_laps, fastest_lap_per_track, compare_splits, MAX_COMPARE_RESULTS
+from .pagination import RESULT_RANKING, RESULT_HISTORY, InvalidCursor, page_size, ndjson_lines
+from .pagination import RESULT_STREAM_FIELDS, STREAM_CHUNK_SIZE
+from .streams import live_status_events
+from .jobs import job_counts
+from .transfer import EXPORTS, FORMATS, BulkImporter, export_lines, read_rows, format_from_name
+from .live_feed import active_runners_feed
+from .metrics import registry as metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # --- 1. HTML OLDALAK MEGJELENÍTÉSE ---
 
@@ -34,26 +54,6 @@ def stopwatch(request):
     """A Stopper oldal renderelése."""
     return render(request, 'stopwatch.html')
 
-def calculate_pace_and_speed(distance_delta_m, time_delta_sec):
-    """
-    Kiszámolja a sebességet (km/h) és a tempót (min/km).
-    """
-    if time_delta_sec <= 0 or distance_delta_m <= 0:
-        return 0.0, "-:--"
-
-    # Sebesség: m/s -> km/h
-    speed_mps = distance_delta_m / time_delta_sec
-    speed_kmh = speed_mps * 3.6
-
-    # Pace: min/km
-    # 1000m / (m/s) = másodperc/km
-    seconds_per_km = 1000 / speed_mps
-    pace_min = int(seconds_per_km // 60)
-    pace_sec = int(seconds_per_km % 60)
-    pace_str = f"{pace_min}:{pace_sec:02d}"
-
-    return round(speed_kmh, 2), pace_str
-
 # --- 2. JOGOSULTSÁGOK (Permissions) ---
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -72,21 +72,126 @@ class TrackViewSet(viewsets.ModelViewSet):
     """
     Kezeli a pályák lekérdezését (GET) ÉS létrehozását (POST).
     """
-    # Itt adjuk hozzá az átlagot és a darabszámot a lekérdezéshez!
-    queryset = Track.objects.annotate(
-        average_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
-    ).order_by('name')
+    # Az átlag és a darabszám a Track-en tárolt összesítő (nincs JOIN + GROUP BY az értékelésekre)
+    queryset = Track.objects.order_by('name')
 
     serializer_class = TrackSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # A lista a tárolt egyszerűsített útvonalat adja: a teljes geometria index (bináris) nem kell
+            queryset = queryset.defer('geometry_index')
+        return queryset
+
+    # Feltételes GET: ha a pályák verziója nem változott, 304 szerializálás nélkül
+    def list(self, request, *args, **kwargs):
+        etag = resource_etag(TRACKS_VERSION_KEY, 'list')
+        return conditional_response(request, etag, lambda: super(TrackViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = resource_etag(TRACKS_VERSION_KEY, kwargs.get('pk'))
+        return conditional_response(request, etag, lambda: super(TrackViewSet, self).retrieve(request, *args, **kwargs))
+
     def perform_create(self, serializer):
         if self.request.user.is_authenticated:
             serializer.save(created_by=self.request.user)
         else:
             serializer.save()
 
+    @action(detail=True, methods=['get'])
+    def geometry(self, request, pk=None):
+        """
+        Egy pálya útvonala a kért részletességgel: /api/tracks/<id>/geometry/?level=fine
+        Szintek: coarse, medium, fine (előre tárolt) és full (az összes GPX pont).
+        """
+        level = request.query_params.get('level', 'medium')
+        if level not in LOD_TOLERANCES and level != LOD_FULL:
+            return Response({"error": f"Ismeretlen szint: {level}"}, status=400)
+
+        def build():
+            track = get_object_or_404(Track, pk=pk)
+            return Response({
+                "track_id": track.id,
+                "level": level,
+                "tolerance_m": LOD_TOLERANCES.get(level, 0.0),
+                "polyline": track.get_polyline(level),
+            })
+
+        return conditional_response(request, resource_etag(TRACKS_VERSION_KEY, pk, level), build)
+
+    @action(detail=True, methods=['get'])
+    def leaderboard(self, request, pk=None):
+        """
+        Ranglista: /api/tracks/<id>/leaderboard/?limit=10&offset=0&laps=3 (vagy &distance_km=5)
+        Idő (duration_ms) szerint, indexből; holtversenynél azonos helyezés.
+        """
+        track = get_object_or_404(Track.objects.only('id', 'distance_km_per_lap'), pk=pk)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_LIMIT)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+            laps = request.query_params.get('laps')
+            laps = int(laps) if laps else None
+            distance_km = request.query_params.get('distance_km')
+            if distance_km:
+                laps = laps_for_distance(track, float(distance_km))
+                if laps is None:
+                    return Response({"error": "A táv nem egész számú kör ezen a pályán"}, status=400)
+        except ValueError:
+            return Response({"error": "Hibás paraméter"}, status=400)
+
+        def build():
+            return Response({
+                "track_id": track.id,
+                "laps": laps,
+                "results": top_results(track.id, laps, limit, offset),
+            })
+
+        etag = resource_etag(results_version_key(track.id), 'top', laps or 'all', limit, offset)
+        return conditional_response(request, etag, build)
+
+    @action(detail=True, methods=['get'])
+    def laps(self, request, pk=None):
+        """
+        Leggyorsabb körök: /api/tracks/<id>/laps/?limit=10 (vagy &lap=2 csak a 2. körökre)
+        A LapSplit (track, lap_number, duration_ms) indexéből, köridő szöveg parse-olása nélkül.
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_LIMIT)
+            lap_number = request.query_params.get('lap')
+            lap_number = int(lap_number) if lap_number else None
+        except ValueError:
+            return Response({"error": "Hibás paraméter"}, status=400)
+
+        def build():
+            if not Track.objects.filter(pk=pk).exists():
+                return Response({"error": "Pálya nem található"}, status=404)
+            return Response({
+                "track_id": pk,
+                "lap": lap_number,
+                "laps": fastest_laps(pk, lap_number, limit),
+            })
+
+        etag = resource_etag(results_version_key(pk), 'laps', lap_number or 'all', limit)
+        return conditional_response(request, etag, build)
+
+    @action(detail=True, methods=['get'])
+    def processing(self, request, pk=None):
+        """
+        A háttérfeldolgozás állapota (a felület ezt kérdezi le feltöltés után, amíg kész nem lesz):
+        /api/tracks/<id>/processing/ -> {"gpx_status": "queued|processing|ready|failed|none", ...}
+        """
+        track = Track.objects.filter(pk=pk).values('id', 'gpx_status', 'gpx_error', 'image', 'image_variants').first()
+        if track is None:
+            return Response({"error": "Pálya nem található"}, status=404)
+        return Response({
+            "track_id": track['id'],
+            "gpx_status": track['gpx_status'],
+            "gpx_error": track['gpx_error'],
+            "image_ready": not track['image'] or bool(track['image_variants']),
+        })
+
 # --- 4. API: ÉRTÉKELÉSEK KEZELÉSE ---
 
 # --- LIVE TRACKER APIK ---
@@ -102,7 +207,8 @@ def set_run_ready(request):
     track_id = request.data.get('track_id')
     target_laps = int(request.data.get('target_laps', 1))
 
-    # Töröljük a korábbi beragadt futást
+    # Töröljük a korábbi beragadt futást (a memóriában lévő állapotát is)
+    live_engine.forget(request.user.id)
     LiveRun.objects.filter(user=request.user).delete()
 
     track = get_object_or_404(Track, id=track_id)
@@ -126,33 +232,31 @@ def get_live_status(request):
     A KLIENS (Böngésző) ezt hívogatja (Polling), hogy frissítse a kijelzőt.
     Az időt NEM a böngésző méri, hanem a szerver start_time alapján számoljuk!
     """
-    try:
-        run = LiveRun.objects.get(user=request.user)
+    # A még ki nem írt (memóriában lévő) állapotot is látjuk
+    run = live_engine.get_run(request.user.id)
+    if run is None:
+        return Response({"status": "idle"}, status=200)
+    return Response(live_status_payload(run))
 
-        # Eltelt idő számítása szerver oldalon
-        elapsed_seconds = 0
-        if run.start_time and run.status in ['running', 'finished']:
-            # Ha fut, akkor most - start. Ha kész, akkor last_update - start.
-            end_time = run.last_update if run.status == 'finished' else timezone.now()
-            delta = end_time - run.start_time
-            elapsed_seconds = delta.total_seconds()
 
-        return Response({
-            "status": run.status,
-            "track_id": run.track.id,
-            "track_name": run.track.name,
-            "current_distance": run.current_distance,
-            "total_distance": run.track.distance_km_per_lap * 1000 * run.target_laps,
-            "current_lap": run.current_lap,
-            "target_laps": run.target_laps,
-            "speed": run.current_speed,
-            "pace": run.current_pace,
-            "elapsed_seconds": elapsed_seconds, # A kliens ebből formázza az órát (HH:MM:SS)
-            "progress": run.progress_percent,
-            "lap_times": run.lap_times_log
-        })
-    except LiveRun.DoesNotExist:
-        return Response({"status": "idle"}, status=200)
+async def live_status_stream(request):
+    """
+    Ugyanaz az adat, mint a get_live_status, de Server-Sent Events streamként:
+    a szerver csak változáskor küld. Csak ASGI alatt érhető el - WSGI alatt egy
+    végtelen stream egy egész worker szálat lefoglalna, ezért ott 503-at adunk,
+    és a kliens visszaáll a pollingra.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "A stream csak ASGI szerver alatt érhető el."}, status=503)
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Bejelentkezés szükséges."}, status=403)
+
+    response = StreamingHttpResponse(live_status_events(user.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx ne puffereljen
+    return response
 
 
 @api_view(['POST'])
@@ -171,99 +275,113 @@ def update_gps_position(request):
 
     try:
         user = User.objects.get(username=username)
-        run = LiveRun.objects.get(user=user)
-        track = run.track
-
-        if run.status == 'finished':
-             return Response({"status": "finished"})
-
-        now = timezone.now()
-
-        # 1. MAP MATCHING
-        matched_distance = track.get_distance_from_lat_lon(float(lat), float(lon))
-        lap_len_m = track.distance_km_per_lap * 1000
-
-        # Körváltás logika
-        last_lap_dist = run.current_distance % lap_len_m
-        if run.status in ['running', 'paused'] and last_lap_dist > (lap_len_m * 0.9) and matched_distance < (lap_len_m * 0.1):
-            run.current_lap += 1
-
-        # Teljes táv
-        current_lap_calc = max(1, run.current_lap)
-        real_total_dist = ((current_lap_calc - 1) * lap_len_m) + matched_distance
-
-        # 2. ÁLLAPOTGÉP ÉS AUTO-PAUSE
-
-        # A) RAJT
-        if run.status == 'ready':
-            run.status = 'running'
-            run.start_time = now
-            run.current_lap = 1
-            run.current_lap_start = now
-            run.current_distance = matched_distance
-            run.save()
-            return Response({"status": "started", "msg": "Rajt érzékelve!"})
-
-        # B) FUTÁS / SZÜNET KEZELÉSE
-        else: # running vagy paused
-            # Fizika számítása
-            time_diff = (now - run.last_update).total_seconds()
-            dist_diff = real_total_dist - run.current_distance
-
-            # Sebesség számítás (ha telt el idő)
-            current_speed = 0
-            if time_diff > 0:
-                # m/s -> km/h
-                current_speed = (dist_diff / time_diff) * 3.6
-
-                # Pace számítás
-                if dist_diff > 0:
-                    _, pace = calculate_pace_and_speed(dist_diff, time_diff)
-                    run.current_pace = pace
-                    run.current_speed = current_speed
-
-            # --- AUTO-PAUSE LOGIKA ---
-            # Küszöbérték: 2.5 km/h (séta tempó alatt)
-            AUTO_PAUSE_THRESHOLD = 2.5
-
-            if current_speed < AUTO_PAUSE_THRESHOLD:
-                # Ha lassú, és eddig futott -> PAUSE
-                if run.status == 'running':
-                    run.status = 'paused'
-            else:
-                # Ha gyors, és eddig állt -> RUNNING
-                if run.status == 'paused':
-                    run.status = 'running'
-            # -------------------------
-
-            # Adatok frissítése
-            run.current_distance = real_total_dist
-
-            # Progress %
-            total_race_len_m = lap_len_m * run.target_laps
-            if total_race_len_m > 0:
-                run.progress_percent = min(100.0, (real_total_dist / total_race_len_m) * 100)
-
-            # C) CÉLBAÉRÉS
-            if real_total_dist >= (total_race_len_m * 0.98):
-                run.status = 'finished'
-                run.current_distance = total_race_len_m
-                run.progress_percent = 100.0
-                run.save()
-                return Response({"status": "finished"})
-
-            run.save()
-            return Response({
-                "status": run.status, # Visszaküldjük, hogy tudd: épp pause vagy run van-e
-                "dist": real_total_dist,
-                "speed": round(current_speed, 1)
-            })
+        lat, lon = float(lat), float(lon)
+        applied = {}
+
+        def apply(run):
+            if run.status == 'finished':
+                return {"status": "finished"}
+            now = timezone.now()
+            applied.update(run_id=run.pk, track_id=run.track_id, fix=(now, lat, lon))
+            # Állapotgép (rajt, auto-pause, körváltás, célbaérés) - lásd live.py
+            return apply_gps_fix(run, run.track, lat, lon, now)
+
+        # A memóriában lévő állapoton fut; a LiveRun sort csak állapotváltáskor / időnként írjuk
+        result = live_engine.update(user.id, apply)
+
+        # A nyers jelet megőrizzük (visszajátszáshoz), pufferelve
+        if applied:
+            sample_store.append(applied['run_id'], user.id, applied['track_id'], [applied['fix']],
+                                final=result.get('status') == 'finished')
+        return Response(result)
+
+    except User.DoesNotExist:
+        return Response({"error": "User not found"}, status=404)
+    except LiveRun.DoesNotExist:
+        return Response({"error": "Nincs futás"}, status=404)
+    except LiveRunConflict:
+        # Egyidejű írás ugyanarra a futásra: a telefon újraküldheti
+        return Response({"error": "Ütközés, próbáld újra"}, status=409)
+    except Exception as e:
+        return Response({"error": str(e)}, status=500)
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def update_gps_batch(request):
+    """
+    KÖTEGELT GPS FELTÖLTÉS: a telefon 10-30 mp-enként egyszerre küldi el a gyűjtött pontokat.
+    Body: {"username": ..., "fixes": [{"lat": .., "lon": .., "t": <unix ms | ISO idő>}, ...]}
+    Ugyanazon az állapotgépen fut, mint az egyes végpont, a futás zárja alatt.
+    """
+    username = request.data.get('username')
+    raw_fixes = request.data.get('fixes')
+
+    if not username or not isinstance(raw_fixes, list) or not raw_fixes:
+        return Response({"error": "Hiányzó adatok"}, status=400)
+    if len(raw_fixes) > MAX_BATCH_SIZE:
+        return Response({"error": f"Legfeljebb {MAX_BATCH_SIZE} pont küldhető egyszerre"}, status=400)
+
+    try:
+        fixes = [(parse_fix_time(fix['t']), float(fix['lat']), float(fix['lon'])) for fix in raw_fixes]
+    except (KeyError, TypeError, ValueError) as e:
+        return Response({"error": f"Hibás GPS pont: {e}"}, status=400)
+
+    try:
+        user = User.objects.get(username=username)
+        target = {}
+
+        def apply(run):
+            target.update(run_id=run.pk, track_id=run.track_id)
+            return apply_gps_batch(run, run.track, fixes, timezone.now())
+
+        result, applied, skipped = live_engine.update(user.id, apply)
+
+        # Az alkalmazott (nem duplikált) jeleket megőrizzük (visszajátszáshoz)
+        if applied:
+            sample_store.append(target['run_id'], user.id, target['track_id'], applied,
+                                final=result.get('status') == 'finished')
+
+        result.update({"applied": len(applied), "skipped": skipped})
+        return Response(result)
 
     except User.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
+    except LiveRun.DoesNotExist:
+        return Response({"error": "Nincs futás"}, status=404)
+    except LiveRunConflict:
+        # Egyidejű írás ugyanarra a futásra: a telefon újraküldheti
+        return Response({"error": "Ütközés, próbáld újra"}, status=409)
     except Exception as e:
         return Response({"error": str(e)}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def run_samples(request, run_id):
+    """
+    Egy futás nyers GPS jelei (visszajátszás, ellenőrzés). Csak a saját futás (vagy admin).
+    Opcionális időszak: ?from=...&to=... (unix idő vagy ISO 8601).
+    Válasz: {"run_id": .., "count": .., "samples": [[unix_ms, lat, lon], ...]}
+    """
+    owner_id = sample_store.owner_of(run_id)
+    if owner_id is None:
+        return Response({"error": "Nincs ilyen futás"}, status=404)
+    if owner_id != request.user.id and not request.user.is_staff:
+        return Response({"error": "Nincs jogosultságod"}, status=403)
+
+    try:
+        start = parse_fix_time(request.query_params['from']) if request.query_params.get('from') else None
+        end = parse_fix_time(request.query_params['to']) if request.query_params.get('to') else None
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    samples = sample_store.read(run_id, start, end)
+    return Response({
+        "run_id": run_id,
+        "count": len(samples),
+        "samples": [[to_millis(moment), lat, lon] for moment, lat, lon in samples]
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def start_live_run(request):
@@ -282,9 +400,10 @@ def start_live_run(request):
 
     # Ha már létezett (tehát folytatás), és nem 'finished', akkor állítsuk 'running'-ra
     if not created:
-        if run.status != 'finished':
-            run.status = 'running'
-            run.save()
+        def resume(run):
+            if run.status != 'finished':
+                run.status = 'running'
+        live_engine.update(request.user.id, resume)
 
     return Response({"status": "started", "is_resumed": not created})
 
@@ -293,11 +412,11 @@ def start_live_run(request):
 def pause_live_run(request):
     """Szünet (Stopper Stop gomb) - NEM TÖRLI AZ ADATOT!"""
     try:
-        run = LiveRun.objects.get(user=request.user)
-        # Csak akkor állítjuk megálltra, ha nem végzett
-        if run.status != 'finished':
-            run.status = 'paused'
-            run.save()
+        def pause(run):
+            # Csak akkor állítjuk megálltra, ha nem végzett
+            if run.status != 'finished':
+                run.status = 'paused'
+        live_engine.update(request.user.id, pause)
         return Response({"status": "paused"})
     except LiveRun.DoesNotExist:
         return Response({"status": "no_run"})
@@ -311,90 +430,11 @@ def update_live_distance(request):
     """
     try:
         new_distance = int(request.data.get('distance'))
-        run = LiveRun.objects.get(user=request.user)
-        now = timezone.now()
-
-        # Pálya hossza (1 kör) méterben
-        lap_len_m = run.track.distance_km_per_lap * 1000
-        total_race_len_m = lap_len_m * run.target_laps
-
-        # --- 1. RAJT LOGIKA (Öngyógyító) ---
-        # Ha 'ready', VAGY 'running' de hiányzik a start idő (ez okozhatta a fagyást!)
-        if run.status == 'ready' or (run.status == 'running' and not run.start_time):
-            run.status = 'running'
-            run.start_time = now
-            run.current_lap = 1
-            run.current_lap_start = now
-            run.current_distance = new_distance
-            run.last_update = now
-            run.save()
-            return Response({"status": "started", "run_status": "running"})
-
-        # --- 2. SEBESSÉG SZÁMÍTÁS ---
-        last_update_safe = run.last_update or now
-        time_diff = (now - last_update_safe).total_seconds()
-        dist_diff = new_distance - run.current_distance
-
-        if time_diff > 0 and dist_diff > 0:
-            speed, pace = calculate_pace_and_speed(dist_diff, time_diff)
-            run.current_speed = speed
-            run.current_pace = pace
-
-        # --- 3. KÖRSZÁMLÁLÁS ÉS RÉSZIDŐK ---
-        if lap_len_m > 0:
-            calculated_lap = math.ceil(new_distance / lap_len_m)
-
-            # Ha átléptünk egy új körbe
-            if calculated_lap > run.current_lap:
-                start_ref = run.current_lap_start or run.start_time or now
-                prev_lap_time = now - start_ref
-
-                minutes, seconds = divmod(prev_lap_time.total_seconds(), 60)
-                lap_str = f"{int(minutes):02}:{int(seconds):02}"
-
-                # BIZTONSÁGOS LOG MENTÉS
-                try:
-                    current_logs = json.loads(run.lap_times_log or "[]")
-                except:
-                    current_logs = []
-                current_logs.append(lap_str)
-                run.lap_times_log = json.dumps(current_logs)
-
-                # Kör adatainak frissítése
-                run.current_lap = calculated_lap
-                run.current_lap_start = now
-
-        # --- 4. ADATOK MENTÉSE ÉS CÉLBAÉRÉS ---
-        run.current_distance = new_distance
-
-        if new_distance >= total_race_len_m:
-            run.status = 'finished'
-            run.progress_percent = 100.0
-
-            # Utolsó kör mentése biztonságosan
-            start_ref = run.current_lap_start or run.start_time or now
-            elapsed_last = now - start_ref
-            minutes, seconds = divmod(elapsed_last.total_seconds(), 60)
-            last_lap_str = f"{int(minutes):02}:{int(seconds):02}"
-
-            # Duplikáció elkerülése és mentés
-            try:
-                current_logs = json.loads(run.lap_times_log or "[]")
-                if len(current_logs) < run.target_laps:
-                     current_logs.append(last_lap_str)
-                     run.lap_times_log = json.dumps(current_logs)
-            except:
-                pass
 
-        else:
-            if total_race_len_m > 0:
-                run.progress_percent = min(100.0, (new_distance / total_race_len_m) * 100)
-
-            if run.status == 'paused':
-                run.status = 'running'
-
-        run.save()
-        return Response({"status": "updated", "run_status": run.status})
+        # Rajt, sebesség, körszámlálás, célbaérés - lásd live.py
+        result = live_engine.update(
+            request.user.id, lambda run: apply_distance_update(run, new_distance, timezone.now()))
+        return Response(result)
 
     except LiveRun.DoesNotExist:
         return Response({"error": "Nincs futás"}, status=404)
@@ -408,45 +448,18 @@ def update_live_distance(request):
 def get_active_runners(request):
     """
     Dashboardnak: Ki fut éppen?
-    Javított verzió: Modulo számítás + HELYES timedelta IMPORT.
+    A lista a memóriában tartott, közös pillanatképből jön (live_feed), nem minden kérésnél
+    számoljuk újra. '?since=<verzió>' esetén csak az azóta változott futókat adjuk vissza.
     """
-    # Ez a sor okozta a 500-as hibát:
-    cutoff = timezone.now() - timedelta(hours=1)
-    runs = LiveRun.objects.filter(last_update__gte=cutoff)
-
-    data = []
-    for run in runs:
-        # --- RELATÍV POZÍCIÓ (Modulo) ---
-        track_len_m = run.track.distance_km_per_lap * 1000
-
-        if track_len_m > 0:
-            # A % (modulo) operátor megadja a körön belüli pozíciót
-            relative_distance = run.current_distance % track_len_m
-
-            # Speciális eset: Célban vagyunk (maradék 0), de nem a startnál
-            if relative_distance == 0 and run.current_distance > 0:
-                relative_distance = track_len_m
-        else:
-            relative_distance = 0
-
-        # A relatív távolságot használjuk a koordinátához!
-        coords = run.track.get_lat_lon_at_distance(relative_distance)
-        # -------------------------------------------
-
-        data.append({
-            'full_name': run.user.get_full_name() or run.user.username,
-            'track_id': run.track.id,
-            'track_name': run.track.name,
-            'distance': run.current_distance,
-            'position': coords,
-            'status': run.status
-        })
-    return Response(data)
+    if 'since' in request.query_params:
+        return Response(active_runners_feed.changes_since(request.query_params.get('since')))
+    return Response(active_runners_feed.runners())
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def stop_live_run(request):
     """Végleges törlés (Stopper Reset gomb)"""
+    live_engine.forget(request.user.id)
     LiveRun.objects.filter(user=request.user).delete()
     return Response({"status": "stopped"})
 
@@ -460,19 +473,25 @@ def track_reviews(request, track_id):
 
     # 1. GET: Listázás és Statisztika
     if request.method == 'GET':
-        reviews = TrackReview.objects.filter(track_id=track_id)
-        serializer = TrackReviewSerializer(reviews, many=True)
+        def build():
+            reviews = TrackReview.objects.filter(track_id=track_id)
+            serializer = TrackReviewSerializer(reviews, many=True)
 
-        # Statisztikák számolása
-        stats = reviews.aggregate(Avg('rating'), Count('id'))
-        average = stats['rating__avg'] or 0
-        count = stats['id__count'] or 0
+            # Statisztikák: a pályán tárolt összesítőkből (nem aggregálunk újra)
+            stats = Track.objects.filter(pk=track_id).values(
+                'average_rating', 'review_count', 'rating_histogram').first() or {}
+            average = stats.get('average_rating') or 0
+            count = stats.get('review_count') or 0
 
-        return Response({
-            'reviews': serializer.data,
-            'average_rating': round(average, 1),
-            'rating_count': count
-        })
+            return Response({
+                'reviews': serializer.data,
+                'average_rating': round(average, 1),
+                'rating_count': count,
+                'rating_histogram': stats.get('rating_histogram') or {},
+            })
+
+        # Feltételes GET: változatlan értékeléseknél 304
+        return conditional_response(request, resource_etag(reviews_version_key(track_id)), build)
 
     # 2. POST: Új vélemény mentése
     elif request.method == 'POST':
@@ -508,12 +527,93 @@ def track_reviews(request, track_id):
 
 @api_view(['GET'])
 def result_list(request, track_id):
+    """
+    Egy pálya eredményei idő szerint, oldalanként (?limit=, legfeljebb MAX_PAGE_SIZE).
+    A következő oldalhoz a válasz 'next_cursor' értékét kell ?cursor= paraméterként visszaküldeni.
+    """
+    cursor = request.query_params.get('cursor') or None
+    limit = page_size(request.query_params.get('limit'))
+
+    def build():
+        try:
+            # Számszerű idő szerint (a (track, duration_ms) index sorrendjében)
+            results = Result.objects.filter(track_id=track_id).select_related('user')
+            rows, next_cursor = RESULT_RANKING.page(results, cursor, limit)
+            serializer = ResultSerializer(rows, many=True, context={'request': request})
+            return Response({"results": serializer.data, "next_cursor": next_cursor})
+        except InvalidCursor as e:
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            return Response({"message": f"Hiba: {str(e)}"}, status=400)
+
+    # Feltételes GET: ha a pálya eredményei nem változtak, 304 szerializálás nélkül.
+    # A 'can_edit' a bejelentkezett felhasználótól függ, ezért ő is része az ETag-nek
+    user = request.user
+    viewer = ('staff' if user.is_staff else 'user', user.pk) if user.is_authenticated else ('anon',)
+    etag = resource_etag(results_version_key(track_id), limit, cursor or '', *viewer)
+    response = conditional_response(request, etag, build)
+    patch_vary_headers(response, ('Cookie', 'Authorization'))
+    return response
+
+@api_view(['GET'])
+def result_stream(request, track_id):
+    """
+    Egy pálya összes eredménye NDJSON-ként (soronként egy JSON objektum) tömeges letöltéshez.
+    Szerveroldali kurzorral olvasunk (iterator), így a memóriahasználat nem nő a sorok számával.
+    """
+    if not Track.objects.filter(pk=track_id).exists():
+        return Response({"error": "Pálya nem található"}, status=404)
+    rows = (Result.objects.filter(track_id=track_id)
+            .order_by(*RESULT_RANKING.order_by())
+            .values(*RESULT_STREAM_FIELDS, runner_id=F('user'))
+            .iterator(chunk_size=STREAM_CHUNK_SIZE))
+    response = StreamingHttpResponse(ndjson_lines(rows), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="results-{track_id}.ndjson"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def data_export(request, kind):
+    """
+    Tömeges export (csak adminnak): /api/export/results/?fmt=csv&track=<id> (vagy /api/export/reviews/)
+    A sorok szerveroldali kurzorból, generátorként folynak a válaszba: állandó memória millió sornál is.
+    (A 'format' paramétert a DRF foglalja, ezért 'fmt'.)
+    """
+    if not request.user.is_staff:
+        return Response({"error": "Nincs jogosultságod"}, status=403)
+    fmt = request.query_params.get('fmt', 'ndjson')
+    if kind not in EXPORTS or fmt not in FORMATS:
+        return Response({"error": "Ismeretlen export típus vagy formátum"}, status=400)
+
+    track_id = request.query_params.get('track')
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_lines(kind, fmt, track_id), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def data_import(request, kind):
+    """
+    Tömeges import fájlból (csak adminnak): POST /api/import/results/ multipart 'file' mezővel
+    (CSV fejléccel vagy NDJSON, a kiterjesztés vagy ?fmt= alapján); ?dry_run=1 csak validál.
+    Válasz: {"created": .., "error_count": .., "errors": [{"line": .., "error": ..}]}
+    """
+    if not request.user.is_staff:
+        return Response({"error": "Nincs jogosultságod"}, status=403)
+    upload = request.FILES.get('file')
+    if kind not in EXPORTS or upload is None:
+        return Response({"error": "Ismeretlen import típus vagy hiányzó fájl"}, status=400)
+    fmt = request.query_params.get('fmt') or format_from_name(upload.name)
+
+    # A feltöltött fájlt soronként olvassuk (nagy fájlnál ideiglenes fájl, nem a memória)
+    lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    importer = BulkImporter(kind, dry_run=request.query_params.get('dry_run') in ('1', 'true'))
     try:
-        results = Result.objects.filter(track_id=track_id).order_by('time')
-        serializer = ResultSerializer(results, many=True)
-        return Response(serializer.data)
-    except Exception as e:
-        return Response({"message": f"Hiba: {str(e)}"}, status=400)
+        summary = importer.run(read_rows(lines, fmt))
+    except UnicodeDecodeError:
+        return Response({"error": "A fájl nem UTF-8 kódolású", **importer.summary()}, status=400)
+    return Response(summary, status=201 if summary['created'] and not summary['dry_run'] else 200)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -575,6 +675,81 @@ def result_detail(request, pk):
         result.delete()
         return Response({'message': 'Sikeres törlés.'}, status=status.HTTP_204_NO_CONTENT)
 
+@api_view(['GET'])
+def result_rank(request, pk):
+    """
+    Egy eredmény helyezése a pályáján: alapból az azonos körszámú futások között,
+    ?scope=track esetén a pálya összes eredménye között.
+    """
+    result = get_object_or_404(Result.objects.only('id', 'track_id', 'laps_count', 'duration_ms'), pk=pk)
+    same_laps = request.query_params.get('scope') != 'track'
+    rank = rank_of_result(result, same_laps)
+    if rank is None:
+        return Response({"message": "Az eredmény idejét nem lehet értelmezni."}, status=400)
+    rank.update({"result_id": result.id, "track_id": result.track_id,
+                 "laps": result.laps_count if same_laps else None})
+    return Response(rank)
+
+@api_view(['GET'])
+def result_splits(request, pk):
+    """
+    Egy eredmény köridői (ms): /api/results/<id>/splits/
+    Összehasonlítás más eredményekkel: ?compare=12,15 (a különbség ehhez az eredményhez mérve).
+    """
+    get_object_or_404(Result.objects.only('id'), pk=pk)
+    try:
+        others = [int(value) for value in request.query_params.get('compare', '').split(',') if value.strip()]
+    except ValueError:
+        return Response({"error": "Hibás 'compare' paraméter"}, status=400)
+    result_ids = [pk] + [other for other in others if other != pk][:MAX_COMPARE_RESULTS]
+    return Response(compare_splits(result_ids))
+
+@api_view(['GET'])
+def fastest_lap_records(request):
+    """Pályánként a leggyorsabb kör (pályarekord körönként)."""
+    return Response(fastest_lap_per_track())
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def my_stats(request):
+    """
+    A bejelentkezett futó statisztikái pályánként + összesítve (egyéni csúcsok, össztáv,
+    heti/havi volumen). Egyetlen lekérdezés a tárolt UserTrackStats sorokból.
+    Admin más futóét is lekérheti: ?user=<id>
+    """
+    user_id = request.user.id
+    if request.user.is_staff and request.query_params.get('user'):
+        try:
+            user_id = int(request.query_params['user'])
+        except ValueError:
+            return Response({"error": "Hibás 'user' paraméter"}, status=400)
+
+    rows = list(UserTrackStats.objects.filter(user_id=user_id)
+                .annotate(track_name=F('track__name')).order_by('track__name'))
+    payload = stats_payload(rows, timezone.localdate())
+    payload["user_id"] = user_id
+    return Response(payload)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_status(request):
+    """Háttérfeladatok száma típusonként és állapotonként (csak adminnak)."""
+    if not request.user.is_staff:
+        return Response({"error": "Nincs jogosultságod"}, status=403)
+    return Response(job_counts())
+
+def metrics(request):
+    """
+    Teljesítmény metrikák Prometheus szöveges formátumban (ennek a folyamatnak az adatai).
+    Adminnak, vagy a scrapernek 'Authorization: Bearer <METRICS_TOKEN>' fejléccel.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = request.user.is_staff or (
+        token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f"Bearer {token}"))
+    if not authorized:
+        return JsonResponse({"error": "Nincs jogosultságod"}, status=403)
+    return HttpResponse(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
 # --- 6. API: AUTHENTIKÁCIÓ ---
 
 @api_view(['POST'])
@@ -650,19 +825,32 @@ def api_register(request):
         print(f"Regisztrációs hiba: {e}")
         return Response({"message": "Hiba történt a regisztráció során."}, status=500)
 
+def results_page_context(request, results):
+    """Egy oldal a futó eredményeiből (legfrissebb elöl) + a következő oldal kurzora a sablonnak."""
+    limit = page_size(request.GET.get('limit'))
+    cursor = request.GET.get('cursor') or None
+    try:
+        rows, next_cursor = RESULT_HISTORY.page(results, cursor, limit)
+    except InvalidCursor:
+        # Hibás/elavult kurzor: az első oldalt mutatjuk
+        cursor = None
+        rows, next_cursor = RESULT_HISTORY.page(results, None, limit)
+    return {'results': rows, 'next_cursor': next_cursor, 'is_first_page': cursor is None}
+
 @login_required(login_url='home')
 def my_results(request):
-    results = Result.objects.filter(user=request.user).select_related('track').order_by('-date', '-recorded_at')
-    return render(request, 'my_results.html', {'results': results})
+    results = Result.objects.filter(user=request.user).select_related('track')
+    return render(request, 'my_results.html', results_page_context(request, results))
 
 @login_required
 def runner_results(request, runner_name):
     if not request.user.is_staff:
         return render(request, 'index.html')
-    results = Result.objects.filter(runner_name=runner_name).select_related('track').order_by('-date', '-recorded_at')
-    context = {
-        'results': results,
+    results = Result.objects.filter(runner_name=runner_name).select_related('track')
+    context = results_page_context(request, results)
+    context.update({
+        'total_count': results.count(),
         'page_title': f"{runner_name} eredményei",
         'is_admin_view': True
-    }
+    })
     return render(request, 'my_results.html', context)
@@ -1,6 +1,10 @@
 // static/js/stopwatch.js
 
 let pollingInterval = null;
+let statusStream = null;    // SSE kapcsolat (EventSource), ha a szerver támogatja
+let clockInterval = null;   // Helyi óra a stream mellé
+let lastStatus = null;      // Az utolsó szervertől kapott állapot...
+let lastStatusAt = 0;       // ...és mikor érkezett (performance.now())
 let isRunActive = false;
 let userIsLoggedIn = false;
 
@@ -126,41 +130,83 @@ window.setReady = async function() {
 // --- 3. POLLING ÉS MONITORING (A LÉNYEG) ---
 
 function startPolling() {
+    // Ha a böngésző tudja, a szerver küldi a változásokat (SSE), különben marad a polling
+    if (window.EventSource) {
+        startStream();
+        return;
+    }
+    startIntervalPolling();
+}
+
+function startIntervalPolling() {
     checkStatus(); // Azonnali hívás
     if (pollingInterval) clearInterval(pollingInterval);
     pollingInterval = setInterval(checkStatus, 1000); // 1 másodperces frissítés
 }
 
-async function checkStatus() {
-    try {
-        const res = await fetch('/api/live/status/');
-        const data = await res.json();
-
-        // 1. Eset: Nincs aktív futás (IDLE) -> Setup Panel
-        if (data.status === 'idle') {
-            if(setupPanel) setupPanel.classList.remove('hidden');
-            if(monitorPanel) monitorPanel.classList.add('hidden');
-            
-            // Ha volt mentés gomb, tüntessük el
-            const saveContainer = document.getElementById('save-section');
-            if (saveContainer) saveContainer.classList.add('hidden');
-            
-            isRunActive = false;
-            return;
+function startStream() {
+    statusStream = new EventSource('/api/live/status/stream/');
+
+    statusStream.addEventListener('status', (event) => {
+        handleStatus(JSON.parse(event.data));
+    });
+
+    statusStream.onerror = () => {
+        // Ha a szerver elutasította (pl. WSGI alatt 503), az EventSource lezárul -> polling.
+        // Sima kapcsolatbontásnál a böngésző magától újracsatlakozik.
+        if (statusStream && statusStream.readyState === EventSource.CLOSED) {
+            console.warn("SSE nem elérhető, visszaállás pollingra.");
+            statusStream = null;
+            if (clockInterval) clearInterval(clockInterval);
+            startIntervalPolling();
         }
+    };
 
-        // 2. Eset: Van futás (Ready/Running/Finished) -> Monitor Panel
-        if(setupPanel) setupPanel.classList.add('hidden');
-        if(monitorPanel) monitorPanel.classList.remove('hidden');
-        isRunActive = true;
+    // A stream csak változáskor küld, ezért az órát közben helyben léptetjük
+    if (clockInterval) clearInterval(clockInterval);
+    clockInterval = setInterval(tickClock, 1000);
+}
 
-        updateMonitorUI(data);
+function tickClock() {
+    if (!lastStatus || lastStatus.status !== 'running' || !elTime) return;
+    const extraSeconds = (performance.now() - lastStatusAt) / 1000;
+    elTime.textContent = formatTime(lastStatus.elapsed_seconds + extraSeconds);
+}
 
+async function checkStatus() {
+    try {
+        const res = await fetch('/api/live/status/');
+        handleStatus(await res.json());
     } catch (e) {
         console.error("Polling hiba:", e);
     }
 }
 
+function handleStatus(data) {
+    lastStatus = data;
+    lastStatusAt = performance.now();
+
+    // 1. Eset: Nincs aktív futás (IDLE) -> Setup Panel
+    if (data.status === 'idle') {
+        if(setupPanel) setupPanel.classList.remove('hidden');
+        if(monitorPanel) monitorPanel.classList.add('hidden');
+        
+        // Ha volt mentés gomb, tüntessük el
+        const saveContainer = document.getElementById('save-section');
+        if (saveContainer) saveContainer.classList.add('hidden');
+        
+        isRunActive = false;
+        return;
+    }
+
+    // 2. Eset: Van futás (Ready/Running/Finished) -> Monitor Panel
+    if(setupPanel) setupPanel.classList.add('hidden');
+    if(monitorPanel) monitorPanel.classList.remove('hidden');
+    isRunActive = true;
+
+    updateMonitorUI(data);
+}
+
 function updateMonitorUI(data) {
     // Pálya neve és Idő
     if(elTrackName) elTrackName.textContent = data.track_name || "Ismeretlen pálya";
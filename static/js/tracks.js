@@ -13,6 +13,7 @@ let $grid; // Itt tároljuk majd az Isotope példányt
 let mapInstance = null; // Globális változó a térképnek
 let mapMarker = null;
 let mapPolyline = null;
+let processingTimer = null; // GPX feldolgozás állapotának lekérdezése (amíg van sorban álló pálya)
 
 // FONTOS: Itt TÖRÖLTÜK a 'let currentUser = null' sort,
 // mert a script.js már létrehozta globálisan!
@@ -60,6 +61,7 @@ async function loadTracks() {
 
         setupFilters();
         setupEditListeners();
+        watchProcessing();
 
     } catch (error) {
         console.error('Hiba:', error);
@@ -67,6 +69,48 @@ async function loadTracks() {
     }
 }
 
+// --- GPX FELDOLGOZÁS FIGYELÉSE ---
+// A GPX háttérben dolgozódik fel; amíg valamelyik pálya sorban áll, pár másodpercenként
+// megnézzük az állapotát, és ha elkészült, újratöltjük a listát (új körvonal, hossz)
+function isProcessing(track) {
+    return track.gpx_status === 'queued' || track.gpx_status === 'processing';
+}
+
+function watchProcessing() {
+    clearTimeout(processingTimer);
+    const pending = allTracksData.filter(isProcessing).map(track => track.id);
+    if (pending.length === 0) return;
+
+    processingTimer = setTimeout(async () => {
+        try {
+            const states = await Promise.all(pending.map(id =>
+                fetch(`/api/tracks/${id}/processing/`).then(res => res.json())));
+            if (states.some(state => !isProcessing(state))) {
+                loadTracks();
+                return;
+            }
+        } catch (error) {
+            console.error('Hiba a feldolgozás állapotának lekérdezésekor:', error);
+        }
+        watchProcessing();
+    }, 3000);
+}
+
+function gpxStatusHtml(track) {
+    if (isProcessing(track)) {
+        return `<span class="detail-item" title="A GPX feldolgozása folyamatban" style="white-space: nowrap; flex-shrink: 0; color: #94a3b8;">
+                    <i class="fas fa-circle-notch fa-spin" style="font-size: 0.7rem;"></i> GPX
+                </span>`;
+    }
+    if (track.gpx_status === 'failed') {
+        const reason = (track.gpx_error || '').replace(/"/g, '&quot;');
+        return `<span class="detail-item" title="Hibás GPX: ${reason}" style="white-space: nowrap; flex-shrink: 0; color: #f87171;">
+                    <i class="fas fa-triangle-exclamation" style="font-size: 0.7rem;"></i> GPX
+                </span>`;
+    }
+    return '';
+}
+
 // --- KÁRTYA GENERÁLÁS ---
 
 function createTrackCard(track) {
@@ -79,6 +123,10 @@ function createTrackCard(track) {
 
     const fallbackUrl = 'https://images.unsplash.com/photo-1461896836934-ffe607ba8211?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80';
     const imgUrl = track.image_thumbnail ? track.image_thumbnail : (track.image ? track.image : fallbackUrl);
+    // Reszponzív változatok (ha a háttérfeldolgozás már elkészült): a böngésző választ méretet
+    const variants = track.image_variants || {};
+    const srcset = Object.values(variants).map(v => `${v.webp || v.jpeg} ${v.width}w`).join(', ');
+    const srcsetAttr = srcset ? `srcset="${srcset}" sizes="(max-width: 600px) 100vw, 400px"` : '';
 
     // --- ÉRTÉKELÉS LOGIKA ---
     const rawAvg = track.average_rating ? parseFloat(track.average_rating) : 0;
@@ -132,7 +180,7 @@ function createTrackCard(track) {
     div.innerHTML = `
         <div class="track-card">
             <div class="image-container">
-                <img src="${imgUrl}" alt="${track.name}" class="card-image" onerror="this.onerror=null; this.src='${fallbackUrl}';">
+                <img src="${imgUrl}" ${srcsetAttr} alt="${track.name}" class="card-image" loading="lazy" onerror="this.onerror=null; this.removeAttribute('srcset'); this.src='${fallbackUrl}';">
                 <div class="badges"></div>
             </div>
 
@@ -143,6 +191,7 @@ function createTrackCard(track) {
                 <span class="detail-item" style="white-space: nowrap; flex-shrink: 0;">
                     <i class="fas fa-route" style="color:var(--neon-blue); font-size: 0.7rem; margin-right: 2px;"></i>${track.distance_km_per_lap} km
                 </span>
+                ${gpxStatusHtml(track)}
 
                 <span class="detail-item" style="white-space: nowrap; overflow: hidden; text-overflow: ellipsis; flex: 0 1 auto; text-align: center; color: #cbd5e1; letter-spacing: -0.2px;">
                     ${track.surface_type || 'Egyéb'}
@@ -333,7 +382,9 @@ function openDetailOverlay(trackId) {
     // --- JAVÍTÁS: GÖRGETÉS VISSZAÁLLÍTÁSA ---
     if (overlay) overlay.scrollTop = 0;
     const fallbackUrl = 'https://images.unsplash.com/photo-1533560906234-a4b9e38e146c?ixlib=rb-1.2.1&auto=format&fit=crop&w=800&q=80';
-    const imgUrl = track.image ? track.image : fallbackUrl;
+    // A nagy (1200 px) változat, ha már elkészült; különben az eredeti feltöltött kép
+    const large = (track.image_variants || {})['1200'];
+    const imgUrl = large ? large.jpeg : (track.image ? track.image : fallbackUrl);
 
     // 1. Háttér és Cím
     const bg = document.getElementById('detail-bg-image');
@@ -465,7 +516,7 @@ function openDetailOverlay(trackId) {
         if(gmapsLink) gmapsLink.href = `https://www.google.com/maps?q=$${lat},${lon}`;
 
         // Leaflet térkép inicializálása
-        setTimeout(() => {
+        setTimeout(async () => {
             if (!mapInstance) {
                 mapInstance = L.map('track-map').setView([lat, lon], 14);
 
@@ -499,8 +550,22 @@ function openDetailOverlay(trackId) {
                 .openPopup();
 
             // --- 3. NEON ÚTVONAL ---
-            if (track.coordinates && track.coordinates.length > 0) {
-                mapPolyline = L.polyline(track.coordinates, {
+            // A részletes útvonalat külön kérjük le (a pályalista csak a durva körvonalat tartalmazza)
+            let coordinates = decodePolyline(track.outline);
+            if (track.gpx_url && !isProcessing(track)) {
+                try {
+                    const geoRes = await fetch(`/api/tracks/${track.id}/geometry/?level=fine`);
+                    if (geoRes.ok) {
+                        const geo = await geoRes.json();
+                        coordinates = decodePolyline(geo.polyline);
+                    }
+                } catch (err) {
+                    console.error("Útvonal betöltési hiba:", err);
+                }
+            }
+
+            if (coordinates.length > 0) {
+                mapPolyline = L.polyline(coordinates, {
                     color: '#00f3ff',       // Neon kék
                     weight: 4,
                     opacity: 1.0,           // Teljes ragyogás
@@ -530,6 +530,9 @@ function openAnalysisModal(runnerName, date, time, savedWeight, savedHeight, run
   modal.classList.add("active");
 }
 
+// A megjelenített eredménylista lapozási állapota (a szerver 'next_cursor' tokenje)
+let resultsPage = { trackId: null, cursor: null, shown: 0 };
+
 async function loadResults(trackId) {
   if (!trackId) return;
   const container = document.getElementById("results-container");
@@ -548,7 +551,9 @@ async function loadResults(trackId) {
     }
 
     const resultsResponse = await fetch(`/api/results/${trackId}/`);
-    const results = await resultsResponse.json();
+    const page = await resultsResponse.json();
+    const results = page.results;
+    resultsPage = { trackId, cursor: page.next_cursor, shown: results.length };
 
     if (map && typeof L !== "undefined") {
       map.setView([trackInfo.lat, trackInfo.lon], 15);
@@ -564,139 +569,9 @@ async function loadResults(trackId) {
     } else {
       const lapDistance = trackInfo.distance_km_per_lap;
       results.forEach((res, idx) => {
-        const rank = idx + 1;
-        let rankClass =
-          rank === 1
-            ? "rank-1"
-            : rank === 2
-            ? "rank-2"
-            : rank === 3
-            ? "rank-3"
-            : "rank-other";
-        let icon = rank <= 3 ? (rank === 1 ? "fa-trophy" : "fa-medal") : "";
-        const totalDist = res.laps_count * lapDistance;
-        const totalSec = timeToSeconds(res.time);
-        const metrics = calculateMetrics(totalSec, totalDist);
-        const laps = res.lap_times
-          ? res.lap_times
-              .split(",")
-              .map((s) => s.trim())
-              .filter((s) => s.length > 0)
-          : [];
-        const mono = res.runner_name
-          .split(" ")
-          .map((n) => n[0])
-          .join("")
-          .substring(0, 2)
-          .toUpperCase();
-
-        let trs = "";
-        laps.forEach((t, i) => {
-          const s = timeToSeconds(t),
-            m = calculateMetrics(s, lapDistance);
-          trs += `<tr><td>${i + 1}.</td><td class="mono">${t}</td><td>${
-            m.pace
-          }</td><td>${m.speed}</td></tr>`;
-        });
-
-        // --- ÚJ RÉSZ KEZDETE: Név link generálása adminoknak ---
-        let runnerNameDisplay = res.runner_name;
-
-        // Csak akkor csinálunk linket, ha be van jelentkezve ÉS admin (staff)
-        if (currentUser && currentUser.is_staff) {
-          runnerNameDisplay = `<a href="/results/runner/${encodeURIComponent(
-            res.runner_name
-          )}/"
-                                            title="Összes futás megtekintése"
-                                            style="color: var(--neon-blue); text-decoration: underline; cursor: pointer; position: relative; z-index: 20;">
-                                            ${
-                                              res.runner_name
-                                            } <i class="fas fa-external-link-alt" style="font-size: 0.7em;"></i>
-                                         </a>`;
-        }
-        // --- ÚJ RÉSZ VÉGE ---
-
-        const canEdit =
-          currentUser &&
-          (currentUser.is_staff ||
-            res.can_edit ||
-            res.runner_name === currentUser.full_name);
-
-        const actionButtons = canEdit
-          ? `
-                    <div style="position: absolute; top: 10px; right: 10px; z-index: 10;">
-                        <button onclick="startEdit(${
-                          res.id
-                        }, '${res.runner_name.replace(/'/g, "\\'")}', '${
-              res.laps_count
-            }', '${res.lap_times}', '${res.track}', ${res.runner_id}, '${
-              res.date
-            }')" class="btn-icon" style="background:white; border:1px solid #e2e8f0; border-radius:50%; width:30px; height:30px; cursor:pointer; color:#3b82f6; margin-right:5px;"><i class="fas fa-pencil-alt"></i></button>
-                        <button onclick="deleteResult(${res.id}, '${
-              res.track
-            }')" class="btn-icon" style="background:white; border:1px solid #e2e8f0; border-radius:50%; width:30px; height:30px; cursor:pointer; color:#ef4444;"><i class="fas fa-trash"></i></button>
-                    </div>`
-          : "";
-
-        html += `<div class="result-card" style="animation-delay:${
-          idx * 0.1
-        }s; position: relative;">
-            ${actionButtons}
-            <div class="rank-indicator ${rankClass}">${
-          icon ? `<i class="fas ${icon}"></i>` : `#${rank}`
-        }</div>
-            <div class="runner-section">
-                <div class="runner-avatar-lg">${mono}</div>
-                <div class="runner-details">
-                    <h3>${runnerNameDisplay}</h3>
-                    <div style="font-size: 0.85rem; color: #64748b; margin-bottom: 4px;">
-                        <i class="far fa-calendar-alt"></i> ${res.date}
-                    </div>
-                    <div class="runner-meta">
-                        <span><i class="fas fa-sync-alt"></i> ${
-                          res.laps_count
-                        } kör</span>
-                        <span>•</span>
-                        <span><i class="fas fa-route"></i> ${totalDist.toFixed(
-                          2
-                        )} km</span>
-                    </div>
-                </div>
-            </div>
-            <div class="data-grid">
-                <div class="main-time">${res.time}</div>
-                <div class="stat-pill"><small>Pace</small><span>${
-                  metrics.pace
-                }</span></div>
-                <div class="stat-pill"><small>Sebesség</small><span>${
-                  metrics.speed
-                }</span></div>
-            </div>
-
-            <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin-top: 12px;">
-                <button class="details-btn" onclick="openAnalysisModal('${res.runner_name}', '${res.date}', '${res.time}', ${res.runner_weight}, ${res.runner_height})"
-                        style="background: rgba(0, 243, 255, 0.1); color: var(--neon-blue); border: 1px solid rgba(0, 243, 255, 0.3); border-radius: 8px;">
-                    <i class="fas fa-microchip"></i> Elemzés
-                </button>
-
-                ${
-                  laps.length > 0
-                    ? `<button id="btn-res-${idx}" class="details-btn" onclick="toggleLapDetails('res-${idx}')"
-                        style="background: rgba(255, 255, 255, 0.05); border-radius: 8px; border: 1px solid rgba(255,255,255,0.1);">
-                    <i class="fas fa-list-ol"></i> Köridők
-                </button>`
-                    : "<div></div>"
-                }
-            </div>
-
-            <div id="details-res-${idx}" class="lap-details-wrapper">
-                <table class="lap-table">
-                    <thead><tr><th>Kör</th><th>Idő</th><th>Pace</th><th>km/h</th></tr></thead>
-                    <tbody>${trs}</tbody>
-                </table>
-            </div>
-        </div>`;
+        html += resultCardHtml(res, idx, idx, lapDistance);
       });
+      html += loadMoreButtonHtml();
     }
     container.innerHTML = html;
   } catch (error) {
@@ -706,6 +581,187 @@ async function loadResults(trackId) {
   }
 }
 
+// Egy eredménykártya HTML-je (idx: helyezés-1 a teljes listában, pageIdx: az oldalon belül, az animációhoz)
+function resultCardHtml(res, idx, pageIdx, lapDistance) {
+  const rank = idx + 1;
+  let rankClass =
+    rank === 1
+      ? "rank-1"
+      : rank === 2
+      ? "rank-2"
+      : rank === 3
+      ? "rank-3"
+      : "rank-other";
+  let icon = rank <= 3 ? (rank === 1 ? "fa-trophy" : "fa-medal") : "";
+  const totalDist = res.laps_count * lapDistance;
+  const totalSec = timeToSeconds(res.time);
+  const metrics = calculateMetrics(totalSec, totalDist);
+  const laps = res.lap_times
+    ? res.lap_times
+        .split(",")
+        .map((s) => s.trim())
+        .filter((s) => s.length > 0)
+    : [];
+  const mono = res.runner_name
+    .split(" ")
+    .map((n) => n[0])
+    .join("")
+    .substring(0, 2)
+    .toUpperCase();
+
+  let trs = "";
+  laps.forEach((t, i) => {
+    const s = timeToSeconds(t),
+      m = calculateMetrics(s, lapDistance);
+    trs += `<tr><td>${i + 1}.</td><td class="mono">${t}</td><td>${
+      m.pace
+    }</td><td>${m.speed}</td></tr>`;
+  });
+
+  // --- ÚJ RÉSZ KEZDETE: Név link generálása adminoknak ---
+  let runnerNameDisplay = res.runner_name;
+
+  // Csak akkor csinálunk linket, ha be van jelentkezve ÉS admin (staff)
+  if (currentUser && currentUser.is_staff) {
+    runnerNameDisplay = `<a href="/results/runner/${encodeURIComponent(
+      res.runner_name
+    )}/"
+                                      title="Összes futás megtekintése"
+                                      style="color: var(--neon-blue); text-decoration: underline; cursor: pointer; position: relative; z-index: 20;">
+                                      ${
+                                        res.runner_name
+                                      } <i class="fas fa-external-link-alt" style="font-size: 0.7em;"></i>
+                                   </a>`;
+  }
+  // --- ÚJ RÉSZ VÉGE ---
+
+  const canEdit =
+    currentUser &&
+    (currentUser.is_staff ||
+      res.can_edit ||
+      res.runner_name === currentUser.full_name);
+
+  const actionButtons = canEdit
+    ? `
+              <div style="position: absolute; top: 10px; right: 10px; z-index: 10;">
+                  <button onclick="startEdit(${
+                    res.id
+                  }, '${res.runner_name.replace(/'/g, "\\'")}', '${
+        res.laps_count
+      }', '${res.lap_times}', '${res.track}', ${res.runner_id}, '${
+        res.date
+      }')" class="btn-icon" style="background:white; border:1px solid #e2e8f0; border-radius:50%; width:30px; height:30px; cursor:pointer; color:#3b82f6; margin-right:5px;"><i class="fas fa-pencil-alt"></i></button>
+                  <button onclick="deleteResult(${res.id}, '${
+        res.track
+      }')" class="btn-icon" style="background:white; border:1px solid #e2e8f0; border-radius:50%; width:30px; height:30px; cursor:pointer; color:#ef4444;"><i class="fas fa-trash"></i></button>
+              </div>`
+    : "";
+
+  return `<div class="result-card" style="animation-delay:${
+    pageIdx * 0.1
+  }s; position: relative;">
+      ${actionButtons}
+      <div class="rank-indicator ${rankClass}">${
+    icon ? `<i class="fas ${icon}"></i>` : `#${rank}`
+  }</div>
+      <div class="runner-section">
+          <div class="runner-avatar-lg">${mono}</div>
+          <div class="runner-details">
+              <h3>${runnerNameDisplay}</h3>
+              <div style="font-size: 0.85rem; color: #64748b; margin-bottom: 4px;">
+                  <i class="far fa-calendar-alt"></i> ${res.date}
+              </div>
+              <div class="runner-meta">
+                  <span><i class="fas fa-sync-alt"></i> ${
+                    res.laps_count
+                  } kör</span>
+                  <span>•</span>
+                  <span><i class="fas fa-route"></i> ${totalDist.toFixed(
+                    2
+                  )} km</span>
+              </div>
+          </div>
+      </div>
+      <div class="data-grid">
+          <div class="main-time">${res.time}</div>
+          <div class="stat-pill"><small>Pace</small><span>${
+            metrics.pace
+          }</span></div>
+          <div class="stat-pill"><small>Sebesség</small><span>${
+            metrics.speed
+          }</span></div>
+      </div>
+
+      <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 10px; margin-top: 12px;">
+          <button class="details-btn" onclick="openAnalysisModal('${res.runner_name}', '${res.date}', '${res.time}', ${res.runner_weight}, ${res.runner_height})"
+                  style="background: rgba(0, 243, 255, 0.1); color: var(--neon-blue); border: 1px solid rgba(0, 243, 255, 0.3); border-radius: 8px;">
+              <i class="fas fa-microchip"></i> Elemzés
+          </button>
+
+          ${
+            laps.length > 0
+              ? `<button id="btn-res-${idx}" class="details-btn" onclick="toggleLapDetails('res-${idx}')"
+                  style="background: rgba(255, 255, 255, 0.05); border-radius: 8px; border: 1px solid rgba(255,255,255,0.1);">
+              <i class="fas fa-list-ol"></i> Köridők
+          </button>`
+              : "<div></div>"
+          }
+      </div>
+
+      <div id="details-res-${idx}" class="lap-details-wrapper">
+          <table class="lap-table">
+              <thead><tr><th>Kör</th><th>Idő</th><th>Pace</th><th>km/h</th></tr></thead>
+              <tbody>${trs}</tbody>
+          </table>
+      </div>
+  </div>`;
+}
+
+// A következő oldal (keyset kurzor) hozzáfűzése a listához
+async function loadMoreResults() {
+  const container = document.getElementById("results-container");
+  if (!container || !resultsPage.cursor) return;
+  const { trackId, cursor } = resultsPage;
+  const button = document.getElementById("results-load-more");
+  if (button) button.disabled = true;
+
+  try {
+    const response = await fetch(
+      `/api/results/${trackId}/?cursor=${encodeURIComponent(cursor)}`
+    );
+    const page = await response.json();
+    // Közben másik pályára váltottunk
+    if (resultsPage.trackId !== trackId) return;
+
+    const trackInfo = tracksData.find((t) => t.id == trackId);
+    let html = "";
+    page.results.forEach((res, pageIdx) => {
+      html += resultCardHtml(
+        res,
+        resultsPage.shown + pageIdx,
+        pageIdx,
+        trackInfo.distance_km_per_lap
+      );
+    });
+    resultsPage.shown += page.results.length;
+    resultsPage.cursor = page.next_cursor;
+
+    if (button) button.remove();
+    container.insertAdjacentHTML("beforeend", html + loadMoreButtonHtml());
+  } catch (error) {
+    if (button) button.disabled = false;
+    console.error(error);
+  }
+}
+
+function loadMoreButtonHtml() {
+  if (!resultsPage.cursor) return "";
+  return `<button id="results-load-more" class="details-btn" onclick="loadMoreResults()"
+            style="width: 100%; margin-top: 10px; background: rgba(255, 255, 255, 0.05); border-radius: 8px; border: 1px solid rgba(255,255,255,0.1);">
+            <i class="fas fa-chevron-down"></i> További eredmények
+          </button>`;
+}
+
 function updateTrackOverlay(trackInfo) {
   const overlay = document.getElementById("track-info-overlay");
   if (!overlay) return;
@@ -1012,20 +1068,68 @@ function getCookie(name) {
 
 window.addNewResult = handleResultSubmit;
 
+// --- ÚTVONAL DEKÓDOLÁS (encoded polyline -> [[lat, lon], ...]) ---
+// A szerver a pályák útvonalát tömörítve küldi (Google encoded polyline, 1e-5 pontosság)
+function decodePolyline(encoded, precision = 5) {
+  const coords = [];
+  if (!encoded) return coords;
+  const factor = Math.pow(10, precision);
+  let index = 0,
+    lat = 0,
+    lon = 0;
+
+  while (index < encoded.length) {
+    const deltas = [];
+    for (let k = 0; k < 2; k++) {
+      let result = 0,
+        shift = 0,
+        byte;
+      do {
+        byte = encoded.charCodeAt(index++) - 63;
+        result |= (byte & 0x1f) << shift;
+        shift += 5;
+      } while (byte >= 0x20);
+      deltas.push(result & 1 ? ~(result >> 1) : result >> 1);
+    }
+    lat += deltas[0];
+    lon += deltas[1];
+    coords.push([lat / factor, lon / factor]);
+  }
+  return coords;
+}
+
 // --- LIVE TRACKER LOGIKA (DASHBOARD - VEVŐ) ---
 
 // JAVÍTÁS: Kezdetben null érték, hogy ne dobjon hibát ott, ahol nincs Leaflet betöltve!
 let liveLayer = null;
 let activeLiveLine = null;
 
+// A szerver pillanatképének helyi másolata: csak a változásokat kérjük le (delta)
+let liveRunnersVersion = "";
+const liveRunners = new Map(); // run id -> futó
+
 async function updateLiveRunners() {
   // Ha nincs Live Runner lista a DOM-ban (pl. nem a dashboardon vagyunk), kilépünk
   if (!document.getElementById("live-runners-list")) return;
 
   try {
-    const res = await fetch("/api/live/active/");
-    const runners = await res.json();
+    const res = await fetch(
+      `/api/live/active/?since=${encodeURIComponent(liveRunnersVersion)}`
+    );
+    const feed = await res.json();
+
+    // Delta alkalmazása (vagy teljes csere, ha a szerver teljes pillanatképet küldött)
+    if (feed.full) liveRunners.clear();
+    feed.runners.forEach((r) => liveRunners.set(r.id, r));
+    feed.removed.forEach((id) => liveRunners.delete(id));
+    liveRunnersVersion = feed.version;
+
+    // Ha semmi nem változott, a lista és a markerek maradhatnak
+    if (!feed.full && feed.runners.length === 0 && feed.removed.length === 0) {
+      return;
+    }
 
+    const runners = Array.from(liveRunners.values());
     const list = document.getElementById("live-runners-list");
     list.innerHTML = runners.length
       ? ""
@@ -1125,9 +1229,10 @@ async function focusLiveRunner(runner) {
     activeLiveLine = null;
   }
 
-  // 3. Ha megvan a pálya és vannak koordináták, berajzoljuk
-  if (track && track.coordinates && track.coordinates.length > 0) {
-    activeLiveLine = L.polyline(track.coordinates, {
+  // 3. Ha megvan a pálya és vannak koordináták, berajzoljuk (a lista csak a körvonalat küldi)
+  const coordinates = track ? decodePolyline(track.outline) : [];
+  if (coordinates.length > 0) {
+    activeLiveLine = L.polyline(coordinates, {
       color: "#bc13fe", // Neon Lila (hogy különbözzön a sima pályanézegetőtől)
       weight: 5, // Kicsit vastagabb
       opacity: 0.8,